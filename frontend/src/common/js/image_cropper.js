@@ -8,6 +8,7 @@
 import Cropper from 'cropperjs';
 import 'cropperjs/dist/cropper.min.css';
 import 'bootstrap';
+import { storeCroppedImage } from './image_upload.js';
 
 // Log when this module is loaded
 console.log('Image Cropper module loading...');
@@ -316,45 +317,24 @@ const ImageCropper = {
             });
 
             canvas.toBlob((blob) => {
-                const reader = new FileReader();
-                reader.readAsDataURL(blob);
-
-                reader.onloadend = () => {
-                    // Get the base64 data
-                    let base64data = reader.result;
-
-                    // Sanitize the base64 data by removing any parameters (charset, encoding, etc.)
-                    // This ensures consistency between test environment and web interface
-                    if (base64data && base64data.includes(';base64,')) {
-                        // Split the data URL into format and data parts
-                        const [formatPart, dataPart] = base64data.split(';base64,');
-
-                        // Keep only the media type (e.g., "data:image/jpeg")
-                        // and remove all other parameters
-                        const baseFormat = formatPart.split(';')[0];
-
-                        // Reconstruct the data URL with only the media type and base64 data
-                        base64data = `${baseFormat};base64,${dataPart}`;
-                        console.log('Parameters removed from base64 data');
-                    }
-
-                    // Store the sanitized cropped image data
-                    this.elements.croppedImageData.value = base64data;
-                    console.log('Cropped image data stored');
-
-                    // Update preview if available
-                    if (this.elements.previewImage && this.elements.previewContainer) {
-                        this.elements.previewImage.src = base64data;
-                        this.elements.previewContainer.classList.remove('d-none');
-                        console.log('Preview updated');
-                    }
-
-                    // Hide modal
-                    this.hideModal();
-
-                    // Clean up
-                    URL.revokeObjectURL(this.elements.cropperImage.src);
-                };
+                // Upload the binary image, or fall back to base64 data
+                storeCroppedImage(blob, this.elements.croppedImageData)
+                    .then((previewUrl) => {
+                        console.log('Cropped image stored');
+
+                        // Update preview if available
+                        if (this.elements.previewImage && this.elements.previewContainer) {
+                            this.elements.previewImage.src = previewUrl;
+                            this.elements.previewContainer.classList.remove('d-none');
+                            console.log('Preview updated');
+                        }
+
+                        // Hide modal
+                        this.hideModal();
+
+                        // Clean up
+                        URL.revokeObjectURL(this.elements.cropperImage.src);
+                    });
             }, 'image/jpeg', 0.9);  // JPEG format with 90% quality
         } catch (error) {
             console.error('Error cropping image:', error);
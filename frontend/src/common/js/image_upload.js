@@ -0,0 +1,86 @@
+/**
+ * image_upload.js - Send cropped images to the binary upload endpoint
+ *
+ * A cropped canvas is posted as a raw image/* request body instead of a
+ * base64 data URL in the form. The endpoint returns a signed token that
+ * goes in the form's hidden cropped_image_token input.
+ *
+ * The upload URL is read from the data-upload-url attribute of the
+ * hidden cropped_image_data input. Without it, or if the upload fails,
+ * the image falls back to a base64 data URL in that input.
+ */
+import { getCookie } from './ajax_helper.js';
+
+/**
+ * Read a blob as a data URL with only the media type in its header
+ * @param {Blob} blob - Image data
+ * @returns {Promise<string>} - Data URL
+ */
+export function blobToDataUrl(blob) {
+    return new Promise((resolve, reject) => {
+        const reader = new FileReader();
+        reader.onloadend = () => {
+            const [formatPart, dataPart] = reader.result.split(';base64,');
+            resolve(`${formatPart.split(';')[0]};base64,${dataPart}`);
+        };
+        reader.onerror = () => reject(reader.error);
+        reader.readAsDataURL(blob);
+    });
+}
+
+/**
+ * POST an image blob as the request body
+ * @param {Blob} blob - Image data
+ * @param {string} url - Upload endpoint
+ * @returns {Promise<Object>} - Response with token and url
+ */
+export function uploadImageBlob(blob, url) {
+    return fetch(url, {
+        method: 'POST',
+        body: blob,
+        credentials: 'same-origin',
+        headers: {
+            'Content-Type': blob.type || 'image/jpeg',
+            'X-CSRFToken': getCookie('csrftoken'),
+        },
+    }).then((response) => response.json().then((data) => {
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Upload failed (${response.status})`);
+        }
+        return data;
+    }));
+}
+
+/**
+ * Store a cropped image for the form that owns dataInput
+ * @param {Blob} blob - Cropped image
+ * @param {HTMLInputElement} dataInput - The hidden cropped_image_data input
+ * @returns {Promise<string>} - URL to preview the image with
+ */
+export function storeCroppedImage(blob, dataInput) {
+    const uploadUrl = dataInput.dataset.uploadUrl;
+    const tokenInput = dataInput.form
+        ? dataInput.form.querySelector('input[name="cropped_image_token"]')
+        : null;
+
+    const useDataUrl = () => blobToDataUrl(blob).then((dataUrl) => {
+        dataInput.value = dataUrl;
+        return dataUrl;
+    });
+
+    if (!uploadUrl || !tokenInput) {
+        return useDataUrl();
+    }
+
+    return uploadImageBlob(blob, uploadUrl)
+        .then((data) => {
+            tokenInput.value = data.token;
+            dataInput.value = '';
+            return URL.createObjectURL(blob);
+        })
+        .catch((error) => {
+            console.warn('Binary image upload failed, using base64:', error);
+            tokenInput.value = '';
+            return useDataUrl();
+        });
+}
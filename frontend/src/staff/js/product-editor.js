@@ -7,6 +7,7 @@
 import '@staff/css/product-edit.css';
 import Cropper from 'cropperjs';
 import { Modal } from 'bootstrap';
+import { storeCroppedImage } from '@common/js/image_upload.js';
 
 class ProductEditor {
     constructor() {
@@ -91,27 +92,13 @@ class ProductEditor {
             cropBtn.addEventListener('click', () => {
                 if (!this.cropper) return;
 
-                // Get cropped canvas as data URL
-                const croppedData = this.cropper.getCroppedCanvas({
+                // Get cropped canvas
+                const canvas = this.cropper.getCroppedCanvas({
                     minWidth: 256,
                     minHeight: 256,
                     maxWidth: 1000,
                     maxHeight: 1000
-                }).toDataURL();
-
-                // Update preview image
-                imagePreview.src = croppedData;
-                imagePreview.classList.remove('d-none');
-
-                // Hide placeholder if it exists
-                if (noImageDiv) {
-                    noImageDiv.style.display = 'none';
-                }
-
-                // Store cropped image data in hidden input
-                if (croppedImageDataInput) {
-                    croppedImageDataInput.value = croppedData;
-                }
+                });
 
                 // Close modal
                 modal.hide();
@@ -119,6 +106,23 @@ class ProductEditor {
                 // Destroy cropper
                 this.cropper.destroy();
                 this.cropper = null;
+
+                if (!croppedImageDataInput) return;
+
+                // Upload the binary image, or fall back to base64 data
+                canvas.toBlob((blob) => {
+                    storeCroppedImage(blob, croppedImageDataInput)
+                        .then((previewUrl) => {
+                            // Update preview image
+                            imagePreview.src = previewUrl;
+                            imagePreview.classList.remove('d-none');
+
+                            // Hide placeholder if it exists
+                            if (noImageDiv) {
+                                noImageDiv.style.display = 'none';
+                            }
+                        });
+                }, 'image/png');
             });
         }
 
@@ -35,7 +35,7 @@ class StaffProductManager {
             sort: 'name-asc',
             price_min: '',
             price_max: '',
-            page: 1
+            cursor: ''
         };
         this.productListContainerId = 'product-list-container';
         this.filterFormId = 'product-filter-form';
@@ -230,8 +230,9 @@ class StaffProductManager {
                 e.preventDefault();
                 const pageUrl = e.target.getAttribute('href');
                 if (pageUrl) {
+                    // Pages are fetched by the cursor the server gave us
                     const urlParams = new URLSearchParams(pageUrl.split('?')[1]);
-                    this.filters.page = urlParams.get('page') || 1;
+                    this.filters.cursor = urlParams.get('cursor') || '';
                     this.refreshProductList();
                 }
             }
@@ -248,7 +249,7 @@ class StaffProductManager {
             const value = input.value;
 
             this.filters[name] = value;
-            this.filters.page = 1; // Reset to first page on filter change
+            this.filters.cursor = ''; // Reset to first page on filter change
             this.refreshProductList();
         }, this.filterChangeDelay);
     }
@@ -263,7 +264,7 @@ class StaffProductManager {
             sort: 'name-asc',
             price_min: '',
             price_max: '',
-            page: 1
+            cursor: ''
         };
 
         // Reset form inputs
@@ -1024,98 +1025,71 @@ class StaffProductManager {
     renderPagination(pagination, container) {
         if (!pagination || !container) return;
 
-        const { current_page, total_pages, total_count } = pagination;
+        const {
+            current_page, total_pages, total_count, has_next, has_previous,
+            next_cursor, previous_cursor, last_cursor
+        } = pagination;
 
         let html = `
             <nav aria-label="Product list pagination" role="navigation">
                 <ul class="pagination justify-content-center" role="list">`;
 
-        // Previous page button
-        if (current_page <= 1) {
-            html += `
-                    <li class="page-item disabled" role="listitem">
-                        <span class="page-link" aria-disabled="true" aria-label="Previous page (unavailable)">
-                            Previous
-                        </span>
-                    </li>`;
-        } else {
+        // First and previous page buttons follow the server's cursors
+        if (has_previous && previous_cursor) {
             html += `
                     <li class="page-item" role="listitem">
-                        <a class="page-link" href="?page=${current_page - 1}"
+                        <a class="page-link" href="?cursor="
+                           aria-label="Go to first page">
+                            First
+                        </a>
+                    </li>
+                    <li class="page-item" role="listitem">
+                        <a class="page-link" href="?cursor=${encodeURIComponent(previous_cursor)}"
                            aria-label="Go to previous page, page ${current_page - 1}">
                             Previous
                         </a>
                     </li>`;
-        }
-
-        // Page numbers
-        const startPage = Math.max(1, current_page - 2);
-        const endPage = Math.min(total_pages, current_page + 2);
-
-        // First page link if not in range
-        if (startPage > 1) {
+        } else {
             html += `
-                    <li class="page-item" role="listitem">
-                        <a class="page-link" href="?page=1" aria-label="Go to first page">1</a>
-                    </li>`;
-            if (startPage > 2) {
-                html += `
                     <li class="page-item disabled" role="listitem">
-                        <span class="page-link" aria-hidden="true">...</span>
+                        <span class="page-link" aria-disabled="true" aria-label="Previous page (unavailable)">
+                            Previous
+                        </span>
                     </li>`;
-            }
         }
 
-        // Page links
-        for (let i = startPage; i <= endPage; i++) {
-            if (i === current_page) {
-                html += `
+        html += `
                     <li class="page-item active" role="listitem">
-                        <span class="page-link" aria-current="page" aria-label="Current page, page ${i}">
-                            ${i}
+                        <span class="page-link" aria-current="page" aria-label="Current page, page ${current_page} of ${total_pages}">
+                            Page ${current_page} of ${total_pages}
                         </span>
                     </li>`;
-            } else {
-                html += `
+
+        // Next and last page buttons
+        if (has_next && next_cursor) {
+            html += `
                     <li class="page-item" role="listitem">
-                        <a class="page-link" href="?page=${i}" aria-label="Go to page ${i}">${i}</a>
+                        <a class="page-link" href="?cursor=${encodeURIComponent(next_cursor)}"
+                           aria-label="Go to next page, page ${current_page + 1}">
+                            Next
+                        </a>
                     </li>`;
-            }
-        }
-
-        // Last page link if not in range
-        if (endPage < total_pages) {
-            if (endPage < total_pages - 1) {
+            if (last_cursor) {
                 html += `
-                    <li class="page-item disabled" role="listitem">
-                        <span class="page-link" aria-hidden="true">...</span>
-                    </li>`;
-            }
-            html += `
                     <li class="page-item" role="listitem">
-                        <a class="page-link" href="?page=${total_pages}"
-                           aria-label="Go to last page, page ${total_pages}">
-                            ${total_pages}
+                        <a class="page-link" href="?cursor=${encodeURIComponent(last_cursor)}"
+                           aria-label="Go to last page">
+                            Last
                         </a>
                     </li>`;
-        }
-
-        // Next page button
-        if (current_page >= total_pages) {
+            }
+        } else {
             html += `
                     <li class="page-item disabled" role="listitem">
                         <span class="page-link" aria-disabled="true" aria-label="Next page (unavailable)">
                             Next
                         </span>
                     </li>`;
-        } else {
-            html += `
-                    <li class="page-item" role="listitem">
-                        <a class="page-link" href="?page=${current_page + 1}"
-                           aria-label="Go to next page, page ${current_page + 1}">
-                            Next
-                        </a>
-                    </li>`;
         }
 
         html += `
@@ -1,2 +1,91 @@
+"""
+Tests for the home application and the site-wide asset template tags
+"""
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from skunkmonkey.templatetags import direct_assets
+
+MANIFEST = {
+    '_orderManager.abc.js': {
+        'file': 'js/staff/orderManager.abc.js',
+        'name': 'orderManager',
+        'css': ['css/staff/orderManager.css'],
+    },
+    'src/users/js/profile.js': {
+        'file': 'js/users/profile.def.js',
+        'name': 'profile',
+    },
+}
+
+
+class AssetIndexTest(SimpleTestCase):
+    """Tests for the compiled manifest behind direct_asset/asset_group"""
+
+    def setUp(self):
+        self.base_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base_dir, True)
+        (self.base_dir / 'static').mkdir()
+        (self.base_dir / 'static' / 'manifest.json').write_text(
+            json.dumps(MANIFEST))
+        settings_override = override_settings(
+            BASE_DIR=self.base_dir, STATIC_URL='/static/', DEBUG=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        direct_assets.reset_asset_index()
+        self.addCleanup(direct_assets.reset_asset_index)
+
+    def render(self, source):
+        return Template(
+            '{% load direct_assets asset_groups %}' + source
+        ).render(Context())
+
+    def test_aliases_render_the_same_asset(self):
+        """Module prefixes, extensions and kebab-case find the entry"""
+        expected = (
+            '<link rel="stylesheet" href="/static/css/staff/'
+            'orderManager.css">\n<script type="module" '
+            'src="/static/js/staff/orderManager.abc.js"></script>'
+        )
+        for name in ('orderManager', 'staff/orderManager',
+                     'orderManager.js', 'order-manager'):
+            self.assertEqual(
+                self.render(f'{{% direct_asset "{name}" %}}'), expected)
+
+    def test_manifest_read_once(self):
+        """Tag calls are lookups in the compiled index"""
+        self.render('{% direct_asset "profile" %}')
+        with mock.patch.object(direct_assets, '_read_manifest') as read:
+            self.render('{% direct_asset "profile" %}'
+                        '{% direct_asset "missing" %}'
+                        '{% asset_group "profile" %}')
+        read.assert_not_called()
+
+    def test_asset_group(self):
+        """Groups render their members' tags together"""
+        html = self.render('{% asset_group "profile" %}')
+        self.assertIn('/static/js/users/profile.def.js', html)
+        self.assertIn(
+            "<!-- Asset group 'nope' not found -->",
+            self.render('{% asset_group "nope" %}'))
+
+    @override_settings(DEBUG=True, USE_VITE_DEV_SERVER=True,
+                       VITE_DEV_SERVER='http://localhost:5173')
+    def test_asset_group_uses_dev_server(self):
+        """Groups load from the Vite dev server when it is in use"""
+        html = self.render('{% asset_group "profile" %}')
+        self.assertIn('http://localhost:5173/@vite/client', html)
+        self.assertIn('data-entry="users/profileCropper"', html)
+        self.assertNotIn('/static/js/users/profile.def.js', html)
+
+    def test_missing_asset(self):
+        """Unknown names render a comment"""
+        self.assertEqual(
+            self.render('{% direct_asset "missing" %}'),
+            "<!-- Asset 'missing' not found in manifest.json -->")
@@ -91,7 +91,7 @@ class HomeView(TemplateView):
 
         # Add cart item count to context
         cart = context['request'].cart
-        context['item_count'] = cart.items.count()
+        context['item_count'] = len(cart)
 
         # Add comparison list to context
         # Handle the case of multiple ComparisonList objects
@@ -41,6 +41,14 @@ try:
     application = get_wsgi_application()
 
     log_startup("WSGI application initialized successfully")
+
+    # Resolve the Stripe keys now rather than on the first checkout
+    try:
+        from shop.utils.stripe_utils import warm_stripe_keys
+        for problem in warm_stripe_keys():
+            log_startup(f"WARNING: {problem}")
+    except Exception as e:
+        log_startup(f"Could not warm Stripe keys: {e}")
 except Exception as error:
     startup_error = error
     log_startup(f"ERROR in passenger_wsgi.py: {error}")
@@ -0,0 +1,194 @@
+"""
+Fragment cache for rendered product cards.
+
+A product's card only changes when the product (or its category) changes,
+so each card is rendered once and cached under a key built from the
+product id, its updated_at timestamp and stock quantity, whether it is
+still new, the template and the active locale. Stock is part of the key
+because orders take it with ``QuerySet.update()``, which leaves updated_at
+alone, in a worker process that may not share this cache; ``is_new`` is
+because it changes with the date alone, so a "New" badge does not outlive
+its window. Grids are assembled from the cached cards
+with one cache round trip.
+
+Cached cards never contain per-visitor data. Templates receive the CSRF
+token and the current path as placeholders, which are swapped in per
+request, and any per-visitor state (wishlist, comparison) is passed as a
+small set of flags that become part of the key, so every visitor with the
+same flags shares one cached card.
+
+Each product also has a generation token in the cache. Saving or deleting
+the product drops the token (see products.signals), which orphans all of
+its cached cards, including those rendered by other templates.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils import translation
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+# Seconds to keep a rendered card; stale cards are also orphaned on save
+DEFAULT_CACHE_TIMEOUT = 60 * 60 * 24
+CARD_KEY = (
+    'product_card:{generation}:{product_id}:{stamp}:{stock}:{new}:'
+    '{template}:{locale}:{variant}'
+)
+GENERATION_KEY = 'product_card_gen:{product_id}'
+
+# Substituted for per-request values when a card is rendered for the cache
+CSRF_PLACEHOLDER = 'product-card-csrf-token'
+NEXT_PLACEHOLDER = 'product-card-next-path'
+
+
+def get_cache_timeout():
+    return getattr(
+        settings, 'PRODUCT_CARD_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def invalidate_product_cards(product_ids):
+    """
+    Drop every cached card for the given products
+
+    Args:
+        product_ids: Iterable of product IDs whose cards are stale
+    """
+    keys = [
+        GENERATION_KEY.format(product_id=product_id)
+        for product_id in product_ids
+    ]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _generations(product_ids):
+    """Current generation token for each product, creating missing ones"""
+    keys = {
+        product_id: GENERATION_KEY.format(product_id=product_id)
+        for product_id in product_ids
+    }
+    found = cache.get_many(keys.values())
+    generations = {}
+    for product_id, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex[:12]
+            if not cache.add(key, generation, None):
+                # Another request created it first
+                generation = cache.get(key, generation)
+        generations[product_id] = generation
+    return generations
+
+
+def _variant_key(flags):
+    return ','.join(
+        f'{name}={int(bool(value))}' for name, value in sorted(flags.items())
+    ) or '-'
+
+
+def _apply_overlay(html, request):
+    """Swap the per-request placeholders in a cached card"""
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(
+            CSRF_PLACEHOLDER, get_token(request) if request else '')
+    if NEXT_PLACEHOLDER in html:
+        html = html.replace(
+            NEXT_PLACEHOLDER, escape(request.path) if request else '')
+    return html
+
+
+def render_product_cards(products, template_name, request=None,
+                         variant=None):
+    """
+    Render a card for each product, reusing cached cards where possible
+
+    Args:
+        products: Iterable of Product instances
+        template_name: Card template, rendered with ``product``
+        request: Current HttpRequest, for the CSRF token and path
+        variant: Optional callable returning a dict of boolean flags for a
+            product (e.g. ``in_wishlist``); the flags are passed to the
+            template and become part of the cache key
+
+    Returns:
+        List of rendered cards, in the order of ``products``
+    """
+    products = list(products)
+    if not products:
+        return []
+
+    locale = translation.get_language() or ''
+    flags = [variant(product) if variant else {} for product in products]
+    try:
+        generations = _generations({product.pk for product in products})
+        keys = [
+            CARD_KEY.format(
+                generation=generations[product.pk],
+                product_id=product.pk,
+                stamp=f'{product.updated_at.timestamp():.6f}',
+                stock=product.stock_quantity,
+                new=int(product.is_new),
+                template=template_name,
+                locale=locale,
+                variant=_variant_key(product_flags),
+            )
+            for product, product_flags in zip(products, flags)
+        ]
+        cached = cache.get_many(keys)
+    except Exception as e:
+        # Never fail a page on the cache; just render everything
+        logger.error(f"Error reading product card cache: {e}")
+        keys = None
+        cached = {}
+
+    template = None
+    rendered = {}
+    cards = []
+    for index, product in enumerate(products):
+        key = keys[index] if keys else None
+        html = cached.get(key) if key else None
+        if html is None:
+            if template is None:
+                template = get_template(template_name)
+            html = template.render({
+                'product': product,
+                'csrf_token': CSRF_PLACEHOLDER,
+                'next_path': NEXT_PLACEHOLDER,
+                **flags[index],
+            })
+            if key:
+                rendered[key] = str(html)
+        cards.append(mark_safe(_apply_overlay(html, request)))
+
+    if rendered:
+        try:
+            cache.set_many(rendered, get_cache_timeout())
+        except Exception as e:
+            logger.error(f"Error writing product card cache: {e}")
+        logger.debug(
+            f"Rendered {len(rendered)} of {len(products)} product cards "
+            f"for {template_name}")
+    return cards
+
+
+def render_product_card(product, template_name, request=None, variant=None):
+    """
+    Render a single product card through the cache
+
+    Args:
+        product: Product instance
+        template_name: Card template, rendered with ``product``
+        request: Current HttpRequest, for the CSRF token and path
+        variant: Optional callable returning per-visitor flags
+
+    Returns:
+        The rendered card
+    """
+    return render_product_cards(
+        [product], template_name, request=request, variant=variant)[0]
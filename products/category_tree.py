@@ -0,0 +1,305 @@
+"""
+Cached snapshot of the category tree.
+
+Categories change rarely but are read on nearly every shop page (sidebars,
+filters, breadcrumbs), so the whole tree is loaded with one query and kept
+both in the cache and in process memory. Ancestors, descendants and
+descendant-id sets are precomputed, so every lookup is a dict access.
+
+The snapshot is versioned: saving or deleting a Category bumps the version
+in the cache (see products.signals), and every process sharing that cache
+notices the new version on its next read and rebuilds. Bulk
+``QuerySet.update()`` calls bypass the signals and must call
+invalidate_category_tree() themselves.
+
+The version expires after ``CATEGORY_TREE_CACHE_TIMEOUT`` seconds, so a
+process that does not share the cache (see ``SHARED_CACHE``) serves a
+stale tree for at most that long. A timeout of 0 turns the cache off.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Seconds to keep a snapshot; a version bump replaces it earlier
+DEFAULT_CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = 'category_tree:version'
+TREE_KEY = 'category_tree:{version}'
+
+# The last snapshot this process loaded; shared by all threads, read-only
+_snapshot = None
+
+
+def get_cache_timeout():
+    return getattr(
+        settings, 'CATEGORY_TREE_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+class CategoryTree:
+    """
+    Immutable snapshot of every Category, in the model's default ordering.
+
+    The Category instances it holds are shared by every reader, so treat
+    them as read-only.
+    """
+
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.categories = list(categories)
+        self._by_id = {category.pk: category for category in self.categories}
+        self._by_slug = {
+            category.slug: category for category in self.categories}
+
+        self._children = {category.pk: [] for category in self.categories}
+        self.roots = []
+        for category in self.categories:
+            if category.parent_id in self._children:
+                self._children[category.parent_id].append(category)
+            else:
+                self.roots.append(category)
+
+        # Ancestors top-down from the roots, descendants bottom-up
+        self._ancestors = {}
+        order = []
+        stack = [(root, ()) for root in reversed(self.roots)]
+        while stack:
+            category, ancestors = stack.pop()
+            self._ancestors[category.pk] = ancestors
+            order.append(category)
+            children = self._children[category.pk]
+            stack.extend(
+                (child, ancestors + (category,))
+                for child in reversed(children))
+
+        self._descendants = {}
+        for category in reversed(order):
+            descendants = []
+            for child in self._children[category.pk]:
+                descendants.append(child)
+                descendants.extend(self._descendants[child.pk])
+            self._descendants[category.pk] = tuple(descendants)
+        self._descendant_ids = {
+            pk: frozenset(child.pk for child in descendants) | {pk}
+            for pk, descendants in self._descendants.items()
+        }
+
+    def __len__(self):
+        return len(self.categories)
+
+    def __contains__(self, pk):
+        return pk in self._by_id
+
+    def get(self, pk):
+        """Category with the given id, or None"""
+        return self._by_id.get(pk)
+
+    def get_by_slug(self, slug):
+        """Category with the given slug, or None"""
+        return self._by_slug.get(slug)
+
+    def children(self, pk):
+        """Direct children of a category"""
+        return tuple(self._children.get(pk, ()))
+
+    def ancestors(self, pk):
+        """Ancestors of a category, from the root down to its parent"""
+        return self._ancestors.get(pk, ())
+
+    def descendants(self, pk):
+        """All descendants of a category, depth first"""
+        return self._descendants.get(pk, ())
+
+    def descendant_ids(self, pk):
+        """
+        IDs of a category and all of its descendants, for filtering
+        products across a subtree with a single ``IN`` lookup
+        """
+        return self._descendant_ids.get(pk, frozenset({pk}))
+
+
+def build_category_tree(version=None):
+    """
+    Load every category with one query and build a snapshot
+
+    Args:
+        version: Version tag stored on the snapshot
+
+    Returns:
+        CategoryTree
+    """
+    from .models import Category
+    return CategoryTree(Category.objects.all(), version=version)
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(VERSION_KEY, version, get_cache_timeout()):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def get_category_tree():
+    """
+    Return the current category tree snapshot
+
+    Costs one cache read when the in-process copy is up to date, and one
+    more (or a single database query) after a category has changed.
+
+    Returns:
+        CategoryTree
+    """
+    if not get_cache_timeout():
+        return build_category_tree()
+
+    try:
+        version = _current_version()
+    except Exception as e:
+        logger.error(f"Error reading category tree version: {e}")
+        return build_category_tree()
+
+    global _snapshot
+    tree = _snapshot
+    if tree is not None and tree.version == version:
+        return tree
+
+    key = TREE_KEY.format(version=version)
+    try:
+        tree = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error reading category tree from cache: {e}")
+        tree = None
+
+    if tree is None:
+        tree = build_category_tree(version=version)
+        try:
+            cache.set(key, tree, get_cache_timeout())
+        except Exception as e:
+            logger.error(f"Error caching category tree: {e}")
+        logger.debug(
+            f"Rebuilt category tree {version} with {len(tree)} categories")
+
+    _snapshot = tree
+    return tree
+
+
+def invalidate_category_tree():
+    """
+    Retire the current snapshot so every process rebuilds on next read
+
+    The version is bumped immediately and again when the surrounding
+    transaction commits, so a snapshot another process rebuilt before the
+    change was visible to it is never kept.
+    """
+    def bump():
+        global _snapshot
+        cache.set(VERSION_KEY, uuid.uuid4().hex[:12], get_cache_timeout())
+        _snapshot = None
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def compute_category_paths(rows, separator='/'):
+    """
+    Work out the materialized path and level of every category
+
+    Args:
+        rows: Iterable of ``(id, parent_id)`` pairs
+        separator: String following each id in a path
+
+    Returns:
+        Dict mapping category id to ``(path, level)``. Categories caught in
+        a parent cycle, or whose parent is missing, are treated as roots.
+    """
+    parents = dict(rows)
+    paths = {}
+
+    def resolve(pk):
+        chain = []
+        seen = set()
+        current = pk
+        while current is not None and current not in paths:
+            if current in seen or current not in parents:
+                break
+            seen.add(current)
+            chain.append(current)
+            current = parents[current]
+        prefix, level = paths.get(current, ('', -1))
+        for category_id in reversed(chain):
+            level += 1
+            prefix = f'{prefix}{category_id}{separator}'
+            paths[category_id] = (prefix, level)
+
+    for pk in parents:
+        resolve(pk)
+    return paths
+
+
+def repair_category_paths(dry_run=False):
+    """
+    Recompute every category's path and level from its parent links
+
+    Args:
+        dry_run: Only report the categories that are wrong
+
+    Returns:
+        List of Category instances whose stored path or level was wrong,
+        carrying the corrected values
+    """
+    from .models import Category
+
+    categories = list(Category.objects.all())
+    expected = compute_category_paths(
+        ((category.pk, category.parent_id) for category in categories),
+        separator=Category.PATH_SEPARATOR)
+
+    broken = []
+    for category in categories:
+        path, level = expected[category.pk]
+        if category.path != path or category.level != level:
+            category.path, category.level = path, level
+            broken.append(category)
+
+    if broken and not dry_run:
+        Category.objects.bulk_update(broken, ['path', 'level'])
+        invalidate_category_tree()
+    return broken
+
+
+def category_subtree_q(category_ids, field='category'):
+    """
+    Build a filter matching rows in any of the given categories or their
+    subcategories, as one indexed prefix lookup on the category path per
+    category
+
+    Args:
+        category_ids: Iterable of category ids (ints or numeric strings)
+        field: Name of the foreign key to Category on the filtered model
+
+    Returns:
+        Q object; matches nothing if no id is valid
+    """
+    tree = get_category_tree()
+    condition = Q()
+    matched = False
+    for category_id in category_ids:
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            continue
+        matched = True
+        category = tree.get(category_id)
+        if category is not None and category.path:
+            condition |= Q(**{f'{field}__path__startswith': category.path})
+        else:
+            condition |= Q(**{f'{field}_id': category_id})
+    if not matched:
+        return Q(pk__in=[])
+    return condition
@@ -0,0 +1,46 @@
+"""
+Django management command to repair category materialized paths.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.category_tree import repair_category_paths
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the materialized path and level of every category from '
+        'its parent. Run after raw SQL or bulk updates that change parents '
+        'without going through Category.save().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report wrong paths without fixing them',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        with transaction.atomic():
+            broken = repair_category_paths(dry_run=dry_run)
+
+        for category in broken:
+            self.stdout.write(
+                f'{category.pk} {category.name}: {category.path} '
+                f'(level {category.level})'
+            )
+
+        if not broken:
+            self.stdout.write(self.style.SUCCESS(
+                'All category paths are correct'))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(
+                f'{len(broken)} categories have wrong paths; run without '
+                f'--dry-run to fix them'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Repaired {len(broken)} category paths'))
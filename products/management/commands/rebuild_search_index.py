@@ -0,0 +1,32 @@
+"""
+Django management command to rebuild the product full-text search index.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.search import search_backend, update_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the product full-text search index. Run after bulk '
+        'imports or raw SQL updates that bypass model signals.'
+    )
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        self.stdout.write(f'Search backend: {backend}')
+
+        with transaction.atomic():
+            indexed = update_search_index()
+
+        if indexed is None:
+            self.stdout.write(self.style.WARNING(
+                'This database has no full-text index; searches use '
+                'basic substring matching.'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} products'
+        ))
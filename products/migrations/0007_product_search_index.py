@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:30
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = 'products_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """Create and populate the backend-specific full-text index"""
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS products_product_search_gin '
+            'ON products_product USING GIN (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE products_product AS p SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(p.name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(c.name, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(p.description, '')), "
+            "'C') "
+            "FROM products_category AS c WHERE c.id = p.category_id"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"name, description, category, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) '
+            f'SELECT p.id, p.name, p.description, c.name '
+            f'FROM products_product AS p '
+            f'JOIN products_category AS c ON c.id = p.category_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS products_product_search_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_alter_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+def compute_category_paths(rows):
+    """
+    Map category id to ``(path, level)`` from ``(id, parent_id)`` pairs
+
+    A frozen copy of products.category_tree.compute_category_paths, so the
+    migration keeps working if that module changes. Categories caught in a
+    parent cycle, or whose parent is missing, are treated as roots.
+    """
+    parents = dict(rows)
+    paths = {}
+
+    for pk in parents:
+        chain = []
+        seen = set()
+        current = pk
+        while current is not None and current not in paths:
+            if current in seen or current not in parents:
+                break
+            seen.add(current)
+            chain.append(current)
+            current = parents[current]
+        prefix, level = paths.get(current, ('', -1))
+        for category_id in reversed(chain):
+            level += 1
+            prefix = f'{prefix}{category_id}/'
+            paths[category_id] = (prefix, level)
+    return paths
+
+
+def backfill_category_paths(apps, schema_editor):
+    """Fill in path and level for existing categories"""
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.all())
+    paths = compute_category_paths(
+        (category.pk, category.parent_id) for category in categories)
+    for category in categories:
+        category.path, category.level = paths[category.pk]
+    Category.objects.bulk_update(categories, ['path', 'level'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(
+            backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 
+from .category_tree import get_category_tree, invalidate_category_tree
+
 User = get_user_model()
 
 
@@ -16,12 +22,21 @@ class Category(models.Model):
         'self', on_delete=models.CASCADE, null=True, blank=True,
         related_name='children')
     level = models.PositiveIntegerField(default=0, editable=False)
+    # Materialized path: the ids from the root down to this category, each
+    # followed by PATH_SEPARATOR, so a subtree is one indexed prefix query
+    path = models.CharField(
+        max_length=255, editable=False, db_index=True, default='')
     order = models.PositiveIntegerField(default=0)
     friendly_name = models.CharField(max_length=255, blank=True)
     image = models.ImageField(
         upload_to='category_images/', blank=True, null=True)
+    # Resized copies of image, see skunkmonkey.utils.image_derivatives
+    image_derivatives = models.JSONField(
+        default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
 
+    PATH_SEPARATOR = '/'
+
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['order', 'name']
@@ -29,17 +44,57 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id in self.descendant_ids:
+            raise ValidationError({
+                'parent': 'A category cannot be moved under itself or '
+                          'one of its subcategories.'
+            })
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
 
-        # Calculate level based on parent
-        if self.parent:
-            self.level = self.parent.level + 1
+        # Calculate level and path prefix from the stored parent
+        parent_path = ''
+        if self.parent_id:
+            parent_path, parent_level = Category.objects.filter(
+                pk=self.parent_id).values_list('path', 'level').get()
+            if self.path and parent_path.startswith(self.path):
+                raise ValueError(
+                    f"Cannot move category {self.pk} under its own "
+                    f"subcategory {self.parent_id}")
+            self.level = parent_level + 1
         else:
             self.level = 0
 
         super().save(*args, **kwargs)
+        self._update_path(parent_path)
+
+    def _update_path(self, parent_path):
+        """
+        Store this category's path and, when it was reparented, move its
+        whole subtree with one UPDATE
+        """
+        old_path = self.path
+        path = f'{parent_path}{self.pk}{self.PATH_SEPARATOR}'
+        if path == old_path:
+            return
+
+        Category.objects.filter(pk=self.pk).update(path=path)
+        if old_path:
+            depth_change = (
+                path.count(self.PATH_SEPARATOR)
+                - old_path.count(self.PATH_SEPARATOR))
+            Category.objects.filter(
+                path__startswith=old_path
+            ).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                level=F('level') + depth_change,
+            )
+        self.path = path
+        invalidate_category_tree()
 
     def get_absolute_url(self):
         return reverse("products:category_detail", kwargs={"slug": self.slug})
@@ -47,6 +102,11 @@ class Category(models.Model):
     @property
     def get_ancestors(self):
         """Return list of ancestors from root to parent"""
+        tree = get_category_tree()
+        if self.pk in tree:
+            return list(tree.ancestors(self.pk))
+
+        # Not in the snapshot yet (unsaved); walk the parents instead
         ancestors = []
         current = self.parent
         while current:
@@ -57,11 +117,12 @@ class Category(models.Model):
     @property
     def get_descendants(self):
         """Return all descendants of this category"""
-        descendants = []
-        for child in self.children.all():
-            descendants.append(child)
-            descendants.extend(child.get_descendants)
-        return descendants
+        return list(get_category_tree().descendants(self.pk))
+
+    @property
+    def descendant_ids(self):
+        """IDs of this category and all of its descendants"""
+        return get_category_tree().descendant_ids(self.pk)
 
 
 class Product(models.Model):
@@ -78,9 +139,13 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     image = models.ImageField(
         upload_to='product_images/', blank=True, null=True)
+    image_derivatives = models.JSONField(
+        default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Full-text search document, maintained by products.search (PostgreSQL)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,209 @@
+"""
+Full-text product search
+
+Products are indexed on name, category name and description. On PostgreSQL
+the index is the ``Product.search_vector`` tsvector column (GIN indexed);
+on SQLite it is the ``products_product_fts`` FTS5 virtual table. Any other
+database falls back to ``icontains`` matching so search keeps working.
+
+The index is kept current by the signals in ``products.signals`` and can be
+rebuilt from scratch with ``manage.py rebuild_search_index``.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'products_product_fts'
+
+# Relative column weights for SQLite bm25(): name, description, category
+FTS_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+INDEX_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_backend():
+    """
+    Return the search backend for the default database connection
+
+    Returns:
+        'postgres', 'fts5' or 'basic'
+    """
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite':
+        return 'fts5'
+    return 'basic'
+
+
+def _tokenize(query):
+    """Split a raw user query into lowercase search terms"""
+    return _TOKEN_RE.findall((query or '').lower())
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset by a full-text query and rank the results
+
+    Every term must match, and every term also matches as a prefix so
+    results update sensibly while the user is still typing. Matching
+    products are annotated with ``search_rank`` (higher is better) and
+    ordered by it, so callers that apply their own sort can simply call
+    ``order_by()`` again.
+
+    Args:
+        queryset: The initial Product queryset
+        query: Search query string as entered by the user
+
+    Returns:
+        Filtered, ranked queryset
+    """
+    terms = _tokenize(query)
+    if not terms:
+        return queryset.none()
+
+    backend = search_backend()
+
+    if backend == 'postgres':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        raw_query = ' & '.join(f'{term}:*' for term in terms)
+        search_query = SearchQuery(
+            raw_query, search_type='raw', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', 'name')
+
+    if backend == 'fts5':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        matching_ids = RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (match,)
+        )
+        return queryset.filter(id__in=matching_ids).annotate(
+            search_rank=rank
+        ).order_by('-search_rank', 'name')
+
+    # Basic fallback: every term must appear somewhere
+    for term in terms:
+        queryset = queryset.filter(
+            Q(name__icontains=term)
+            | Q(description__icontains=term)
+            | Q(category__name__icontains=term)
+        )
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).order_by('name')
+
+
+@transaction.atomic
+def update_search_index(product_ids=None):
+    """
+    Refresh the search index for the given products
+
+    Runs in its own transaction (a savepoint inside the caller's), so the
+    index is never left half rewritten and a failure here does not abort
+    the caller's transaction.
+
+    Args:
+        product_ids: Iterable of Product ids to refresh, or None to rebuild
+            the index for every product
+
+    Returns:
+        Number of products indexed, or None if the backend has no index
+    """
+    from .models import Category, Product
+
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+
+    product_table = Product._meta.db_table
+    category_table = Category._meta.db_table
+    backend = search_backend()
+
+    with connection.cursor() as cursor:
+        if backend == 'postgres':
+            sql = (
+                f'UPDATE {product_table} AS p SET search_vector = '
+                f"setweight(to_tsvector(%s, coalesce(p.name, '')), 'A') || "
+                f"setweight(to_tsvector(%s, coalesce(c.name, '')), 'B') || "
+                f"setweight(to_tsvector(%s, coalesce(p.description, '')), "
+                f"'C') "
+                f'FROM {category_table} AS c WHERE c.id = p.category_id'
+            )
+            params = [SEARCH_CONFIG, SEARCH_CONFIG, SEARCH_CONFIG]
+            if product_ids is not None:
+                sql += ' AND p.id = ANY(%s)'
+                params.append(product_ids)
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+        if backend == 'fts5':
+            insert_sql = (
+                f'INSERT INTO {FTS_TABLE} '
+                f'(rowid, name, description, category) '
+                f'SELECT p.id, p.name, p.description, c.name '
+                f'FROM {product_table} AS p '
+                f'JOIN {category_table} AS c ON c.id = p.category_id'
+            )
+            if product_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(insert_sql)
+                return cursor.rowcount
+
+            indexed = 0
+            for start in range(0, len(product_ids), INDEX_BATCH_SIZE):
+                batch = product_ids[start:start + INDEX_BATCH_SIZE]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} '
+                    f'WHERE rowid IN ({placeholders})',
+                    batch
+                )
+                cursor.execute(
+                    f'{insert_sql} WHERE p.id IN ({placeholders})',
+                    batch
+                )
+                indexed += cursor.rowcount
+            return indexed
+
+    return None
+
+
+@transaction.atomic
+def remove_from_search_index(product_ids):
+    """
+    Remove products from the search index, in its own transaction
+
+    Only needed for SQLite, where the FTS5 table is separate from the
+    product table. On PostgreSQL the tsvector is deleted with the row.
+
+    Args:
+        product_ids: Iterable of Product ids to remove
+    """
+    product_ids = list(product_ids)
+    if not product_ids or search_backend() != 'fts5':
+        return
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), INDEX_BATCH_SIZE):
+            batch = product_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                batch
+            )
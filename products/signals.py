@@ -0,0 +1,100 @@
+# products/signals.py
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from skunkmonkey.utils.image_derivatives import queue_derivatives
+
+from .card_cache import invalidate_product_cards
+from .category_tree import invalidate_category_tree
+from .models import Category, Product
+from .search import remove_from_search_index, update_search_index
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Refresh the search index entry for a saved product."""
+    if raw:
+        return
+    try:
+        update_search_index([instance.pk])
+    except Exception as e:
+        # Never block a product save on the search index; the rebuild
+        # command will repair anything missed here
+        logger.error(f"Error indexing product {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the search index."""
+    try:
+        remove_from_search_index([instance.pk])
+    except Exception as e:
+        logger.error(f"Error removing product {instance.pk} from index: {e}")
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, raw=False, **kwargs):
+    """Re-index a category's products; their documents include its name."""
+    if raw or created:
+        return
+    try:
+        update_search_index(
+            instance.products.values_list('pk', flat=True))
+    except Exception as e:
+        logger.error(
+            f"Error indexing products for category {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def expire_product_cards(sender, instance, raw=False, **kwargs):
+    """Drop the cached cards of a saved or deleted product."""
+    if raw:
+        return
+    try:
+        invalidate_product_cards([instance.pk])
+    except Exception as e:
+        logger.error(
+            f"Error expiring cached cards for product {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=Category)
+def expire_category_product_cards(sender, instance, created, raw=False,
+                                  **kwargs):
+    """Drop the cached cards of a category's products; they show its name."""
+    if raw or created:
+        return
+    try:
+        invalidate_product_cards(
+            instance.products.values_list('pk', flat=True))
+    except Exception as e:
+        logger.error(
+            f"Error expiring cached cards for category {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def expire_category_tree(sender, instance, raw=False, **kwargs):
+    """Rebuild the cached category tree after any category change."""
+    try:
+        invalidate_category_tree()
+    except Exception as e:
+        logger.error(f"Error expiring the category tree: {e}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Queue the responsive sizes of a new or replaced image."""
+    if raw:
+        return
+    try:
+        queue_derivatives(instance, 'image')
+    except Exception as e:
+        logger.error(
+            f"Error queueing image derivatives for {sender.__name__} "
+            f"{instance.pk}: {e}")
@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..card_cache import render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, template_name):
+    """
+    Render a card for each product from the card fragment cache
+
+    The card template receives only ``product`` (plus the ``csrf_token``
+    and ``next_path`` placeholders), so it must not depend on the visitor.
+
+    Usage: {% product_cards products "products/manage/product_card.html" %}
+    """
+    return mark_safe(''.join(render_product_cards(
+        products, template_name, request=context.get('request'))))
@@ -12,10 +12,12 @@ from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, UpdateView
 
-from skunkmonkey.utils.s3_utils import upload_base64_to_model_field
+from skunkmonkey.utils.image_uploads import apply_cropped_image
 
+from .category_tree import category_subtree_q, get_category_tree
 from .forms import CategoryForm, ProductForm
 from .models import Category, Product
+from .search import search_products
 
 logger = logging.getLogger(__name__)
 
@@ -73,17 +75,19 @@ def product_add(request):
 
     try:
         product = form.save(commit=False)
-        cropped_image_data = request.POST.get('cropped_image_data')
+        cropped_image = (
+            request.POST.get('cropped_image_token')
+            or request.POST.get('cropped_image_data')
+        )
 
-        if cropped_image_data:
+        if cropped_image:
             try:
-                # Use our standardized S3 utility to handle the image
-                # upload
-                result = upload_base64_to_model_field(
+                # Store the cropped image (an upload token, or base64)
+                result = apply_cropped_image(
+                    request,
                     product,
                     'image',
-                    cropped_image_data,
-                    'product_images',
+                    'product',
                     f"product_{product.name.replace(' ', '_').lower()}"
                 )
 
@@ -123,16 +127,18 @@ def product_update(request, slug):
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
-            cropped_image_data = request.POST.get('cropped_image_data')
-            if cropped_image_data:
+            cropped_image = (
+                request.POST.get('cropped_image_token')
+                or request.POST.get('cropped_image_data')
+            )
+            if cropped_image:
                 try:
-                    # Use our standardized S3 utility to handle the image
-                    # upload
-                    result = upload_base64_to_model_field(
+                    # Store the cropped image (an upload token, or base64)
+                    result = apply_cropped_image(
+                        request,
                         product,
                         'image',
-                        cropped_image_data,
-                        'product_images',
+                        'product',
                         f"product_{product.name.replace(' ', '_').lower()}"
                     )
 
@@ -249,25 +255,15 @@ def get_product_cards(request):
 
     products = Product.objects.all()
 
-    # Apply filters
+    # Apply filters; each category includes its subcategories
     if category:
-        # Check if we have multiple categories (comma-separated)
-        if ',' in category:
-            category_ids = [c for c in category.split(',') if c]
-            if category_ids:
-                # Filter products that have any of the selected categories
-                products = products.filter(category_id__in=category_ids)
-        else:
-            # Single category case
-            products = products.filter(category_id=category)
+        category_ids = [c for c in category.split(',') if c]
+        if category_ids:
+            products = products.filter(category_subtree_q(category_ids))
     if search:
-        products = products.filter(
-            Q(name__icontains=search)
-            | Q(description__icontains=search)
-            | Q(category__name__icontains=search)
-        )
+        products = search_products(products, search)
 
-    # Apply sorting
+    # Apply sorting; relevance keeps the search rank ordering
     sort_mapping = {
         'name-asc': 'name',
         'name-desc': '-name',
@@ -276,7 +272,8 @@ def get_product_cards(request):
         'newest': '-created_at',
         'oldest': 'created_at',
     }
-    products = products.order_by(sort_mapping.get(sort, 'name'))
+    if not (search and sort == 'relevance'):
+        products = products.order_by(sort_mapping.get(sort, 'name'))
 
     # Get the total count before any pagination
     product_count = products.count()
@@ -306,7 +303,7 @@ def get_product_cards(request):
         else:
             # Return the full html including filter controls
             context.update({
-                'categories': Category.objects.all(),
+                'categories': get_category_tree().categories,
                 'sort_options': [
                     {'value': 'name-asc', 'label': 'Name (A-Z)'},
                     {'value': 'name-desc', 'label': 'Name (Z-A)'},
@@ -1,9 +1,11 @@
 from django.contrib import admin
+from django.utils import timezone
 
 from .models import (
     Cart, CartItem, ComparisonList, Order, OrderItem, RecentlyViewedItem,
-    WishlistItem,
+    WebhookEvent, WishlistItem,
 )
+from .utils.cart_utils import recalculate_cart_totals
 
 
 class CartItemInline(admin.TabularInline):
@@ -14,12 +16,21 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'session_id', 'created_at', 'updated_at']
+    list_display = [
+        'id', 'user', 'session_id', 'item_count', 'subtotal', 'created_at',
+        'updated_at'
+    ]
     list_filter = ['created_at', 'updated_at']
     search_fields = ['user__username', 'session_id']
+    readonly_fields = ['item_count', 'unique_items', 'subtotal']
     inlines = [CartItemInline]
     raw_id_fields = ['user']
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline edits bypass Cart.add/remove, so refresh the stored totals
+        recalculate_cart_totals(Cart.objects.filter(pk=form.instance.pk))
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -105,3 +116,23 @@ class ComparisonListAdmin(admin.ModelAdmin):
     search_fields = ['name', 'user__username']
     raw_id_fields = ['user', 'products']
     filter_horizontal = ['products']
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = [
+        'event_type', 'event_id', 'status', 'attempts', 'received_at',
+        'next_attempt_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['event_id', 'event_type']
+    readonly_fields = [
+        'event_id', 'event_type', 'payload', 'attempts', 'locked_by',
+        'locked_at', 'last_error', 'received_at', 'processed_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected events now')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='succeeded').update(
+            status='pending', next_attempt_at=timezone.now(),
+            locked_by='', locked_at=None)
+        self.message_user(request, f'{updated} events queued for retry')
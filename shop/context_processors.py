@@ -1,25 +1,27 @@
-from .models import ComparisonList, WishlistItem
+from django.utils.functional import SimpleLazyObject
+
+from .models import WishlistItem
+from .utils.shopper_state import get_shopper_state
 
 
 def wishlist_processor(request):
     """
     Context processor to make wishlist information available in all templates.
     """
+    state = get_shopper_state(request)
     wishlist_items = []
-    wishlist_product_ids = []
 
     if request.user.is_authenticated:
-        # Get the user's wishlist items
+        # Lazy queryset; only evaluated by templates that list the items
         wishlist_items = WishlistItem.objects.filter(
             user=request.user).select_related('product')
 
-        # Extract product IDs
-        wishlist_product_ids = [
-            item.product.id for item in wishlist_items if item.product]
-
     return {
+        'shopper_state': state,
         'wishlist_items': wishlist_items,
-        'wishlist_product_ids': wishlist_product_ids,
+        # Lazy, so pages that never read it do not query the wishlist
+        'wishlist_product_ids': SimpleLazyObject(
+            lambda: sorted(state.wishlist_ids)),
     }
 
 
@@ -28,26 +30,9 @@ def comparison_processor(request):
     Context processor to make comparison information available in all
     templates.
     """
-    comparison_product_ids = []
-    comparison_count = 0
-
-    if request.user.is_authenticated:
-        # Get the user's comparison list
-        try:
-            comparison_list = ComparisonList.objects.get(user=request.user)
-            comparison_product_ids = list(
-                comparison_list.products.values_list('id', flat=True)
-            )
-            comparison_count = len(comparison_product_ids)
-        except ComparisonList.DoesNotExist:
-            pass
-    else:
-        # Get from session for anonymous users
-        comparison_list = request.session.get('comparison', [])
-        comparison_product_ids = comparison_list
-        comparison_count = len(comparison_list)
+    state = get_shopper_state(request)
 
     return {
-        'comparison_product_ids': comparison_product_ids,
-        'comparison_count': comparison_count,
+        'comparison_product_ids': state.comparison_ids,
+        'comparison_count': state.comparison_count,
     }
@@ -1,13 +1,13 @@
 from django import forms
 from django.conf import settings
 
-import stripe
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import HTML, Column, Div, Field, Layout, Row
 from django_countries.fields import CountryField
 from django_countries.widgets import CountrySelectWidget
 
 from .models import Order
+from .utils.stripe_gateway import get_stripe_gateway
 
 
 class CartAddProductForm(forms.Form):
@@ -344,11 +344,8 @@ class CheckoutForm(forms.ModelForm):
                 print("Error: Stripe API key not configured")
                 return None
 
-            # Set the API key
-            stripe.api_key = stripe_api_key
-
             # Create the PaymentIntent
-            intent = stripe.PaymentIntent.create(
+            intent = get_stripe_gateway().create_payment_intent(
                 amount=amount,
                 currency=currency,
                 metadata=metadata or {},
@@ -0,0 +1,50 @@
+"""
+Django management command to verify the denormalized cart totals.
+"""
+from django.core.management.base import BaseCommand
+
+from shop.models import Cart
+from shop.utils.cart_utils import (
+    find_inconsistent_carts, recalculate_cart_totals,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that the stored item_count, unique_items and subtotal of '
+        'each cart match its items, optionally repairing any that do not.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Recalculate the totals of inconsistent carts',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = list(find_inconsistent_carts())
+
+        for cart in mismatched:
+            self.stdout.write(
+                f"Cart {cart.pk}: stored {cart.item_count} items / "
+                f"{cart.unique_items} lines / {cart.subtotal}, actual "
+                f"{cart.actual_item_count} items / "
+                f"{cart.actual_unique_items} lines / {cart.actual_subtotal}"
+            )
+
+        if not mismatched:
+            self.stdout.write(
+                self.style.SUCCESS('All cart totals are correct'))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'Found {len(mismatched)} inconsistent carts; run with '
+                '--fix to repair them'
+            ))
+            return
+
+        fixed = recalculate_cart_totals(
+            Cart.objects.filter(pk__in=[cart.pk for cart in mismatched]))
+        self.stdout.write(self.style.SUCCESS(f'Repaired {fixed} carts'))
@@ -1,9 +1,11 @@
 import logging
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.db.models import Count
 
 from shop.models import ComparisonList
+from shop.utils.comparison_utils import merge_comparison_lists
 
 logger = logging.getLogger(__name__)
 
@@ -24,40 +26,22 @@ class Command(BaseCommand):
             )
         )
 
-        # Process duplicates for each user
+        # Process duplicates for each user. New duplicates are merged when
+        # a product is added, so this only tidies up older data.
         for user_data in users_with_duplicates:
             user_id = user_data['user']
             if not user_id:
                 continue
 
-            # Get all comparison lists for this user, ordered by last update
-            lists = ComparisonList.objects.filter(
-                user_id=user_id).order_by('-updated_at')
-
-            # Keep the most recently updated one
-            primary_list = lists.first()
-            duplicate_count = lists.count() - 1
+            with transaction.atomic():
+                lists = ComparisonList.objects.select_for_update().filter(
+                    user_id=user_id)
+                duplicate_count = lists.count() - 1
+                primary_list = merge_comparison_lists(lists)
 
             self.stdout.write(
-                f"User {user_id}: Merging {duplicate_count} lists into list {
-                    primary_list.id}")
-
-            # Migrate all products from other lists to the primary list
-            for cl in lists[1:]:  # Skip the first one (primary)
-                # Get product IDs from this list
-                product_ids = cl.products.values_list('id', flat=True)
-
-                # Add them to the primary list
-                for product_id in product_ids:
-                    primary_list.products.add(product_id)
-
-                # Delete the duplicate list
-                cl_id = cl.id
-                cl.delete()
-                self.stdout.write(f"  - Deleted list {cl_id}")
-
-            # Update the timestamp
-            primary_list.save()
+                f"User {user_id}: Merged {duplicate_count} lists into list "
+                f"{primary_list.id}")
 
         self.stdout.write(self.style.SUCCESS(
             'Successfully cleaned up duplicate comparison lists'))
@@ -13,7 +13,7 @@ from django.utils import timezone
 from django.utils.text import slugify
 
 from products.models import Category, InventoryLog, Product
-from shop.models import Cart, CartItem, Order, OrderItem, WishlistItem
+from shop.models import Cart, Order, OrderItem, WishlistItem
 from skunkmonkey.utils.s3_utils import upload_base64_to_model_field
 
 
@@ -516,10 +516,6 @@ class Command(BaseCommand):
 
             for product in cart_products:
                 quantity = random.randint(1, 2)
-                CartItem.objects.create(
-                    cart=cart,
-                    product=product,
-                    quantity=quantity
-                )
+                cart.add(product, quantity=quantity)
 
             self.stdout.write(f"  Added {len(cart_products)} products to {user.username}'s cart")
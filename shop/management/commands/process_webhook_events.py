@@ -0,0 +1,57 @@
+"""
+Django management command to process queued Stripe webhook events.
+"""
+from django.core.management.base import BaseCommand
+
+from shop.webhook_worker import run_worker
+from skunkmonkey.utils.workers import run_in_threads
+
+
+class Command(BaseCommand):
+    help = (
+        'Process Stripe webhook events stored in the WebhookEvent inbox, '
+        'retrying failures with backoff. Runs until interrupted unless '
+        '--once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker threads (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Events claimed by a worker at a time (default: 10)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when no events are due (default: 5)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no events are due instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+
+        processed = run_in_threads(
+            run_worker, workers, 'webhook-worker',
+            on_stop=lambda: self.stdout.write('Stopping webhook workers...'),
+            **kwargs)
+        if processed is None:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} webhook events'))
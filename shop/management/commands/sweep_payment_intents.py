@@ -0,0 +1,69 @@
+"""
+Django management command to cancel abandoned Stripe payment intents.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from shop.utils.stripe_utils import sweep_abandoned_payment_intents
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancel Stripe payment intents that were never paid, are older '
+        'than --hours and have no order. Meant to run daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=None,
+            help='Age after which an unpaid intent counts as abandoned '
+                 '(default: STRIPE_INTENT_ABANDON_AFTER, one day)',
+        )
+        parser.add_argument(
+            '--max-age-hours',
+            type=float,
+            default=None,
+            help='Skip intents older than this; earlier runs saw them '
+                 '(default: STRIPE_INTENT_SWEEP_MAX_AGE, seven days)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Intents fetched per Stripe request (default: 100)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after cancelling this many intents',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many intents would be cancelled',
+        )
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['hours'] is not None:
+            older_than = timedelta(hours=options['hours'])
+        max_age = None
+        if options['max_age_hours'] is not None:
+            max_age = timedelta(hours=options['max_age_hours'])
+
+        counts = sweep_abandoned_payment_intents(
+            older_than=older_than,
+            max_age=max_age,
+            batch_size=min(max(1, options['batch_size']), 100),
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+        )
+
+        verb = 'Would cancel' if options['dry_run'] else 'Cancelled'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {counts['cancelled']} of {counts['checked']} payment "
+            f"intents checked ({counts['failed']} failed)"))
@@ -1,35 +1,26 @@
 import logging
-import uuid
 
 from django.utils.deprecation import MiddlewareMixin
 
-from .models import Cart, ComparisonList
+from .utils.cart_utils import LazyCart
+from .utils.comparison_utils import LazyComparisonList
 
 logger = logging.getLogger(__name__)
 
 
 class CartMiddleware:
+    """
+    Attach a lazily-loaded cart to every request as ``request.cart``.
+
+    The cart is only queried when something reads it and only created on
+    the first add-to-cart; see shop.utils.cart_utils.LazyCart.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Get or create cart for the current user/session
-        if request.user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=request.user)
-        else:
-            session_id = request.session.get('cart_id')
-            if not session_id:
-                # If no session ID exists, create a new cart with a new session
-                # ID
-                session_id = str(uuid.uuid4())
-                request.session['cart_id'] = session_id
-                cart = Cart.objects.create(session_id=session_id)
-            else:
-                cart, created = Cart.objects.get_or_create(
-                    session_id=session_id)
-
-        # Attach the cart to the request
-        request.cart = cart
+        request.cart = LazyCart(request)
 
         response = self.get_response(request)
         return response
@@ -52,12 +43,12 @@ class CheckoutDebugMiddleware(MiddlewareMixin):
             if hasattr(request, 'cart'):
                 cart = request.cart
                 logger.error(
-                    f"Cart info: Items count: {cart.items.count()}, "
+                    f"Cart info: Items count: {len(cart)}, "
                     f"Total: {cart.total_price}"
                 )
 
                 # Log individual items
-                for item in cart.items.all():
+                for item in cart.snapshot():
                     logger.error(
                         f"Cart item: {item.product.name}, "
                         f"Quantity: {item.quantity}"
@@ -103,64 +94,19 @@ class CheckoutDebugMiddleware(MiddlewareMixin):
 
 
 class ComparisonMiddleware:
+    """
+    Attach a lazily-loaded comparison list to every request as
+    ``request.comparison_list``.
+
+    Nothing is queried until the list is read and no row is created until a
+    product is added; see shop.utils.comparison_utils.LazyComparisonList.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Get or create comparison list for the current user/session
-        if request.user.is_authenticated:
-            # For authenticated users, use user_id
-            comparison_lists = ComparisonList.objects.filter(
-                user=request.user).order_by('-updated_at')
-
-            if comparison_lists.exists():
-                comparison_list = comparison_lists.first()
-
-                # If there are duplicates, log it
-                if comparison_lists.count() > 1:
-                    logger.warning(
-                        f"Multiple comparison lists found for user "
-                        f"{request.user.id}. Using most recent."
-                    )
-            else:
-                # Create a new list if none exists
-                comparison_list = ComparisonList.objects.create(
-                    user=request.user)
-        else:
-            # For anonymous users, use session_id
-            session_id = request.session.get('comparison_id')
-
-            if not session_id:
-                # If no session ID exists, create a new comparison list with a
-                # new session ID
-                session_id = str(uuid.uuid4())
-                request.session['comparison_id'] = session_id
-                comparison_list = ComparisonList.objects.create(
-                    session_id=session_id)
-            else:
-                # Get the comparison lists for this session
-                comparison_lists = ComparisonList.objects.filter(
-                    session_id=session_id).order_by('-updated_at')
-
-                if comparison_lists.exists():
-                    comparison_list = comparison_lists.first()
-
-                    # If there are duplicates, log it
-                    if comparison_lists.count() > 1:
-                        logger.warning(
-                            f"Multiple comparison lists found for session "
-                            f"{session_id}. Using most recent."
-                        )
-                else:
-                    # Create a new list if none exists for this session
-                    comparison_list = ComparisonList.objects.create(
-                        session_id=session_id)
-
-        # Attach the comparison list to the request
-        request.comparison_list = comparison_list
-        request.comparison_list.product_ids = [
-            product.id for product in comparison_list.products.all()
-        ]
+        request.comparison_list = LazyComparisonList(request)
 
         response = self.get_response(request)
         return response
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:07
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    """Populate the new totals from each cart's existing items"""
+    Cart = apps.get_model('shop', 'Cart')
+    CartItem = apps.get_model('shop', 'CartItem')
+
+    def item_aggregate(expression, output_field):
+        rows = CartItem.objects.filter(
+            cart=OuterRef('pk')
+        ).order_by().values('cart').annotate(
+            value=expression
+        ).values('value')
+        return Coalesce(
+            Subquery(rows, output_field=output_field), 0,
+            output_field=output_field
+        )
+
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    Cart.objects.order_by().update(
+        item_count=item_aggregate(Sum('quantity'), models.IntegerField()),
+        unique_items=item_aggregate(Count('id'), models.IntegerField()),
+        subtotal=item_aggregate(
+            Sum(F('quantity') * F('product__price'), output_field=money),
+            money
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_alter_cart_session_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='unique_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Clear duplicates that would break the new unique constraints.
+
+    Repeated inbox rows for one Stripe event are dropped, keeping the
+    first. Orders sharing a PaymentIntent keep the oldest as the owner of
+    the stripe_pid; the others get a suffixed pid and a note so they can be
+    reviewed by hand.
+    """
+    WebhookEvent = apps.get_model('shop', 'WebhookEvent')
+    Order = apps.get_model('shop', 'Order')
+
+    repeated = WebhookEvent.objects.values('event_id').annotate(
+        n=Count('id')).filter(n__gt=1).values_list('event_id', flat=True)
+    for event_id in list(repeated):
+        ids = list(WebhookEvent.objects.filter(
+            event_id=event_id).order_by('id').values_list('id', flat=True))
+        WebhookEvent.objects.filter(id__in=ids[1:]).delete()
+
+    shared = Order.objects.exclude(stripe_pid='').values(
+        'stripe_pid').annotate(n=Count('id')).filter(
+        n__gt=1).values_list('stripe_pid', flat=True)
+    for pid in list(shared):
+        for order in Order.objects.filter(
+                stripe_pid=pid).order_by('created_at', 'id')[1:]:
+            order.stripe_pid = f'{pid}#duplicate-{order.pk}'[:255]
+            order.notes = (
+                f'{order.notes}\nDuplicate order for PaymentIntent {pid}'
+            ).strip()
+            order.save(update_fields=['stripe_pid', 'notes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_webhookevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('stripe_pid', ''), _negated=True), fields=('stripe_pid',), name='shop_order_unique_stripe_pid'),
+        ),
+    ]
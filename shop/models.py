@@ -2,7 +2,7 @@ import decimal
 import uuid
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
 
@@ -22,6 +22,18 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     session_id = models.CharField(max_length=255, blank=True, default='')
+    # Denormalized totals, kept in step by add/remove/clear and by product
+    # price changes so reading them never touches the items table.
+    # Verify or repair with the check_cart_totals command.
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    unique_items = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False)
+    # Bumped by every change to the items or totals; with the subtotal it
+    # identifies the cart state a Stripe PaymentIntent was priced for
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    TOTAL_FIELDS = ('item_count', 'unique_items', 'subtotal')
 
     class Meta:
         ordering = ('-created_at',)
@@ -35,41 +47,73 @@ class Cart(models.Model):
 
     def __len__(self):
         """
-        Return the number of items in the cart
+        Return the number of distinct products in the cart
         """
-        return self.items.count()
+        return self.unique_items
 
     @property
-    def item_count(self):
+    def total_price(self):
         """
-        Returns the total number of items in the cart.
-        This property is used in templates.
+        Total price of all items in the cart
         """
-        return len(self)  # Use the existing __len__ method
+        return self.subtotal
 
-    @property
-    def total_price(self):
+    def snapshot(self):
         """
-        Calculate total price of all items in the cart
+        Return the cart's items with their products, loaded in one query.
+
+        The list is memoized on this instance, so every serializer used
+        during a request shares it; add/remove/clear reset it.
         """
-        return sum(item.total_price for item in self.items.all())
+        if getattr(self, '_snapshot', None) is None:
+            self._snapshot = list(self.items.select_related('product'))
+        return self._snapshot
 
-    def add(self, product, quantity=1, update_quantity=False):
+    def _adjust_totals(self, quantity=0, unique_items=0, amount=0):
         """
-        Add a product to the cart or update its quantity
+        Apply a change to the stored totals with a single UPDATE, then
+        reload them so this instance reflects concurrent changes too
         """
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self,
-            product=product,
-            defaults={'quantity': quantity}
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=models.F('item_count') + quantity,
+            unique_items=models.F('unique_items') + unique_items,
+            subtotal=models.F('subtotal') + amount,
+            version=models.F('version') + 1,
+            updated_at=timezone.now()
         )
+        self.refresh_from_db(
+            fields=self.TOTAL_FIELDS + ('version', 'updated_at'))
+        self._snapshot = None
 
-        if not created:
-            if update_quantity:
-                cart_item.quantity = quantity
+    def add(self, product, quantity=1, update_quantity=False):
+        """
+        Add a product to the cart or update its quantity
+        """
+        with transaction.atomic():
+            cart_item, created = (
+                CartItem.objects.select_for_update().get_or_create(
+                    cart=self,
+                    product=product,
+                    defaults={'quantity': quantity}
+                )
+            )
+
+            if created:
+                delta = quantity
             else:
-                cart_item.quantity += quantity
-            cart_item.save()
+                old_quantity = cart_item.quantity
+                if update_quantity:
+                    cart_item.quantity = quantity
+                else:
+                    cart_item.quantity += quantity
+                cart_item.save()
+                delta = cart_item.quantity - old_quantity
+
+            self._adjust_totals(
+                quantity=delta,
+                unique_items=1 if created else 0,
+                amount=delta * product.price
+            )
 
         return cart_item
 
@@ -77,17 +121,32 @@ class Cart(models.Model):
         """
         Remove a product from the cart
         """
-        try:
-            item = CartItem.objects.get(cart=self, product=product)
+        with transaction.atomic():
+            try:
+                item = CartItem.objects.select_for_update().select_related(
+                    'product').get(cart=self, product=product)
+            except CartItem.DoesNotExist:
+                return
             item.delete()
-        except CartItem.DoesNotExist:
-            pass
+            self._adjust_totals(
+                quantity=-item.quantity,
+                unique_items=-1,
+                amount=-item.total_price
+            )
 
     def clear(self):
         """
         Remove all items from the cart
         """
-        self.items.all().delete()
+        with transaction.atomic():
+            self.items.all().delete()
+            Cart.objects.filter(pk=self.pk).update(
+                item_count=0, unique_items=0, subtotal=0,
+                version=models.F('version') + 1,
+                updated_at=timezone.now())
+            self.refresh_from_db(
+                fields=self.TOTAL_FIELDS + ('version', 'updated_at'))
+            self._snapshot = None
 
     def to_dict(self):
         """
@@ -103,7 +162,7 @@ class Cart(models.Model):
                     'quantity': item.quantity,
                     'price': str(item.price),
                     'total_price': str(item.total_price)
-                } for item in self.items.all()
+                } for item in self.snapshot()
             ],
             'total_price': str(self.total_price)
         }
@@ -234,6 +293,14 @@ class Order(models.Model):
         ordering = ('-created_at',)
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        constraints = [
+            # One order per PaymentIntent, so the webhook and the checkout
+            # POST cannot both create one
+            models.UniqueConstraint(
+                fields=['stripe_pid'],
+                condition=~models.Q(stripe_pid=''),
+                name='shop_order_unique_stripe_pid'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number}"
@@ -433,3 +500,51 @@ class ComparisonList(models.Model):
         if self.user:
             return f"{self.name} for {self.user.username}"
         return f"{self.name} (session: {self.session_id[:8] if self.session_id else 'None'})"
+
+
+class WebhookEvent(models.Model):
+    """
+    Verified Stripe webhook event waiting to be processed
+
+    The webhook view only verifies the signature, stores the event here and
+    replies; the process_webhook_events worker drains the inbox, retrying
+    failed events with exponential backoff.
+
+    Rows are unique on the Stripe event id and are kept once processed, so
+    the table is also the ledger of handled events: a redelivered event is
+    found by one indexed lookup and never processed twice.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('received_at',)
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='shop_webhook_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
@@ -15,16 +15,18 @@ import stripe
 # Import djstripe models
 from djstripe.models import Customer, PaymentMethod
 
-logger = logging.getLogger(__name__)
+from .utils.stripe_gateway import get_stripe_gateway
 
-# Set the Stripe API key
-# stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 
 @login_required
 def payment_methods_list(request):
     """
     View to list the user's saved payment methods
+
+    The list is served from the gateway's short-lived cache, which the
+    views below clear whenever they change the customer's methods.
     """
     try:
         # Get or create the Stripe customer for this user
@@ -34,12 +36,10 @@ def payment_methods_list(request):
         payment_methods = []
 
         if not created:
-            # Get the payment methods from Stripe API directly to ensure latest
-            # data
-            stripe_payment_methods = stripe.PaymentMethod.list(
-                customer=customer.id,
-                type="card",
-            )
+            # Get the payment methods from Stripe
+            stripe_payment_methods = (
+                get_stripe_gateway().list_payment_methods(
+                    customer.id, type="card"))
 
             # Format the payment methods for the frontend
             payment_methods = [{
@@ -53,7 +53,7 @@ def payment_methods_list(request):
                 },
                 'isDefault': customer.default_payment_method and (
                     customer.default_payment_method.id == pm.id)
-            } for pm in stripe_payment_methods.data]
+            } for pm in stripe_payment_methods]
 
         return JsonResponse({
             'success': True,
@@ -88,22 +88,17 @@ def attach_payment_method(request):
         customer, created = Customer.get_or_create(subscriber=request.user)
 
         # Attach the payment method to the customer
-        payment_method = stripe.PaymentMethod.attach(
-            payment_method_id,
-            customer=customer.id
-        )
+        gateway = get_stripe_gateway()
+        payment_method = gateway.attach_payment_method(
+            payment_method_id, customer.id)
 
         # Sync the payment method to the local database
         PaymentMethod.sync_from_stripe_data(payment_method)
 
         # Set as default if requested
         if set_as_default:
-            customer = stripe.Customer.modify(
-                customer.id,
-                invoice_settings={
-                    'default_payment_method': payment_method_id
-                }
-            )
+            customer = gateway.set_default_payment_method(
+                customer.id, payment_method_id)
 
             # Update the local customer record
             Customer.sync_from_stripe_data(customer)
@@ -156,19 +151,17 @@ def delete_payment_method(request, payment_method_id):
             }, status=403)
 
         # If this is the default payment method, unset it first
+        gateway = get_stripe_gateway()
         if (customer.default_payment_method
                 and customer.default_payment_method.id == payment_method_id):
-            stripe.Customer.modify(
-                customer.id,
-                invoice_settings={'default_payment_method': None}
-            )
+            gateway.set_default_payment_method(customer.id, None)
 
             # Update the local customer record
             customer.default_payment_method = None
             customer.save()
 
         # Detach the payment method from the customer
-        stripe.PaymentMethod.detach(payment_method_id)
+        gateway.detach_payment_method(payment_method_id, customer.id)
 
         # Delete from local database
         payment_method.delete()
@@ -209,12 +202,8 @@ def set_default_payment_method(request, payment_method_id):
             }, status=403)
 
         # Set as default in Stripe
-        stripe_customer = stripe.Customer.modify(
-            customer.id,
-            invoice_settings={
-                'default_payment_method': payment_method_id
-            }
-        )
+        stripe_customer = get_stripe_gateway().set_default_payment_method(
+            customer.id, payment_method_id)
 
         # Update the local customer record
         Customer.sync_from_stripe_data(stripe_customer)
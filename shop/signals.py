@@ -0,0 +1,119 @@
+# shop/signals.py
+import logging
+
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from djstripe.models import APIKey
+
+from products.models import Product
+
+from .models import Cart, CartItem, ComparisonList, WishlistItem
+from .utils.cart_utils import recalculate_cart_totals
+from .utils.shopper_state import get_cache_timeout, invalidate_shopper_state
+from .utils.stripe_utils import invalidate_stripe_keys
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=WishlistItem)
+@receiver(post_delete, sender=WishlistItem)
+def wishlist_changed(sender, instance, **kwargs):
+    """Drop cached shopper state when a wishlist changes."""
+    invalidate_shopper_state(instance.user_id)
+
+
+@receiver(m2m_changed, sender=ComparisonList.products.through)
+def comparison_products_changed(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Drop cached shopper state when comparison products change."""
+    if not action.startswith('post_') or not get_cache_timeout():
+        return
+    if not reverse:
+        invalidate_shopper_state(instance.user_id)
+        return
+    # Changed from the product side; pk_set holds comparison list ids
+    lists = ComparisonList.objects.exclude(user=None)
+    if pk_set is not None:
+        lists = lists.filter(pk__in=pk_set)
+    for user_id in lists.values_list('user_id', flat=True).distinct():
+        invalidate_shopper_state(user_id)
+
+
+@receiver(post_delete, sender=ComparisonList)
+def comparison_list_deleted(sender, instance, **kwargs):
+    """Drop cached shopper state when a comparison list is removed."""
+    invalidate_shopper_state(instance.user_id)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    """Drop cached shopper state when a cart's contents change."""
+    if not get_cache_timeout():
+        return
+    try:
+        invalidate_shopper_state(instance.cart.user_id)
+    except CartItem.cart.RelatedObjectDoesNotExist:
+        # The cart itself is being deleted
+        pass
+
+
+@receiver(post_save, sender='staff.StaffNotification')
+@receiver(post_delete, sender='staff.StaffNotification')
+def staff_notification_changed(sender, instance, **kwargs):
+    """Drop cached shopper state when a staff notification changes."""
+    invalidate_shopper_state(instance.recipient_id)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_price(sender, instance, raw=False, **kwargs):
+    """Note whether a product's price is about to change."""
+    instance._cart_price_changed = False
+    if raw or instance.pk is None:
+        return
+    old_price = Product.objects.filter(
+        pk=instance.pk).values_list('price', flat=True).first()
+    instance._cart_price_changed = (
+        old_price is not None and old_price != instance.price)
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, **kwargs):
+    """Recompute the totals of carts holding a product whose price changed."""
+    if not getattr(instance, '_cart_price_changed', False):
+        return
+    try:
+        updated = recalculate_cart_totals(
+            Cart.objects.filter(items__product=instance))
+        logger.info(
+            f"Recalculated {updated} cart totals after price change of "
+            f"product {instance.pk}")
+    except Exception as e:
+        # Never block a product save; check_cart_totals --fix repairs this
+        logger.error(
+            f"Error recalculating cart totals for product {instance.pk}: {e}")
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_carts(sender, instance, **kwargs):
+    """Note which carts lose an item when a product is deleted."""
+    instance._cart_ids = list(Cart.objects.filter(
+        items__product=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def recalculate_product_carts(sender, instance, **kwargs):
+    """Recompute the totals of carts whose items were cascade-deleted."""
+    cart_ids = getattr(instance, '_cart_ids', None)
+    if cart_ids:
+        recalculate_cart_totals(Cart.objects.filter(pk__in=cart_ids))
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def stripe_api_key_changed(sender, instance, **kwargs):
+    """Make processes resolve their Stripe keys again."""
+    invalidate_stripe_keys()
@@ -1,6 +1,6 @@
 from django import template
 
-from ..models import ComparisonList
+from ..utils.shopper_state import get_shopper_state
 
 register = template.Library()
 
@@ -12,17 +12,7 @@ def is_in_comparison(product, request):
 
     Usage: {% if product|is_in_comparison:request %}
     """
-    if request.user.is_authenticated:
-        # For authenticated users, check database
-        try:
-            comparison_list = ComparisonList.objects.get(user=request.user)
-            return comparison_list.products.filter(id=product.id).exists()
-        except ComparisonList.DoesNotExist:
-            return False
-    else:
-        # For anonymous users, check session
-        comparison_list = request.session.get('comparison', [])
-        return product.id in comparison_list
+    return get_shopper_state(request).is_in_comparison(product)
 
 
 @register.simple_tag(takes_context=True)
@@ -32,18 +22,7 @@ def get_comparison_items(context):
 
     Usage: {% get_comparison_items as comparison_product_ids %}
     """
-    request = context['request']
-
-    if request.user.is_authenticated:
-        # For authenticated users, get from database
-        try:
-            comparison_list = ComparisonList.objects.get(user=request.user)
-            return list(comparison_list.products.values_list('id', flat=True))
-        except ComparisonList.DoesNotExist:
-            return []
-    else:
-        # For anonymous users, get from session
-        return request.session.get('comparison', [])
+    return get_shopper_state(context['request']).comparison_ids
 
 
 @register.simple_tag(takes_context=True)
@@ -0,0 +1,39 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from products.card_cache import render_product_cards
+
+from ..utils.shopper_state import get_shopper_state
+
+register = template.Library()
+
+CARD_TEMPLATE = 'shop/includes/product_card.html'
+
+
+@register.simple_tag(takes_context=True)
+def product_grid_cards(context, products):
+    """
+    Render the shop grid's product cards from the card fragment cache
+
+    The visitor's wishlist and comparison state are passed as flags, so a
+    cached card is shared by every visitor with the same state.
+
+    Usage: {% product_grid_cards products %}
+    """
+    request = context.get('request')
+    if request is None:
+        return mark_safe(''.join(
+            render_product_cards(products, CARD_TEMPLATE)))
+
+    state = get_shopper_state(request)
+    authenticated = request.user.is_authenticated
+
+    def variant(product):
+        return {
+            'show_wishlist': authenticated,
+            'in_wishlist': state.is_in_wishlist(product),
+            'in_comparison': state.is_in_comparison(product),
+        }
+
+    return mark_safe(''.join(render_product_cards(
+        products, CARD_TEMPLATE, request=request, variant=variant)))
@@ -1,6 +1,7 @@
 from django import template
 
 from ..models import WishlistItem
+from ..utils.shopper_state import get_shopper_state
 
 register = template.Library()
 
@@ -15,6 +16,11 @@ def is_in_wishlist(product, user):
     if not user.is_authenticated:
         return False
 
+    # Use the request's shopper state when the user came from the request
+    state = getattr(user, '_shopper_state', None)
+    if state is not None:
+        return state.is_in_wishlist(product)
+
     return WishlistItem.objects.filter(user=user, product=product).exists()
 
 
@@ -25,12 +31,8 @@ def get_wishlist_items(context):
 
     Usage: {% get_wishlist_items as wishlist_product_ids %}
     """
-    user = context['request'].user
-    if not user.is_authenticated:
+    request = context['request']
+    if not request.user.is_authenticated:
         return []
 
-    return list(
-        WishlistItem.objects.filter(
-            user=user).values_list(
-            'product_id',
-            flat=True))
+    return sorted(get_shopper_state(request).wishlist_ids)
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import Category, Product
+
+from ..models import Cart
+from ..utils.session_utils import get_cart_signature
+from ..utils.stripe_utils import cart_to_dict
+
+User = get_user_model()
+
+
+class CartSnapshotTest(TestCase):
+    """Tests for the shared, prefetched cart snapshot"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                description='Test description',
+                price=Decimal('5.00') + i,
+                category=self.category
+            )
+            for i in range(6)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, size):
+        for product in self.products[:size]:
+            self.cart.add(product)
+
+    def test_serializers_share_one_query(self):
+        """Test to_dict, cart_to_dict and the signature load items once"""
+        self.fill_cart(5)
+        cart = Cart.objects.select_related('user').get(pk=self.cart.pk)
+
+        with self.assertNumQueries(1):
+            data = cart.to_dict()
+            cart_to_dict(cart)
+            get_cart_signature(cart)
+
+        self.assertEqual(len(data['items']), 5)
+        self.assertEqual(data['total_price'], '35.00')
+
+    def test_snapshot_resets_after_changes(self):
+        """Test adding an item refreshes the memoized snapshot"""
+        self.fill_cart(1)
+        self.assertEqual(len(self.cart.snapshot()), 1)
+        self.cart.add(self.products[1])
+        self.assertEqual(len(self.cart.snapshot()), 2)
+
+    def count_add_view_queries(self):
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                reverse('shop:cart_add', args=[self.products[-1].id]),
+                {'quantity': 1},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        self.assertTrue(response.json()['success'])
+        self.cart.remove(self.products[-1])
+        return len(queries)
+
+    def test_add_view_query_count_is_independent_of_cart_size(self):
+        """Test the add-to-cart JSON response does not query per item"""
+        self.fill_cart(1)
+        small = self.count_add_view_queries()
+
+        self.fill_cart(5)
+        self.assertEqual(self.count_add_view_queries(), small)
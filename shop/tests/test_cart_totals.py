@@ -0,0 +1,101 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from products.models import Category, Product
+
+from ..models import Cart
+
+
+class CartTotalsTest(TestCase):
+    """Tests for the denormalized cart totals"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.product = Product.objects.create(
+            name='Test Product',
+            description='Test description',
+            price=Decimal('10.00'),
+            category=self.category
+        )
+        self.product2 = Product.objects.create(
+            name='Test Product 2',
+            description='Test description 2',
+            price=Decimal('2.50'),
+            category=self.category
+        )
+        self.cart = Cart.objects.create(session_id='test-session')
+
+    def assertTotals(self, item_count, unique_items, subtotal):
+        for cart in (self.cart, Cart.objects.get(pk=self.cart.pk)):
+            self.assertEqual(
+                (cart.item_count, cart.unique_items, cart.subtotal),
+                (item_count, unique_items, Decimal(subtotal))
+            )
+
+    def test_add_updates_totals(self):
+        """Test adding products and quantities updates the totals"""
+        self.cart.add(self.product, quantity=2)
+        self.cart.add(self.product2)
+        self.cart.add(self.product2, quantity=3)
+        self.assertTotals(6, 2, '30.00')
+        self.assertEqual(len(self.cart), 2)
+        self.assertEqual(self.cart.total_price, Decimal('30.00'))
+
+    def test_update_quantity_updates_totals(self):
+        """Test setting an item quantity adjusts the totals by the change"""
+        self.cart.add(self.product, quantity=5)
+        self.cart.add(self.product, quantity=1, update_quantity=True)
+        self.assertTotals(1, 1, '10.00')
+
+    def test_remove_and_clear_update_totals(self):
+        """Test removing items and clearing the cart updates the totals"""
+        self.cart.add(self.product, quantity=2)
+        self.cart.add(self.product2, quantity=2)
+
+        self.cart.remove(self.product)
+        self.assertTotals(2, 1, '5.00')
+
+        self.cart.clear()
+        self.assertTotals(0, 0, '0.00')
+
+    def test_price_change_reprices_carts(self):
+        """Test changing a product price updates carts holding it"""
+        self.cart.add(self.product, quantity=2)
+        self.product.price = Decimal('12.50')
+        self.product.save()
+        self.cart.refresh_from_db()
+        self.assertTotals(2, 1, '25.00')
+
+    def test_product_deletion_updates_carts(self):
+        """Test deleting a product removes it from cart totals"""
+        self.cart.add(self.product)
+        self.cart.add(self.product2, quantity=2)
+        self.product.delete()
+        self.cart.refresh_from_db()
+        self.assertTotals(2, 1, '5.00')
+
+    def test_check_command_finds_and_fixes_drift(self):
+        """Test check_cart_totals reports and repairs wrong totals"""
+        self.cart.add(self.product, quantity=2)
+        Cart.objects.filter(pk=self.cart.pk).update(
+            item_count=9, subtotal=Decimal('1.00'))
+
+        out = StringIO()
+        call_command('check_cart_totals', stdout=out)
+        self.assertIn(f'Cart {self.cart.pk}', out.getvalue())
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).item_count, 9)
+
+        call_command('check_cart_totals', '--fix', stdout=StringIO())
+        self.cart.refresh_from_db()
+        self.assertTotals(2, 1, '20.00')
+
+        out = StringIO()
+        call_command('check_cart_totals', stdout=out)
+        self.assertIn('All cart totals are correct', out.getvalue())
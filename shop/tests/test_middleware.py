@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from products.models import Category, Product
+
+from ..models import Cart, ComparisonList
+
+User = get_user_model()
+
+
+class LazyCartMiddlewareTest(TestCase):
+    """Tests for the lazily-loaded request cart"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.product = Product.objects.create(
+            name='Test Product',
+            description='Test description',
+            price=19.99,
+            category=self.category
+        )
+        self.client = Client()
+
+    def test_anonymous_browsing_creates_no_cart(self):
+        """Test anonymous page views do not create carts or session keys"""
+        response = self.client.get(reverse('shop:product_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cart.objects.count(), 0)
+        self.assertNotIn('cart_id', self.client.session)
+
+    def test_authenticated_browsing_creates_no_cart(self):
+        """Test logged in page views do not create a cart"""
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('shop:product_list'))
+        self.client.get(reverse('shop:cart'))
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_first_add_creates_anonymous_cart(self):
+        """Test the first add-to-cart creates the session cart"""
+        self.client.post(
+            reverse('shop:cart_add', args=[self.product.id]),
+            {'quantity': 1}
+        )
+        cart = Cart.objects.get()
+        self.assertEqual(cart.session_id, self.client.session['cart_id'])
+        self.assertEqual(cart.items.count(), 1)
+
+        # Later requests reuse the same cart
+        self.client.post(
+            reverse('shop:cart_add', args=[self.product.id]),
+            {'quantity': 1}
+        )
+        self.assertEqual(Cart.objects.count(), 1)
+
+
+class LazyComparisonMiddlewareTest(TestCase):
+    """Tests for the lazily-loaded request comparison list"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.product = Product.objects.create(
+            name='Test Product',
+            description='Test description',
+            price=19.99,
+            category=self.category
+        )
+        self.client = Client()
+        self.client.login(username='testuser', password='testpass123')
+
+    def toggle(self):
+        return self.client.post(
+            reverse('shop:toggle_comparison', args=[self.product.id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_browsing_creates_no_comparison_list(self):
+        """Test page views do not create comparison lists"""
+        self.client.get(reverse('shop:product_list'))
+        self.client.get(reverse('shop:comparison'))
+        self.assertEqual(ComparisonList.objects.count(), 0)
+        self.assertNotIn('comparison_id', self.client.session)
+
+    def test_toggle_creates_list_on_first_add(self):
+        """Test the list is created by the first add and reused after"""
+        self.assertTrue(self.toggle().json()['added'])
+        comparison_list = ComparisonList.objects.get(user=self.user)
+        self.assertEqual(
+            list(comparison_list.products.all()), [self.product])
+
+        self.assertTrue(self.toggle().json()['removed'])
+        self.assertEqual(ComparisonList.objects.count(), 1)
+        self.assertEqual(comparison_list.products.count(), 0)
+
+    def test_adding_merges_duplicate_lists(self):
+        """Test duplicate lists are merged on the write path"""
+        other = Product.objects.create(
+            name='Other Product',
+            description='Other description',
+            price=9.99,
+            category=self.category
+        )
+        old = ComparisonList.objects.create(user=self.user)
+        old.products.add(other)
+        ComparisonList.objects.create(user=self.user)
+
+        self.toggle()
+
+        comparison_list = ComparisonList.objects.get(user=self.user)
+        self.assertEqual(
+            set(comparison_list.products.all()), {self.product, other})
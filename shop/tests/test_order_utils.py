@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from products.models import Category, InventoryLog, Product
+
+from ..models import Order, OrderItem
+from ..utils.order_utils import (
+    add_order_items, parse_cart_lines, take_order_stock,
+)
+
+
+class OrderItemsTest(TestCase):
+    """Tests for the bulk order line and stock helpers"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.products = [
+            Product.objects.create(
+                name=f'Test Product {i}',
+                description='Test description',
+                price=Decimal('5.00') + i,
+                category=self.category,
+                stock_quantity=10,
+            )
+            for i in range(5)
+        ]
+        self.order = Order.objects.create(
+            full_name='Test User',
+            email='test@example.com',
+            shipping_address1='123 Test St',
+            shipping_city='Test City',
+            shipping_state='Test State',
+            shipping_zipcode='12345',
+            shipping_country='GB',
+            billing_address1='123 Test St',
+            billing_city='Test City',
+            billing_state='Test State',
+            billing_zipcode='12345',
+            billing_country='GB',
+            total_price=10.00,
+            grand_total=10.00,
+        )
+
+    def test_parse_cart_formats(self):
+        """Both metadata cart formats give the same lines"""
+        as_dict = {'items': {'3': {'quantity': 2}, '4': {}}}
+        as_list = {'items': [
+            {'product_id': 3, 'quantity': 2}, {'id': '4'},
+            {'product_id': 'bad'}]}
+        expected = [(3, 2, None), (4, 1, None)]
+        self.assertEqual(parse_cart_lines(as_dict), expected)
+        self.assertEqual(parse_cart_lines(as_list), expected)
+        self.assertEqual(parse_cart_lines({}), [])
+
+    def test_query_count_is_constant(self):
+        """A five line order costs the same queries as a one line order"""
+        lines = [(product.pk, 2, None) for product in self.products]
+        # in_bulk, bulk_create, stock update, inventory bulk_create
+        with self.assertNumQueries(4):
+            items, missing = add_order_items(self.order, lines)
+
+        self.assertEqual(len(items), 5)
+        self.assertEqual(missing, [])
+        self.assertEqual(self.order.items.count(), 5)
+        self.assertEqual(
+            set(Product.objects.values_list('stock_quantity', flat=True)),
+            {8})
+        self.assertEqual(InventoryLog.objects.filter(change=-2).count(), 5)
+
+    def test_lines_are_merged_and_stock_floored(self):
+        """Repeated products become one line and stock stops at zero"""
+        product = self.products[0]
+        items, _ = add_order_items(
+            self.order, [(product.pk, 7, None), (product.pk, 6, None)])
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].quantity, 13)
+        self.assertEqual(items[0].price, product.price)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 0)
+
+    def test_missing_products_are_reported(self):
+        """Unknown products are skipped and returned"""
+        items, missing = add_order_items(
+            self.order, [(self.products[0].pk, 1, Decimal('1.00')),
+                         (99999, 1, None)])
+        self.assertEqual(missing, [99999])
+        self.assertEqual(items[0].price, Decimal('1.00'))
+
+    def test_unpaid_orders_take_stock_later(self):
+        """Stock is untouched until take_order_stock runs"""
+        add_order_items(
+            self.order, [(self.products[0].pk, 3, None)], adjust_stock=False)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 10)
+        self.assertFalse(InventoryLog.objects.exists())
+
+        take_order_stock(self.order)
+
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 7)
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertEqual(InventoryLog.objects.get().change, -3)
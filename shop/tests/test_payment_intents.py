@@ -0,0 +1,207 @@
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Category, Product
+
+from ..models import Cart, Order
+from ..utils.session_utils import get_cart_signature
+from ..utils.stripe_fakes import fake_payment_intent
+from ..utils.stripe_gateway import get_stripe_gateway, reset_stripe_gateway
+from ..utils.stripe_utils import update_or_create_payment_intent
+
+
+@override_settings(
+    STRIPE_SECRET_KEY='sk_test_fake',
+    STRIPE_PUBLISHABLE_KEY='pk_test_fake',
+    STRIPE_GATEWAY_BACKEND='shop.utils.stripe_fakes.FakeStripeBackend',
+)
+class PaymentIntentReuseTest(TestCase):
+    """Tests that checkout reloads update one PaymentIntent"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        reset_stripe_gateway()
+        self.backend = get_stripe_gateway().backend
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.product = Product.objects.create(
+            name='Test Product',
+            description='Test description',
+            price=Decimal('10.00'),
+            category=self.category
+        )
+        self.cart = Cart.objects.create(session_id='test-session')
+        self.cart.add(self.product)
+
+        self.request = RequestFactory().get('/shop/checkout/')
+        self.request.user = AnonymousUser()
+        self.request.session = SessionStore()
+        self.request.cart = self.cart
+
+    def calls(self, name):
+        return [call for call in self.backend.calls if call[0] == name]
+
+    def test_signature_follows_cart_version(self):
+        """Every cart change gives a new signature without extra queries"""
+        signatures = set()
+        with self.assertNumQueries(0):
+            signatures.add(get_cart_signature(self.cart))
+        self.cart.add(self.product)
+        signatures.add(get_cart_signature(self.cart))
+        self.cart.remove(self.product)
+        signatures.add(get_cart_signature(self.cart))
+        self.cart.clear()
+        signatures.add(get_cart_signature(self.cart))
+        self.assertEqual(len(signatures), 4)
+
+    def test_price_change_changes_signature(self):
+        """Repricing a product invalidates the signature of its carts"""
+        before = get_cart_signature(self.cart)
+        self.product.price = Decimal('12.00')
+        self.product.save()
+        self.cart.refresh_from_db()
+        self.assertNotEqual(get_cart_signature(self.cart), before)
+
+    def test_cart_change_modifies_intent(self):
+        """A changed cart updates the existing intent instead of a new one"""
+        first_secret, error = update_or_create_payment_intent(self.request)
+        self.assertIsNone(error)
+
+        self.cart.add(self.product, quantity=2)
+        second_secret, error = update_or_create_payment_intent(self.request)
+
+        self.assertIsNone(error)
+        self.assertEqual(first_secret, second_secret)
+        self.assertEqual(len(self.calls('create_payment_intent')), 1)
+        self.assertEqual(len(self.calls('modify_payment_intent')), 1)
+        intent = get_stripe_gateway().retrieve_payment_intent(
+            first_secret.split('_secret')[0])
+        self.assertEqual(intent.amount, 3000)
+
+    def test_paid_intent_is_replaced(self):
+        """An intent that can no longer change is replaced"""
+        secret, _ = update_or_create_payment_intent(self.request)
+        pid = secret.split('_secret')[0]
+        self.backend.payment_intents[pid]['status'] = 'succeeded'
+
+        new_secret, error = update_or_create_payment_intent(self.request)
+
+        self.assertIsNone(error)
+        self.assertNotEqual(new_secret, secret)
+        self.assertEqual(self.request.session['client_secret'], new_secret)
+        self.assertEqual(len(self.calls('create_payment_intent')), 2)
+
+    def test_posted_secret_cannot_pick_the_intent(self):
+        """Checkout never modifies an intent named only by the form"""
+        other = fake_payment_intent(amount=500)
+        self.backend.payment_intents[other['id']] = other
+        own = fake_payment_intent(amount=1000)
+        self.backend.payment_intents[own['id']] = own
+
+        session = self.client.session
+        session['cart_id'] = self.cart.session_id
+        session['client_secret'] = own['client_secret']
+        session.save()
+
+        self.client.post(reverse('shop:checkout'), {
+            'client_secret': other['client_secret'],
+        })
+
+        modified = {call[1] for call in self.calls('modify_payment_intent')}
+        self.assertNotIn(other['id'], modified)
+        self.assertEqual(self.backend.payment_intents[other['id']]['amount'],
+                         500)
+        self.assertEqual(len(self.calls('create_payment_intent')), 1)
+        self.assertNotEqual(
+            self.client.session['client_secret'], other['client_secret'])
+
+
+@override_settings(
+    STRIPE_SECRET_KEY='sk_test_fake',
+    STRIPE_GATEWAY_BACKEND='shop.utils.stripe_fakes.FakeStripeBackend',
+)
+class SweepPaymentIntentsTest(TestCase):
+    """Tests for the abandoned payment intent sweeper"""
+
+    def setUp(self):
+        """Store intents of every kind in the fake backend"""
+        reset_stripe_gateway()
+        self.backend = get_stripe_gateway().backend
+        old = int(time.time()) - 3 * 24 * 60 * 60
+        self.intents = {
+            name: fake_payment_intent(status=status, created=created)
+            for name, status, created in [
+                ('abandoned', 'requires_payment_method', old),
+                ('abandoned_too', 'requires_action', old - 1),
+                ('paid', 'succeeded', old),
+                ('ordered', 'requires_payment_method', old),
+                ('recent', 'requires_payment_method', int(time.time())),
+                ('ancient', 'requires_payment_method',
+                 old - 30 * 24 * 60 * 60),
+            ]
+        }
+        for intent in self.intents.values():
+            self.backend.payment_intents[intent['id']] = intent
+        Order.objects.create(
+            full_name='Test User',
+            email='test@example.com',
+            shipping_address1='123 Test St',
+            shipping_city='Test City',
+            shipping_state='Test State',
+            shipping_zipcode='12345',
+            shipping_country='GB',
+            billing_address1='123 Test St',
+            billing_city='Test City',
+            billing_state='Test State',
+            billing_zipcode='12345',
+            billing_country='GB',
+            total_price=10.00,
+            grand_total=10.00,
+            stripe_pid=self.intents['ordered']['id'],
+        )
+
+    def status(self, name):
+        return self.backend.payment_intents[
+            self.intents[name]['id']]['status']
+
+    def test_only_abandoned_intents_are_cancelled(self):
+        """Old unpaid intents without an order are cancelled in pages"""
+        out = StringIO()
+        call_command('sweep_payment_intents', '--batch-size', '1',
+                     stdout=out)
+
+        self.assertIn('Cancelled 2 of 4', out.getvalue())
+        self.assertEqual(self.status('abandoned'), 'canceled')
+        self.assertEqual(self.status('abandoned_too'), 'canceled')
+        self.assertEqual(self.status('paid'), 'succeeded')
+        self.assertEqual(self.status('ordered'), 'requires_payment_method')
+        self.assertEqual(self.status('recent'), 'requires_payment_method')
+        self.assertEqual(self.status('ancient'), 'requires_payment_method')
+        self.assertEqual(
+            self.backend.calls.count(('list_payment_intents', None)), 4)
+
+    def test_max_age_widens_the_window(self):
+        """--max-age-hours reaches intents earlier runs skipped"""
+        out = StringIO()
+        call_command('sweep_payment_intents', '--max-age-hours', '2400',
+                     stdout=out)
+        self.assertIn('Cancelled 3 of 5', out.getvalue())
+        self.assertEqual(self.status('ancient'), 'canceled')
+
+    def test_dry_run_cancels_nothing(self):
+        """--dry-run only reports"""
+        out = StringIO()
+        call_command('sweep_payment_intents', '--dry-run', stdout=out)
+        self.assertIn('Would cancel 2', out.getvalue())
+        self.assertEqual(self.status('abandoned'), 'requires_payment_method')
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Category, Product
+from staff.models import StaffNotification
+
+from ..context_processors import wishlist_processor
+from ..models import WishlistItem
+from ..utils.cart_utils import LazyCart
+from ..utils.comparison_utils import LazyComparisonList
+from ..utils.shopper_state import get_shopper_state
+
+User = get_user_model()
+
+
+class ShopperStateTest(TestCase):
+    """Tests for the request-scoped shopper state"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='test-category',
+            friendly_name='Test Category'
+        )
+        self.product = Product.objects.create(
+            name='Test Product',
+            description='Test description',
+            price=19.99,
+            category=self.category
+        )
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def make_request(self):
+        request = self.factory.get('/')
+        SessionMiddleware(lambda r: None).process_request(request)
+        request.user = User.objects.get(pk=self.user.pk)
+        request.cart = LazyCart(request)
+        request.comparison_list = LazyComparisonList(request)
+        return request
+
+    def test_values_are_computed_once_per_request(self):
+        """Test repeated reads in a request reuse the first query"""
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        request = self.make_request()
+        state = get_shopper_state(request)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(state.is_in_wishlist(self.product))
+            self.assertEqual(state.wishlist_ids, {self.product.id})
+        self.assertIs(get_shopper_state(request), state)
+
+    def test_context_processor_reads_wishlist_on_demand(self):
+        """Test the wishlist is only queried when a template reads it"""
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        request = self.make_request()
+
+        with self.assertNumQueries(0):
+            context = wishlist_processor(request)
+        with self.assertNumQueries(1):
+            self.assertIn(self.product.id, context['wishlist_product_ids'])
+            self.assertEqual(len(context['wishlist_product_ids']), 1)
+
+    def test_empty_state_for_new_user(self):
+        """Test a user with no activity gets empty values"""
+        state = get_shopper_state(self.make_request())
+        self.assertEqual(state.comparison_ids, [])
+        self.assertEqual(state.cart_item_count, 0)
+        self.assertEqual(state.unread_notifications_count, 0)
+
+    @override_settings(SHOPPER_STATE_CACHE_TIMEOUT=60)
+    def test_cache_is_shared_and_invalidated_on_write(self):
+        """Test cached state is reused across requests until a write"""
+        get_shopper_state(self.make_request()).wishlist_ids
+
+        request = self.make_request()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_shopper_state(request).wishlist_ids, frozenset())
+
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        self.assertEqual(
+            get_shopper_state(self.make_request()).wishlist_ids,
+            {self.product.id})
+
+    @override_settings(SHOPPER_STATE_CACHE_TIMEOUT=60)
+    def test_mark_all_read_invalidates(self):
+        """Test marking every notification read clears the cached badge"""
+        self.user.is_staff = True
+        self.user.save()
+        StaffNotification.objects.create(
+            recipient=self.user, title='New Order', message='Order placed')
+        self.assertEqual(
+            get_shopper_state(self.make_request()).unread_notifications_count,
+            1)
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('staff:mark_all_read'))
+
+        self.assertEqual(
+            get_shopper_state(self.make_request()).unread_notifications_count,
+            0)
@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..utils.stripe_fakes import FakeStripeBackend
+from ..utils.stripe_gateway import (
+    StripeAPIBackend, StripeGateway, get_stripe_gateway, reset_stripe_gateway,
+)
+
+
+@override_settings(
+    STRIPE_SECRET_KEY='sk_test_fake',
+    STRIPE_GATEWAY_BACKEND='shop.utils.stripe_fakes.FakeStripeBackend',
+)
+class StripeGatewayTest(TestCase):
+    """Tests for the shared Stripe gateway and its cache"""
+
+    def setUp(self):
+        """Use a fresh fake backend and cache"""
+        cache.clear()
+        reset_stripe_gateway()
+        self.gateway = get_stripe_gateway()
+        self.backend = self.gateway.backend
+
+    def test_backend_comes_from_settings(self):
+        """The gateway is a singleton using the configured backend"""
+        self.assertIsInstance(self.backend, FakeStripeBackend)
+        self.assertIs(get_stripe_gateway(), self.gateway)
+
+    def test_payment_intent_lookups_are_cached(self):
+        """A fresh intent is served from the cache unless asked otherwise"""
+        intent = self.gateway.create_payment_intent(
+            amount=1500, currency='gbp', metadata={'cart_items': '{}'})
+
+        cached = self.gateway.retrieve_payment_intent(intent.id)
+        self.assertEqual(cached.amount, 1500)
+        self.assertEqual(cached.metadata.cart_items, '{}')
+        self.assertNotIn(
+            ('retrieve_payment_intent', intent.id), self.backend.calls)
+
+        self.gateway.retrieve_payment_intent(intent.id, use_cache=False)
+        self.assertIn(
+            ('retrieve_payment_intent', intent.id), self.backend.calls)
+
+    def test_modify_refreshes_cached_intent(self):
+        """Changes made through the gateway are visible straight away"""
+        intent = self.gateway.create_payment_intent(amount=1500)
+        self.gateway.modify_payment_intent(intent.id, amount=2500)
+        self.assertEqual(
+            self.gateway.retrieve_payment_intent(intent.id).amount, 2500)
+
+        self.gateway.cancel_payment_intent(intent.id)
+        self.assertEqual(
+            self.gateway.retrieve_payment_intent(intent.id).status,
+            'canceled')
+
+    def test_payment_methods_cached_until_changed(self):
+        """Attach, detach and set-default clear the cached list"""
+        self.backend.add_payment_method('cus_1')
+        new_method = self.backend.add_payment_method()
+
+        self.assertEqual(len(self.gateway.list_payment_methods('cus_1')), 1)
+        self.gateway.list_payment_methods('cus_1')
+        self.assertEqual(
+            self.backend.calls.count(('list_payment_methods', 'cus_1')), 1)
+
+        self.gateway.attach_payment_method(new_method['id'], 'cus_1')
+        methods = self.gateway.list_payment_methods('cus_1')
+        self.assertEqual(len(methods), 2)
+        self.assertEqual(methods[0].card.last4, '4242')
+
+        customer = self.gateway.set_default_payment_method(
+            'cus_1', new_method['id'])
+        self.assertEqual(
+            customer.invoice_settings.default_payment_method,
+            new_method['id'])
+        self.gateway.detach_payment_method(new_method['id'], 'cus_1')
+        self.assertEqual(len(self.gateway.list_payment_methods('cus_1')), 1)
+        self.assertEqual(
+            self.backend.calls.count(('list_payment_methods', 'cus_1')), 3)
+
+
+class StripeAPIBackendTest(TestCase):
+    """Tests for the pooled Stripe API backend"""
+
+    @override_settings(
+        STRIPE_HTTP_TIMEOUT=(2, 7), STRIPE_MAX_NETWORK_RETRIES=3)
+    def test_clients_share_one_session(self):
+        """One StripeClient per key, all on the same pooled session"""
+        backend = StripeAPIBackend()
+        client = backend.client('sk_test_one')
+
+        self.assertIs(backend.client('sk_test_one'), client)
+        self.assertIsNot(backend.client('sk_test_two'), client)
+        self.assertEqual(backend.http_client._timeout, (2, 7))
+        self.assertIsNotNone(backend.http_client._session)
+        self.assertEqual(
+            client._requestor._options.max_network_retries, 3)
+
+    def test_gateway_accepts_backend(self):
+        """A backend can be passed in directly"""
+        backend = FakeStripeBackend()
+        self.assertIs(StripeGateway(backend).backend, backend)
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from djstripe.models import APIKey
+
+from ..utils.stripe_utils import (
+    get_stripe_key, invalidate_stripe_keys, warm_stripe_keys,
+)
+
+
+@override_settings(STRIPE_SECRET_KEY='', STRIPE_PUBLISHABLE_KEY='',
+                   STRIPE_LIVE_MODE=False, DEBUG=False)
+class StripeKeyResolutionTest(TestCase):
+    """Tests for the per-process Stripe key lookup"""
+
+    def setUp(self):
+        """Start every test with nothing resolved"""
+        cache.clear()
+        invalidate_stripe_keys()
+        APIKey.objects.create(
+            name='Secret', type='secret', livemode=False,
+            secret='sk_test_database')
+        APIKey.objects.create(
+            name='Publishable', type='publishable', livemode=False,
+            secret='pk_test_database')
+
+    def test_keys_resolved_once(self):
+        """Only the first lookup reads the APIKey table"""
+        with self.assertNumQueries(1):
+            self.assertEqual(get_stripe_key('secret'), 'sk_test_database')
+            self.assertEqual(
+                get_stripe_key('publishable'), 'pk_test_database')
+        with self.assertNumQueries(0):
+            get_stripe_key('secret')
+
+    def test_saving_a_key_invalidates(self):
+        """Keys saved in the admin are picked up on the next lookup"""
+        get_stripe_key('secret')
+        with self.captureOnCommitCallbacks(execute=True):
+            APIKey.objects.filter(name='Secret').delete()
+            APIKey.objects.create(
+                name='test_secret', type='secret', livemode=False,
+                secret='sk_test_rotated')
+        self.assertEqual(get_stripe_key('secret'), 'sk_test_rotated')
+
+    def test_keys_expire(self):
+        """A key rotated in another process is picked up after the TTL"""
+        get_stripe_key('secret')
+        APIKey.objects.filter(name='Secret').update(secret='sk_test_rotated')
+        with override_settings(STRIPE_KEYS_CACHE_TIMEOUT=0):
+            self.assertEqual(get_stripe_key('secret'), 'sk_test_rotated')
+
+    @override_settings(STRIPE_SECRET_KEY='sk_test_settings')
+    def test_settings_take_priority(self):
+        """A key in settings is used without any lookup"""
+        with self.assertNumQueries(0):
+            self.assertEqual(get_stripe_key('secret'), 'sk_test_settings')
+
+    @override_settings(STRIPE_LIVE_MODE=True)
+    def test_warm_up_reports_problems(self):
+        """The warm-up flags keys that do not match the live mode"""
+        APIKey.objects.filter(name='Publishable').delete()
+        invalidate_stripe_keys()
+
+        problems = warm_stripe_keys()
+
+        self.assertEqual(len(problems), 2)
+        self.assertIn('test key', problems[0])
+        self.assertIn('No publishable', problems[1])
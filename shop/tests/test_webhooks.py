@@ -0,0 +1,196 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import OutboundEmail
+
+from ..models import Order, WebhookEvent
+from ..utils.stripe_fakes import (
+    fake_event, fake_payment_intent, signed_webhook,
+)
+from ..webhook_handler import StripeWH_Handler
+from ..webhook_worker import claim_events, process_due_events
+
+WEBHOOK_SECRET = 'whsec_test_secret'
+
+
+@override_settings(
+    DJSTRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+    STRIPE_SECRET_KEY='sk_test_fake',
+    STRIPE_WEBHOOK_MAX_ATTEMPTS=2,
+)
+class WebhookInboxTest(TestCase):
+    """Tests for the Stripe webhook inbox and its worker"""
+
+    def setUp(self):
+        self.url = reverse('shop:webhook')
+
+    def post_event(self, event, secret=WEBHOOK_SECRET):
+        body, signature = signed_webhook(event, secret)
+        return self.client.post(
+            self.url, body, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature)
+
+    def create_paid_order(self, pid, **fields):
+        fields = {'status': 'paid', 'is_paid': True, **fields}
+        return Order.objects.create(
+            full_name='Test User',
+            email='test@example.com',
+            shipping_address1='123 Test St',
+            shipping_city='Test City',
+            shipping_state='Test State',
+            shipping_zipcode='12345',
+            shipping_country='GB',
+            billing_name='Test User',
+            billing_address1='123 Test St',
+            billing_city='Test City',
+            billing_state='Test State',
+            billing_zipcode='12345',
+            billing_country='GB',
+            total_price=10.00,
+            grand_total=10.00,
+            stripe_pid=pid,
+            **fields
+        )
+
+    def test_signed_event_is_queued(self):
+        """A verified event is stored and acknowledged without processing"""
+        event = fake_event('payment_intent.succeeded', fake_payment_intent())
+
+        with mock.patch.object(
+                StripeWH_Handler,
+                'handle_payment_intent_succeeded') as handler:
+            response = self.post_event(event)
+
+        self.assertEqual(response.status_code, 200)
+        handler.assert_not_called()
+        queued = WebhookEvent.objects.get()
+        self.assertEqual(queued.event_id, event['id'])
+        self.assertEqual(queued.status, 'pending')
+        self.assertEqual(queued.payload['data']['object']['id'],
+                         event['data']['object']['id'])
+
+    def test_bad_signature_is_rejected(self):
+        """Events signed with the wrong secret are not stored"""
+        event = fake_event('payment_intent.succeeded', fake_payment_intent())
+        response = self.post_event(event, secret='whsec_wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_worker_processes_event(self):
+        """The worker runs the handler and marks the event succeeded"""
+        intent = fake_payment_intent()
+        order = self.create_paid_order(intent['id'])
+        self.post_event(fake_event('payment_intent.succeeded', intent))
+
+        self.assertEqual(process_due_events(), 1)
+
+        queued = WebhookEvent.objects.get()
+        self.assertEqual(queued.status, 'succeeded')
+        self.assertEqual(queued.attempts, 1)
+        self.assertIsNotNone(queued.processed_at)
+        order.refresh_from_db()
+        self.assertTrue(order.is_paid)
+
+    def test_failures_are_retried_with_backoff(self):
+        """A failing event is rescheduled, then given up on"""
+        self.post_event(fake_event(
+            'payment_intent.payment_failed', fake_payment_intent()))
+
+        with mock.patch.object(
+                StripeWH_Handler, 'handle_payment_intent_payment_failed',
+                side_effect=RuntimeError('Stripe is down')):
+            process_due_events()
+            queued = WebhookEvent.objects.get()
+            self.assertEqual(queued.status, 'pending')
+            self.assertEqual(queued.last_error, 'Stripe is down')
+            self.assertGreater(queued.next_attempt_at, timezone.now())
+
+            # Not due yet, so nothing is claimed
+            self.assertEqual(process_due_events(), 0)
+
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            process_due_events()
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'failed')
+        self.assertEqual(queued.attempts, 2)
+
+    def test_stale_lock_is_reclaimed(self):
+        """Events abandoned mid-processing are picked up again"""
+        self.post_event(fake_event(
+            'payment_intent.payment_failed', fake_payment_intent()))
+        claim_events('crashed-worker')
+        self.assertEqual(claim_events('other-worker'), [])
+
+        WebhookEvent.objects.update(
+            locked_at=timezone.now() - timedelta(hours=1))
+        reclaimed = claim_events('other-worker')
+        self.assertEqual(len(reclaimed), 1)
+        self.assertEqual(reclaimed[0].attempts, 2)
+
+    def test_command_drains_inbox(self):
+        """process_webhook_events --once handles every due event"""
+        for _ in range(3):
+            self.post_event(fake_event(
+                'payment_intent.payment_failed', fake_payment_intent()))
+
+        call_command('process_webhook_events', '--once', stdout=StringIO())
+
+        self.assertEqual(
+            WebhookEvent.objects.filter(status='succeeded').count(), 3)
+
+
+@override_settings(
+    DJSTRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+    STRIPE_SECRET_KEY='sk_test_fake',
+)
+class WebhookIdempotencyTest(WebhookInboxTest):
+    """Tests that redelivered events and orders are handled exactly once"""
+
+    def test_redelivery_is_one_lookup(self):
+        """A repeated event id is acknowledged without a second row"""
+        event = fake_event(
+            'payment_intent.payment_failed', fake_payment_intent())
+        self.post_event(event)
+        process_due_events()
+
+        with self.assertNumQueries(1):
+            response = self.post_event(event)
+
+        self.assertEqual(response.status_code, 200)
+        queued = WebhookEvent.objects.get()
+        self.assertEqual(queued.status, 'succeeded')
+        self.assertEqual(process_due_events(), 0)
+
+    def test_order_paid_and_emailed_once(self):
+        """A second event for the same intent does not email again"""
+        intent = fake_payment_intent()
+        order = self.create_paid_order(
+            intent['id'], is_paid=False, status='created')
+
+        self.post_event(fake_event('payment_intent.succeeded', intent))
+        process_due_events()
+        order.refresh_from_db()
+        self.assertTrue(order.is_paid)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+        self.post_event(fake_event('payment_intent.succeeded', intent))
+        process_due_events()
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(
+            WebhookEvent.objects.filter(status='succeeded').count(), 2)
+
+    def test_stripe_pid_is_unique(self):
+        """Two orders cannot share a PaymentIntent, blank pids can repeat"""
+        self.create_paid_order('')
+        self.create_paid_order('')
+        self.create_paid_order('pi_unique')
+        with self.assertRaises(IntegrityError):
+            self.create_paid_order('pi_unique')
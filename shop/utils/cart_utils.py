@@ -0,0 +1,224 @@
+"""
+Cart utility functions for the shop app
+Provides the lazily-loaded cart attached to each request by CartMiddleware
+and helpers for keeping the denormalized cart totals correct
+"""
+import logging
+import uuid
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+
+def cart_totals_subqueries():
+    """
+    Build correlated subqueries computing each Cart's totals from its items
+
+    Returns:
+        Dict mapping Cart total field names to expressions
+    """
+    def item_aggregate(expression, output_field):
+        rows = CartItem.objects.filter(
+            cart=OuterRef('pk')
+        ).order_by().values('cart').annotate(
+            value=expression
+        ).values('value')
+        return Coalesce(
+            Subquery(rows, output_field=output_field), 0,
+            output_field=output_field
+        )
+
+    money = DecimalField(max_digits=10, decimal_places=2)
+    return {
+        'item_count': item_aggregate(Sum('quantity'), IntegerField()),
+        'unique_items': item_aggregate(Count('id'), IntegerField()),
+        'subtotal': item_aggregate(
+            Sum(F('quantity') * F('product__price'), output_field=money),
+            money
+        ),
+    }
+
+
+def recalculate_cart_totals(carts=None):
+    """
+    Recompute the stored totals of carts from their items in one UPDATE
+
+    Args:
+        carts: Optional Cart queryset; defaults to every cart
+
+    Returns:
+        Number of carts updated
+    """
+    if carts is None:
+        carts = Cart.objects.all()
+    return carts.order_by().update(
+        updated_at=timezone.now(), version=F('version') + 1,
+        **cart_totals_subqueries())
+
+
+def find_inconsistent_carts(carts=None):
+    """
+    Find carts whose stored totals differ from their items
+
+    Args:
+        carts: Optional Cart queryset; defaults to every cart
+
+    Returns:
+        Queryset of mismatched carts annotated with ``actual_<field>``
+    """
+    if carts is None:
+        carts = Cart.objects.all()
+    actual = {
+        f'actual_{name}': expression
+        for name, expression in cart_totals_subqueries().items()
+    }
+    mismatched = carts.annotate(**actual).exclude(
+        item_count=F('actual_item_count'),
+        unique_items=F('actual_unique_items'),
+        subtotal=F('actual_subtotal'),
+    )
+    return mismatched
+
+
+class LazyCart:
+    """
+    Request cart that is only loaded, or created, when it is actually used.
+
+    Nothing touches the database until an attribute is read, and no Cart row
+    is written until the first product is added. Anonymous visitors are
+    tracked by the ``cart_id`` session key, which is also only set on the
+    first add, so bots and asset requests never create carts or sessions.
+
+    Reads are delegated to the underlying Cart, so templates and views can
+    keep using ``request.cart`` exactly like a Cart instance.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._cart = None
+        self._resolved = False
+
+    def __repr__(self):
+        if not self._resolved:
+            return '<LazyCart: not loaded>'
+        return f'<LazyCart: {self._cart!r}>'
+
+    def _lookup(self):
+        """Find the stored cart for this request without creating one"""
+        request = self._request
+        if request.user.is_authenticated:
+            return Cart.objects.filter(user=request.user).first()
+
+        session_id = request.session.get('cart_id')
+        if session_id:
+            return Cart.objects.filter(session_id=session_id).first()
+        return None
+
+    @property
+    def cart(self):
+        """
+        The stored Cart for this request, or None if nothing has been added
+        to a cart yet. Looked up at most once per request.
+        """
+        if not self._resolved:
+            self._cart = self._lookup()
+            self._resolved = True
+        return self._cart
+
+    def get_or_create(self):
+        """
+        Return the stored Cart, creating the row (and for anonymous visitors
+        the ``cart_id`` session key) if it does not exist yet
+        """
+        cart = self.cart
+        if cart is not None:
+            return cart
+
+        request = self._request
+        if request.user.is_authenticated:
+            cart, created = Cart.objects.get_or_create(user=request.user)
+        else:
+            session_id = request.session.get('cart_id')
+            if not session_id:
+                session_id = str(uuid.uuid4())
+                request.session['cart_id'] = session_id
+            cart = Cart.objects.create(session_id=session_id)
+        logger.debug(f"Created cart {cart.id} on first add")
+
+        self._cart = cart
+        self._resolved = True
+        return cart
+
+    def add(self, product, quantity=1, update_quantity=False):
+        """
+        Add a product to the cart, creating the cart on first use
+        """
+        return self.get_or_create().add(
+            product, quantity=quantity, update_quantity=update_quantity)
+
+    def remove(self, product):
+        """
+        Remove a product from the cart, if there is one
+        """
+        if self.cart is not None:
+            self.cart.remove(product)
+
+    def clear(self):
+        """
+        Remove all items from the cart, if there is one
+        """
+        if self.cart is not None:
+            self.cart.clear()
+
+    def __len__(self):
+        return len(self.cart) if self.cart is not None else 0
+
+    def snapshot(self):
+        if self.cart is None:
+            return []
+        return self.cart.snapshot()
+
+    @property
+    def items(self):
+        if self.cart is None:
+            return CartItem.objects.none()
+        return self.cart.items
+
+    @property
+    def item_count(self):
+        return self.cart.item_count if self.cart is not None else 0
+
+    @property
+    def total_price(self):
+        if self.cart is None:
+            return Decimal('0.00')
+        return self.cart.total_price
+
+    def to_dict(self):
+        if self.cart is not None:
+            return self.cart.to_dict()
+        user = self._request.user
+        return {
+            'id': None,
+            'user': user.username if user.is_authenticated else None,
+            'items': [],
+            'total_price': '0'
+        }
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined above; read them from the
+        # stored cart, or from an unsaved placeholder if there is none yet
+        if name.startswith('_'):
+            raise AttributeError(name)
+        cart = self.cart
+        if cart is None:
+            cart = Cart(session_id=self._request.session.get('cart_id', ''))
+        return getattr(cart, name)
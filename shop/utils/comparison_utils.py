@@ -0,0 +1,157 @@
+"""
+Comparison list utility functions for the shop app
+Provides the lazily-loaded comparison list attached to each request by
+ComparisonMiddleware
+"""
+import logging
+import uuid
+
+from django.db import transaction
+
+from products.models import Product
+
+from ..models import ComparisonList
+
+logger = logging.getLogger(__name__)
+
+
+def merge_comparison_lists(lists):
+    """
+    Merge duplicate comparison lists into the most recently updated one.
+
+    Args:
+        lists: ComparisonList queryset for a single user or session
+
+    Returns:
+        The surviving ComparisonList, or None if there were no lists
+    """
+    lists = list(lists.order_by('-updated_at'))
+    if not lists:
+        return None
+
+    primary, duplicates = lists[0], lists[1:]
+    if duplicates:
+        duplicate_ids = [cl.id for cl in duplicates]
+        through = ComparisonList.products.through
+        product_ids = set(through.objects.filter(
+            comparisonlist_id__in=duplicate_ids
+        ).values_list('product_id', flat=True))
+        if product_ids:
+            primary.products.add(*product_ids)
+        ComparisonList.objects.filter(id__in=duplicate_ids).delete()
+        logger.warning(
+            f"Merged {len(duplicates)} duplicate comparison lists into "
+            f"list {primary.id}"
+        )
+    return primary
+
+
+class LazyComparisonList:
+    """
+    Request comparison list that is only loaded when it is actually used.
+
+    The newest list for the user (or the ``comparison_id`` session) is
+    fetched with a single query on first access, and no ComparisonList row
+    is written until a product is added. Duplicate lists are merged on that
+    write path rather than on every read.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._list = None
+        self._resolved = False
+        self._product_ids = None
+
+    def __repr__(self):
+        if not self._resolved:
+            return '<LazyComparisonList: not loaded>'
+        return f'<LazyComparisonList: {self._list!r}>'
+
+    def _owner_filter(self):
+        request = self._request
+        if request.user.is_authenticated:
+            return {'user': request.user}
+        session_id = request.session.get('comparison_id')
+        if session_id:
+            return {'session_id': session_id}
+        return None
+
+    @property
+    def comparison_list(self):
+        """
+        The newest stored ComparisonList for this request, or None if
+        nothing has been added yet. Looked up at most once per request.
+        """
+        if not self._resolved:
+            owner = self._owner_filter()
+            if owner is not None:
+                self._list = ComparisonList.objects.filter(
+                    **owner).order_by('-updated_at').first()
+            self._resolved = True
+        return self._list
+
+    @property
+    def products(self):
+        if self.comparison_list is None:
+            return Product.objects.none()
+        return self.comparison_list.products
+
+    @property
+    def product_ids(self):
+        """IDs of the products being compared, cached for the request"""
+        if self._product_ids is None:
+            if self.comparison_list is None:
+                self._product_ids = []
+            else:
+                self._product_ids = list(
+                    self.comparison_list.products.values_list(
+                        'id', flat=True))
+        return self._product_ids
+
+    def get_or_create(self):
+        """
+        Return the stored ComparisonList, creating it if needed and merging
+        any duplicates left behind by concurrent requests
+        """
+        request = self._request
+        owner = self._owner_filter()
+        if owner is None:
+            session_id = str(uuid.uuid4())
+            request.session['comparison_id'] = session_id
+            owner = {'session_id': session_id}
+
+        with transaction.atomic():
+            comparison_list = merge_comparison_lists(
+                ComparisonList.objects.select_for_update().filter(**owner))
+            if comparison_list is None:
+                comparison_list = ComparisonList.objects.create(**owner)
+
+        self._list = comparison_list
+        self._resolved = True
+        self._product_ids = None
+        return comparison_list
+
+    def add(self, product):
+        """
+        Add a product, creating the comparison list on first use
+        """
+        self.get_or_create().products.add(product)
+        self._product_ids = None
+
+    def remove(self, product):
+        """
+        Remove a product from the comparison list, if there is one
+        """
+        if self.comparison_list is not None:
+            self.comparison_list.products.remove(product)
+            self._product_ids = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined above; read them from the
+        # stored list, or from an unsaved placeholder if there is none yet
+        if name.startswith('_'):
+            raise AttributeError(name)
+        comparison_list = self.comparison_list
+        if comparison_list is None:
+            comparison_list = ComparisonList()
+        return getattr(comparison_list, name)
@@ -0,0 +1,161 @@
+"""
+Order materialization shared by the checkout view and the Stripe webhook
+
+Order lines are written with a fixed number of queries however long the
+cart is: every product is loaded with one ``in_bulk`` query, the lines are
+inserted with ``bulk_create``, stock is decremented with a single
+``UPDATE`` built from ``F()`` expressions, and the matching InventoryLog
+rows are inserted in bulk. Callers run it in the transaction that creates
+the order, so a failure leaves neither the order nor its stock changes.
+
+The webhook takes stock as soon as it creates a paid order; the checkout
+view creates unpaid orders without touching stock, and take_order_stock()
+runs when the webhook later marks them paid.
+"""
+import logging
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from products.card_cache import invalidate_product_cards
+from products.models import InventoryLog, Product
+
+from ..models import OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cart_lines(cart_data):
+    """
+    Read order lines from the cart stored in PaymentIntent metadata
+
+    Understands both formats the checkout has written over time,
+    ``{'items': {id: {'quantity': x}}}`` and
+    ``{'items': [{'product_id': id, 'quantity': x}]}``.
+
+    Args:
+        cart_data: The decoded cart dict
+
+    Returns:
+        List of ``(product_id, quantity, None)`` tuples; lines with an
+        unusable id or quantity are logged and skipped
+    """
+    items = cart_data.get('items') if isinstance(cart_data, dict) else None
+    if isinstance(items, dict):
+        raw = [(item_id, (data or {}).get('quantity', 1))
+               for item_id, data in items.items()]
+    elif isinstance(items, list):
+        raw = [(data.get('product_id') or data.get('id'),
+                data.get('quantity', 1))
+               for data in items if isinstance(data, dict)]
+    else:
+        return []
+
+    lines = []
+    for product_id, quantity in raw:
+        try:
+            lines.append((int(product_id), int(quantity), None))
+        except (TypeError, ValueError):
+            logger.error(
+                f"Skipping cart line with product {product_id!r} and "
+                f"quantity {quantity!r}")
+    return lines
+
+
+def add_order_items(order, lines, adjust_stock=True):
+    """
+    Create an order's lines and take their quantities out of stock
+
+    Args:
+        order: A saved Order
+        lines: Iterable of ``(product_id, quantity, price)``; a price of
+            None uses the product's current price. Repeated products are
+            merged into one line.
+        adjust_stock: Decrement stock_quantity (never below zero) and log
+            the change in InventoryLog
+
+    Returns:
+        Tuple of (created OrderItems, ids of products that do not exist)
+    """
+    merged = OrderedDict()
+    for product_id, quantity, price in lines:
+        if quantity <= 0:
+            continue
+        if product_id in merged:
+            merged[product_id][0] += quantity
+        else:
+            merged[product_id] = [quantity, price]
+    if not merged:
+        return [], []
+
+    products = Product.objects.in_bulk(list(merged))
+    missing = [pk for pk in merged if pk not in products]
+    if missing:
+        logger.error(
+            f"Products {missing} not found while creating order "
+            f"{order.order_number}")
+
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=products[pk],
+            quantity=quantity,
+            price=products[pk].price if price is None else price,
+        )
+        for pk, (quantity, price) in merged.items() if pk in products
+    ])
+
+    if adjust_stock and items:
+        quantities = {item.product_id: item.quantity for item in items}
+        _take_stock(order, quantities)
+
+    return items, missing
+
+
+def take_order_stock(order):
+    """
+    Take the quantities of an existing order's lines out of stock, for
+    orders created before their payment was confirmed
+
+    Args:
+        order: A saved Order whose lines have not been taken from stock yet
+    """
+    quantities = {}
+    for product_id, quantity in order.items.values_list(
+            'product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if quantities:
+        _take_stock(order, quantities)
+
+
+def _take_stock(order, quantities):
+    """
+    Decrement stock_quantity (never below zero) with one UPDATE and log the
+    change in InventoryLog
+
+    Args:
+        order: The Order the stock is taken for
+        quantities: Dict mapping product id to quantity
+    """
+    Product.objects.filter(pk__in=list(quantities)).update(
+        stock_quantity=Greatest(
+            F('stock_quantity') - Case(
+                *(When(pk=pk, then=Value(quantity))
+                  for pk, quantity in quantities.items()),
+                output_field=IntegerField()),
+            Value(0)))
+    InventoryLog.objects.bulk_create([
+        InventoryLog(
+            product_id=pk,
+            change=-quantity,
+            reason=f"Order {order.order_number}")
+        for pk, quantity in quantities.items()
+    ])
+    # update() skips the post_save signal that expires cached cards
+    transaction.on_commit(
+        lambda: invalidate_product_cards(list(quantities)))
+    logger.debug(
+        f"Took {sum(quantities.values())} units of {len(quantities)} "
+        f"products out of stock for order {order.order_number}")
@@ -2,8 +2,6 @@
 Session utility functions for the shop app
 Handles Stripe client secrets and checkout session data
 """
-import hashlib
-import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,34 +13,16 @@ def get_cart_signature(cart):
     This will be used to determine if the cart has changed since
     the client secret was generated.
 
+    Cart.version is bumped by every change to the cart's items or totals,
+    so the signature is read off the cart row without loading its items.
+
     Args:
         cart: The shopping cart object
 
     Returns:
-        str: A hash signature of the cart state
+        str: A signature of the cart state
     """
-    # Create a representation of the cart state
-    cart_items = []
-    for item in cart.items.all():
-        cart_items.append({
-            'product_id': item.product.id,
-            'quantity': item.quantity,
-            'price': str(item.price)
-        })
-
-    # Sort to ensure consistent ordering
-    cart_items.sort(key=lambda x: x['product_id'])
-
-    # Include total price in the signature
-    cart_state = {
-        'items': cart_items,
-        'total_price': str(cart.total_price),
-        'item_count': cart.items.count()
-    }
-
-    # Create a hash of the cart state
-    cart_string = json.dumps(cart_state, sort_keys=True)
-    return hashlib.md5(cart_string.encode()).hexdigest()
+    return f"{cart.pk}:{cart.version}:{cart.total_price}"
 
 
 def is_client_secret_valid(request, cart):
@@ -0,0 +1,156 @@
+"""
+Request-scoped shopper state for the shop app
+Collects the per-visitor values shown on nearly every page (wishlist and
+comparison product ids, cart summary, unread staff notifications) so they
+are computed at most once per request and shared by views, template tags
+and context processors.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import WishlistItem
+
+logger = logging.getLogger(__name__)
+
+# Seconds to keep a user's state in the cache; 0 disables caching so every
+# request reads fresh values (still only once per request)
+DEFAULT_CACHE_TIMEOUT = 0
+CACHE_KEY = 'shopper_state:{user_id}'
+
+
+def get_cache_timeout():
+    return getattr(
+        settings, 'SHOPPER_STATE_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+
+def invalidate_shopper_state(user_id):
+    """
+    Drop the cached state for a user after a wishlist, comparison, cart or
+    notification write
+
+    Args:
+        user_id: ID of the user whose state changed
+    """
+    if user_id and get_cache_timeout():
+        cache.delete(CACHE_KEY.format(user_id=user_id))
+
+
+class ShopperState:
+    """
+    Lazily computed, memoized shopper state for a single request.
+
+    Each value is computed on first access. For authenticated users the
+    computed values can also be shared between requests through a short-TTL
+    cache entry (``SHOPPER_STATE_CACHE_TIMEOUT``), which is dropped by
+    invalidate_shopper_state() whenever the underlying data is written.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._values = None
+
+    @property
+    def _user(self):
+        return self._request.user
+
+    def _cache_key(self):
+        if self._user.is_authenticated and get_cache_timeout():
+            return CACHE_KEY.format(user_id=self._user.pk)
+        return None
+
+    def _get(self, name, compute):
+        if self._values is None:
+            key = self._cache_key()
+            self._values = (cache.get(key) if key else None) or {}
+
+        if name not in self._values:
+            self._values[name] = compute()
+            key = self._cache_key()
+            if key:
+                cache.set(key, self._values, get_cache_timeout())
+        return self._values[name]
+
+    @property
+    def wishlist_ids(self):
+        """Set of product IDs in the user's wishlist"""
+        def compute():
+            if not self._user.is_authenticated:
+                return frozenset()
+            return frozenset(WishlistItem.objects.filter(
+                user=self._user).values_list('product_id', flat=True))
+        return self._get('wishlist_ids', compute)
+
+    @property
+    def comparison_ids(self):
+        """List of product IDs being compared, in the order they were added"""
+        def compute():
+            if not self._user.is_authenticated:
+                return list(self._request.session.get('comparison', []))
+            comparison_list = getattr(self._request, 'comparison_list', None)
+            if comparison_list is None:
+                return []
+            return list(comparison_list.product_ids)
+        return self._get('comparison_ids', compute)
+
+    @property
+    def cart_summary(self):
+        """Dict with the cart's ``item_count`` and ``total_price``"""
+        def compute():
+            cart = getattr(self._request, 'cart', None)
+            if cart is None:
+                return {'item_count': 0, 'total_price': 0}
+            return {
+                'item_count': len(cart),
+                'total_price': cart.total_price,
+            }
+        return self._get('cart_summary', compute)
+
+    @property
+    def unread_notifications_count(self):
+        """Number of unread staff notifications; always 0 for non-staff"""
+        def compute():
+            if not (self._user.is_authenticated and self._user.is_staff):
+                return 0
+            from staff.models import StaffNotification
+            return StaffNotification.objects.filter(
+                recipient=self._user, is_read=False).count()
+        return self._get('unread_notifications_count', compute)
+
+    @property
+    def comparison_count(self):
+        return len(self.comparison_ids)
+
+    @property
+    def cart_item_count(self):
+        return self.cart_summary['item_count']
+
+    def is_in_wishlist(self, product):
+        return getattr(product, 'id', product) in self.wishlist_ids
+
+    def is_in_comparison(self, product):
+        return getattr(product, 'id', product) in self.comparison_ids
+
+
+def get_shopper_state(request):
+    """
+    Return the ShopperState for a request, creating it on first use
+
+    The state is also attached to the authenticated user object so template
+    filters that only receive ``user`` can share it.
+
+    Args:
+        request: The current HttpRequest
+
+    Returns:
+        The request's ShopperState
+    """
+    state = getattr(request, '_shopper_state', None)
+    if state is None:
+        state = ShopperState(request)
+        request._shopper_state = state
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            user._shopper_state = state
+    return state
@@ -0,0 +1,271 @@
+"""
+Local fake Stripe webhook payloads
+
+Builds event payloads shaped like Stripe's and signs them the way Stripe
+does, so the webhook endpoint and the inbox worker can be exercised in
+tests and during development without a Stripe account or the Stripe CLI.
+FakeStripeBackend plays the Stripe API itself for StripeGateway.
+"""
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import stripe
+
+
+def fake_id(prefix):
+    """Random Stripe-style object id, e.g. ``pi_3f9c...``"""
+    return f'{prefix}_{uuid.uuid4().hex[:24]}'
+
+
+def fake_payment_intent(amount=1000, currency='gbp', status='succeeded',
+                        metadata=None, **fields):
+    """
+    Build a PaymentIntent object
+
+    Args:
+        amount: Amount in the smallest currency unit
+        currency: Three-letter currency code
+        status: PaymentIntent status
+        metadata: Metadata dict (cart, username, save_info ...)
+        **fields: Any other PaymentIntent fields to set or override
+
+    Returns:
+        Dict shaped like a Stripe PaymentIntent
+    """
+    intent_id = fields.pop('id', None) or fake_id('pi')
+    intent = {
+        'id': intent_id,
+        'object': 'payment_intent',
+        'amount': amount,
+        'currency': currency,
+        'status': status,
+        'client_secret': f'{intent_id}_secret_{uuid.uuid4().hex[:12]}',
+        'metadata': metadata or {},
+        'payment_method': None,
+        'payment_method_types': ['card'],
+        'customer': None,
+        'shipping': None,
+        'last_payment_error': None,
+        'created': int(time.time()),
+        'livemode': False,
+    }
+    intent.update(fields)
+    return intent
+
+
+def fake_event(event_type, data_object, event_id=None):
+    """
+    Wrap an object in a Stripe event
+
+    Args:
+        event_type: Event type, e.g. 'payment_intent.succeeded'
+        data_object: The event's ``data.object``
+        event_id: Event id; random if omitted
+
+    Returns:
+        Dict shaped like a Stripe Event
+    """
+    return {
+        'id': event_id or fake_id('evt'),
+        'object': 'event',
+        'api_version': '2023-10-16',
+        'created': int(time.time()),
+        'type': event_type,
+        'livemode': False,
+        'pending_webhooks': 1,
+        'request': {'id': None, 'idempotency_key': None},
+        'data': {'object': data_object},
+    }
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """
+    Compute a ``Stripe-Signature`` header for a payload
+
+    Args:
+        payload: The raw request body (str or bytes)
+        secret: The webhook signing secret
+        timestamp: Unix time to sign with; now if omitted
+
+    Returns:
+        The header value, e.g. ``t=1700000000,v1=5257a8...``
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    signature = hmac.new(
+        secret.encode('utf-8'),
+        f'{timestamp}.{payload}'.encode('utf-8'),
+        hashlib.sha256,
+    ).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def signed_webhook(event, secret):
+    """
+    Serialize and sign an event for posting to the webhook endpoint
+
+    Args:
+        event: Event dict, e.g. from fake_event()
+        secret: The webhook signing secret
+
+    Returns:
+        Tuple of (body, signature header)
+    """
+    body = json.dumps(event)
+    return body, sign_payload(body, secret)
+
+
+class FakeStripeBackend:
+    """
+    In-process stand-in for the Stripe API, for StripeGateway
+
+    Select it with ``STRIPE_GATEWAY_BACKEND =
+    'shop.utils.stripe_fakes.FakeStripeBackend'``. Objects live in memory on
+    the backend instance and every call is appended to ``calls`` as
+    ``(method name, object id)``, so tests can count round trips.
+    """
+
+    def __init__(self):
+        self.payment_intents = {}
+        self.payment_methods = {}
+        self.customers = {}
+        self.calls = []
+
+    def _object(self, cls, data, api_key):
+        return cls.construct_from(json.loads(json.dumps(data)), api_key)
+
+    def _get(self, store, object_id, name):
+        if object_id not in store:
+            raise stripe.error.InvalidRequestError(
+                f"No such {name}: '{object_id}'", 'id',
+                code='resource_missing', http_status=404)
+        return store[object_id]
+
+    def add_payment_method(self, customer_id=None, brand='visa',
+                           last4='4242', **fields):
+        """Store a card PaymentMethod and return its data"""
+        method = {
+            'id': fake_id('pm'),
+            'object': 'payment_method',
+            'type': 'card',
+            'customer': customer_id,
+            'card': {'brand': brand, 'last4': last4,
+                     'exp_month': 12, 'exp_year': 2030},
+            'billing_details': {'name': '', 'email': '', 'phone': '',
+                                'address': {}},
+        }
+        method.update(fields)
+        self.payment_methods[method['id']] = method
+        return method
+
+    def retrieve_payment_intent(self, api_key, intent_id):
+        self.calls.append(('retrieve_payment_intent', intent_id))
+        intent = self._get(self.payment_intents, intent_id, 'payment_intent')
+        return self._object(stripe.PaymentIntent, intent, api_key)
+
+    def create_payment_intent(self, api_key, params):
+        params = dict(params)
+        params.pop('automatic_payment_methods', None)
+        intent = fake_payment_intent(status='requires_payment_method',
+                                     **params)
+        self.calls.append(('create_payment_intent', intent['id']))
+        self.payment_intents[intent['id']] = intent
+        return self._object(stripe.PaymentIntent, intent, api_key)
+
+    def modify_payment_intent(self, api_key, intent_id, params):
+        self.calls.append(('modify_payment_intent', intent_id))
+        intent = self._get(self.payment_intents, intent_id, 'payment_intent')
+        if intent['status'] in ('processing', 'succeeded', 'canceled'):
+            raise stripe.error.InvalidRequestError(
+                f"This PaymentIntent's amount could not be updated because "
+                f"it has a status of {intent['status']}.", 'amount',
+                code='payment_intent_unexpected_state', http_status=400)
+        params = dict(params)
+        if 'metadata' in params:
+            intent['metadata'] = {**intent['metadata'],
+                                  **params.pop('metadata')}
+        intent.update(params)
+        return self._object(stripe.PaymentIntent, intent, api_key)
+
+    def cancel_payment_intent(self, api_key, intent_id, params):
+        self.calls.append(('cancel_payment_intent', intent_id))
+        intent = self._get(self.payment_intents, intent_id, 'payment_intent')
+        intent['status'] = 'canceled'
+        intent['cancellation_reason'] = params.get('cancellation_reason')
+        return self._object(stripe.PaymentIntent, intent, api_key)
+
+    def list_payment_intents(self, api_key, params):
+        self.calls.append(('list_payment_intents', None))
+        intents = sorted(
+            self.payment_intents.values(),
+            key=lambda intent: intent['created'], reverse=True)
+        created = params.get('created', {})
+        if created.get('lt') is not None:
+            intents = [intent for intent in intents
+                       if intent['created'] < created['lt']]
+        if created.get('gte') is not None:
+            intents = [intent for intent in intents
+                       if intent['created'] >= created['gte']]
+        if params.get('starting_after'):
+            ids = [intent['id'] for intent in intents]
+            intents = intents[ids.index(params['starting_after']) + 1:]
+        limit = params.get('limit', 10)
+        return ([self._object(stripe.PaymentIntent, intent, api_key)
+                 for intent in intents[:limit]],
+                len(intents) > limit)
+
+    def retrieve_payment_method(self, api_key, payment_method_id):
+        self.calls.append(('retrieve_payment_method', payment_method_id))
+        method = self._get(
+            self.payment_methods, payment_method_id, 'payment_method')
+        return self._object(stripe.PaymentMethod, method, api_key)
+
+    def list_payment_methods(self, api_key, customer_id, type):
+        self.calls.append(('list_payment_methods', customer_id))
+        return [self._object(stripe.PaymentMethod, method, api_key)
+                for method in self.payment_methods.values()
+                if method['customer'] == customer_id
+                and method['type'] == type]
+
+    def attach_payment_method(self, api_key, payment_method_id,
+                              customer_id):
+        self.calls.append(('attach_payment_method', payment_method_id))
+        method = self._get(
+            self.payment_methods, payment_method_id, 'payment_method')
+        method['customer'] = customer_id
+        return self._object(stripe.PaymentMethod, method, api_key)
+
+    def detach_payment_method(self, api_key, payment_method_id):
+        self.calls.append(('detach_payment_method', payment_method_id))
+        method = self._get(
+            self.payment_methods, payment_method_id, 'payment_method')
+        method['customer'] = None
+        return self._object(stripe.PaymentMethod, method, api_key)
+
+    def _customer(self, customer_id):
+        return self.customers.setdefault(customer_id, {
+            'id': customer_id,
+            'object': 'customer',
+            'invoice_settings': {'default_payment_method': None},
+        })
+
+    def retrieve_customer(self, api_key, customer_id):
+        self.calls.append(('retrieve_customer', customer_id))
+        return self._object(
+            stripe.Customer, self._customer(customer_id), api_key)
+
+    def modify_customer(self, api_key, customer_id, params):
+        self.calls.append(('modify_customer', customer_id))
+        customer = self._customer(customer_id)
+        for field, value in params.items():
+            if isinstance(value, dict):
+                # Stripe unsets a field given an empty string
+                customer.setdefault(field, {}).update(
+                    {key: item or None for key, item in value.items()})
+            else:
+                customer[field] = value
+        return self._object(stripe.Customer, customer, api_key)
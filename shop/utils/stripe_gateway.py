@@ -0,0 +1,356 @@
+"""
+Shared gateway for Stripe API calls
+
+Stripe calls in the shop go through one StripeGateway per process
+(get_stripe_gateway()), which:
+
+- passes the secret key with each request instead of setting the global
+  ``stripe.api_key``,
+- talks to Stripe over one pooled, keep-alive ``requests`` session with
+  explicit connect/read timeouts, and lets the Stripe library retry
+  network failures a bounded number of times (retried POSTs reuse an
+  idempotency key, so they never double-charge),
+- keeps read-mostly objects (PaymentIntents, a customer's saved payment
+  methods) in the shared cache for a short while, and drops them whenever
+  the gateway itself changes them.
+
+The backend that makes the actual calls is chosen by
+``STRIPE_GATEWAY_BACKEND``; tests point it at the in-process
+FakeStripeBackend from shop.utils.stripe_fakes.
+"""
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+from .stripe_utils import get_stripe_secret_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'shop.utils.stripe_gateway.StripeAPIBackend'
+DEFAULT_TIMEOUT = (5, 30)  # seconds to connect, seconds to read
+DEFAULT_MAX_NETWORK_RETRIES = 2
+DEFAULT_POOL_SIZE = 10
+# Seconds a cached PaymentIntent or payment method list may be served
+DEFAULT_CACHE_TIMEOUT = 30
+
+INTENT_KEY = 'stripe:payment_intent:{intent_id}'
+METHODS_KEY = 'stripe:payment_methods:{customer_id}:{type}'
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def _to_data(stripe_object):
+    """Plain JSON data of a Stripe object, safe to put in the cache"""
+    return json.loads(str(stripe_object))
+
+
+class StripeAPIBackend:
+    """
+    Makes Stripe API calls with a StripeClient per secret key, all sharing
+    one pooled HTTP session
+    """
+
+    def __init__(self):
+        pool_size = getattr(
+            settings, 'STRIPE_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE)
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size))
+        self.http_client = stripe.RequestsClient(
+            timeout=getattr(settings, 'STRIPE_HTTP_TIMEOUT', DEFAULT_TIMEOUT),
+            session=session)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, api_key):
+        """StripeClient for a secret key, created once and reused"""
+        client = self._clients.get(api_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(api_key)
+                if client is None:
+                    client = stripe.StripeClient(
+                        api_key,
+                        http_client=self.http_client,
+                        max_network_retries=getattr(
+                            settings, 'STRIPE_MAX_NETWORK_RETRIES',
+                            DEFAULT_MAX_NETWORK_RETRIES),
+                    )
+                    self._clients[api_key] = client
+        return client
+
+    def retrieve_payment_intent(self, api_key, intent_id):
+        return self.client(api_key).payment_intents.retrieve(intent_id)
+
+    def create_payment_intent(self, api_key, params):
+        return self.client(api_key).payment_intents.create(params)
+
+    def modify_payment_intent(self, api_key, intent_id, params):
+        return self.client(api_key).payment_intents.update(intent_id, params)
+
+    def cancel_payment_intent(self, api_key, intent_id, params):
+        return self.client(api_key).payment_intents.cancel(intent_id, params)
+
+    def list_payment_intents(self, api_key, params):
+        page = self.client(api_key).payment_intents.list(params)
+        return list(page.data), page.has_more
+
+    def retrieve_payment_method(self, api_key, payment_method_id):
+        return self.client(api_key).payment_methods.retrieve(
+            payment_method_id)
+
+    def list_payment_methods(self, api_key, customer_id, type):
+        methods = self.client(api_key).payment_methods.list(
+            {'customer': customer_id, 'type': type})
+        return list(methods.data)
+
+    def attach_payment_method(self, api_key, payment_method_id,
+                              customer_id):
+        return self.client(api_key).payment_methods.attach(
+            payment_method_id, {'customer': customer_id})
+
+    def detach_payment_method(self, api_key, payment_method_id):
+        return self.client(api_key).payment_methods.detach(
+            payment_method_id)
+
+    def retrieve_customer(self, api_key, customer_id):
+        return self.client(api_key).customers.retrieve(customer_id)
+
+    def modify_customer(self, api_key, customer_id, params):
+        return self.client(api_key).customers.update(customer_id, params)
+
+
+class StripeGateway:
+    """
+    The shop's entry point for Stripe API calls
+
+    Methods return Stripe objects and raise ``stripe.error.StripeError``
+    exactly like the Stripe library does.
+    """
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = import_string(
+                getattr(settings, 'STRIPE_GATEWAY_BACKEND', DEFAULT_BACKEND))()
+        self.backend = backend
+
+    def _api_key(self):
+        api_key = get_stripe_secret_key()
+        if not api_key:
+            raise stripe.error.AuthenticationError(
+                "No Stripe secret key configured")
+        return api_key
+
+    def _cache_timeout(self):
+        return getattr(settings, 'STRIPE_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+
+    def _cache_get(self, key):
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.error(f"Error reading {key} from cache: {e}")
+            return None
+
+    def _cache_set(self, key, value):
+        try:
+            cache.set(key, value, self._cache_timeout())
+        except Exception as e:
+            logger.error(f"Error caching {key}: {e}")
+
+    def _cache_delete(self, key):
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.error(f"Error deleting {key} from cache: {e}")
+
+    # PaymentIntents
+
+    def retrieve_payment_intent(self, intent_id, use_cache=True):
+        """
+        Look up a PaymentIntent
+
+        Args:
+            intent_id: PaymentIntent id
+            use_cache: Accept a copy up to STRIPE_CACHE_TIMEOUT seconds
+                old; pass False where the live status matters
+
+        Returns:
+            stripe.PaymentIntent
+        """
+        api_key = self._api_key()
+        key = INTENT_KEY.format(intent_id=intent_id)
+        if use_cache:
+            data = self._cache_get(key)
+            if data is not None:
+                return stripe.PaymentIntent.construct_from(data, api_key)
+
+        intent = self.backend.retrieve_payment_intent(api_key, intent_id)
+        self._cache_set(key, _to_data(intent))
+        return intent
+
+    def create_payment_intent(self, **params):
+        """Create a PaymentIntent; params as for PaymentIntent.create"""
+        intent = self.backend.create_payment_intent(self._api_key(), params)
+        self._cache_set(
+            INTENT_KEY.format(intent_id=intent.id), _to_data(intent))
+        return intent
+
+    def modify_payment_intent(self, intent_id, **params):
+        """Update a PaymentIntent; params as for PaymentIntent.modify"""
+        try:
+            intent = self.backend.modify_payment_intent(
+                self._api_key(), intent_id, params)
+        except stripe.error.StripeError:
+            # Most often the intent moved on (paid, canceled) since it was
+            # cached; make the next lookup ask Stripe
+            self._cache_delete(INTENT_KEY.format(intent_id=intent_id))
+            raise
+        self._cache_set(
+            INTENT_KEY.format(intent_id=intent_id), _to_data(intent))
+        return intent
+
+    def cancel_payment_intent(self, intent_id, **params):
+        """Cancel a PaymentIntent; params as for PaymentIntent.cancel"""
+        self._cache_delete(INTENT_KEY.format(intent_id=intent_id))
+        return self.backend.cancel_payment_intent(
+            self._api_key(), intent_id, params)
+
+    def list_payment_intents(self, created_before=None, created_after=None,
+                             limit=100, starting_after=None):
+        """
+        One page of PaymentIntents, newest first
+
+        Args:
+            created_before: Only intents created before this Unix time
+            created_after: Only intents created at or after this Unix time
+            limit: Page size (at most 100)
+            starting_after: Id of the last intent of the previous page
+
+        Returns:
+            Tuple of (list of stripe.PaymentIntent, whether more follow)
+        """
+        params = {'limit': limit}
+        created = {}
+        if created_before is not None:
+            created['lt'] = int(created_before)
+        if created_after is not None:
+            created['gte'] = int(created_after)
+        if created:
+            params['created'] = created
+        if starting_after:
+            params['starting_after'] = starting_after
+        return self.backend.list_payment_intents(self._api_key(), params)
+
+    # Customers and payment methods
+
+    def retrieve_payment_method(self, payment_method_id):
+        """Look up a PaymentMethod"""
+        return self.backend.retrieve_payment_method(
+            self._api_key(), payment_method_id)
+
+    def retrieve_customer(self, customer_id):
+        """Look up a Customer"""
+        return self.backend.retrieve_customer(self._api_key(), customer_id)
+
+    def list_payment_methods(self, customer_id, type='card'):
+        """
+        A customer's saved payment methods, served from the cache until
+        they change or STRIPE_CACHE_TIMEOUT passes
+
+        Args:
+            customer_id: Stripe customer id
+            type: Payment method type
+
+        Returns:
+            List of stripe.PaymentMethod
+        """
+        api_key = self._api_key()
+        key = METHODS_KEY.format(customer_id=customer_id, type=type)
+        data = self._cache_get(key)
+        if data is not None:
+            return [stripe.PaymentMethod.construct_from(method, api_key)
+                    for method in data]
+
+        methods = self.backend.list_payment_methods(
+            api_key, customer_id, type)
+        self._cache_set(key, [_to_data(method) for method in methods])
+        return methods
+
+    def invalidate_payment_methods(self, customer_id, type='card'):
+        """Drop the cached payment method list of a customer"""
+        self._cache_delete(
+            METHODS_KEY.format(customer_id=customer_id, type=type))
+
+    def attach_payment_method(self, payment_method_id, customer_id):
+        """Attach a PaymentMethod to a customer"""
+        try:
+            return self.backend.attach_payment_method(
+                self._api_key(), payment_method_id, customer_id)
+        finally:
+            self.invalidate_payment_methods(customer_id)
+
+    def detach_payment_method(self, payment_method_id, customer_id):
+        """Detach a PaymentMethod from its customer"""
+        try:
+            return self.backend.detach_payment_method(
+                self._api_key(), payment_method_id)
+        finally:
+            self.invalidate_payment_methods(customer_id)
+
+    def set_default_payment_method(self, customer_id, payment_method_id):
+        """
+        Make a PaymentMethod the customer's default for invoices
+
+        Args:
+            customer_id: Stripe customer id
+            payment_method_id: PaymentMethod id, or None to unset
+
+        Returns:
+            The updated stripe.Customer
+        """
+        try:
+            return self.backend.modify_customer(
+                self._api_key(), customer_id,
+                {'invoice_settings': {
+                    'default_payment_method': payment_method_id or ''}})
+        finally:
+            self.invalidate_payment_methods(customer_id)
+
+
+def get_stripe_gateway():
+    """
+    The process-wide StripeGateway, created on first use
+
+    Returns:
+        StripeGateway
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = StripeGateway()
+    return _gateway
+
+
+def reset_stripe_gateway():
+    """Forget the process-wide gateway so the next call builds a new one"""
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('STRIPE_'):
+        reset_stripe_gateway()
@@ -4,20 +4,160 @@ Stripe utility functions for managing API keys and common operations
 import json
 import logging
 import time
+import uuid
+from datetime import timedelta
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
 import stripe
 from djstripe.models import APIKey
 
+from ..models import Order
+
 logger = logging.getLogger(__name__)
 
 
+# Names and key types tried, in order, when a key comes from the database
+DATABASE_KEY_LOOKUP = {
+    'secret': {
+        'prefix': 'sk_',
+        'types': ['sk_test', 'sk_live'],
+        'names': ["test_secret", "Test Secret", "secret", "Secret"],
+    },
+    'publishable': {
+        'prefix': 'pk_',
+        'types': ['pk_test', 'pk_live'],
+        'names': [
+            "test_publishable", "Test Publishable",
+            "publishable", "Publishable"],
+    },
+}
+KEYS_VERSION_KEY = 'stripe_keys:version'
+# Seconds a process keeps the keys it resolved; invalidate_stripe_keys()
+# reaches other processes sooner only when they share the cache
+DEFAULT_KEYS_CACHE_TIMEOUT = 5 * 60
+
+# Payment intent states that mean the customer never completed payment
+ABANDONABLE_INTENT_STATES = (
+    'requires_payment_method', 'requires_confirmation', 'requires_action')
+DEFAULT_INTENT_ABANDON_AFTER = 24 * 60 * 60
+# Intents older than this were handled by earlier sweeps and are not listed
+DEFAULT_INTENT_SWEEP_MAX_AGE = 7 * 24 * 60 * 60
+
+# (keys version, monotonic time, keys) this process resolved from the
+# database; shared by all threads and replaced, never changed in place
+_resolved_keys = None
+
+
+def get_keys_cache_timeout():
+    return getattr(
+        settings, 'STRIPE_KEYS_CACHE_TIMEOUT', DEFAULT_KEYS_CACHE_TIMEOUT)
+
+
+def _keys_version():
+    version = cache.get(KEYS_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(
+                KEYS_VERSION_KEY, version, get_keys_cache_timeout()):
+            version = cache.get(KEYS_VERSION_KEY, version)
+    return version
+
+
+def _lookup_database_keys():
+    """
+    Resolve both key types from the dj-stripe APIKey table with one query
+
+    Returns:
+        Dict mapping 'secret' and 'publishable' to a key or None
+    """
+    rows = list(APIKey.objects.order_by('pk').values_list(
+        'type', 'name', 'secret'))
+    keys = {}
+    for key_type, lookup in DATABASE_KEY_LOOKUP.items():
+        keys[key_type] = None
+        candidates = (
+            # Try by type first
+            [(f"type {wanted}", secret)
+             for wanted in lookup['types']
+             for row_type, _, secret in rows if row_type == wanted]
+            # If that doesn't work, try by name
+            + [(f"name {wanted}", secret)
+               for wanted in lookup['names']
+               for _, name, secret in rows
+               if (name or '').lower() == wanted.lower()]
+            # If that doesn't work, try any key with appropriate prefix
+            + [(f"prefix {lookup['prefix']}", secret)
+               for _, _, secret in rows
+               if secret and secret.startswith(lookup['prefix'])]
+        )
+        for source, secret in candidates:
+            if secret:
+                logger.debug(f"Using {key_type} API key from database "
+                             f"({source})")
+                keys[key_type] = secret
+                break
+    return keys
+
+
+def _database_key(key_type):
+    """
+    The key of a type stored in the database, looked up once per process
+    and kept until invalidate_stripe_keys() runs or STRIPE_KEYS_CACHE_TIMEOUT
+    seconds pass, whichever comes first
+
+    Returns:
+        The key, or None when the database has none
+    """
+    try:
+        version = _keys_version()
+    except Exception as e:
+        logger.error(f"Error reading Stripe keys version: {e}")
+        version = None
+
+    global _resolved_keys
+    resolved = _resolved_keys
+    now = time.monotonic()
+    if (resolved is None or version is None or resolved[0] != version
+            or now - resolved[1] >= get_keys_cache_timeout()):
+        try:
+            keys = _lookup_database_keys()
+        except Exception as e:
+            logger.error(f"Error retrieving API key from database: {e}")
+            return None
+        resolved = (version, now, keys)
+        if version is not None:
+            _resolved_keys = resolved
+    return resolved[2].get(key_type)
+
+
+def invalidate_stripe_keys():
+    """
+    Make every process sharing the cache look its Stripe keys up again,
+    e.g. after an APIKey is saved in the admin; other processes do so once
+    their keys expire
+    """
+    def bump():
+        global _resolved_keys
+        cache.set(KEYS_VERSION_KEY, uuid.uuid4().hex[:12],
+                  get_keys_cache_timeout())
+        _resolved_keys = None
+
+    bump()
+    transaction.on_commit(bump)
+
+
 def get_stripe_key(key_type='secret'):
     """
     Get the appropriate Stripe API key from multiple possible sources
 
+    Keys from settings are used as they are; keys stored in the database
+    are resolved once per process (see _database_key()), so this never
+    queries the database on a hot path.
+
     Args:
         key_type: Type of key to retrieve ('secret' or 'publishable')
 
@@ -29,55 +169,17 @@ def get_stripe_key(key_type='secret'):
         if hasattr(
                 settings,
                 'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY:
-            logger.debug("Using STRIPE_SECRET_KEY from settings")
             return settings.STRIPE_SECRET_KEY
     elif key_type == 'publishable':
         if hasattr(
                 settings,
                 'STRIPE_PUBLISHABLE_KEY') and settings.STRIPE_PUBLISHABLE_KEY:
-            logger.debug("Using STRIPE_PUBLISHABLE_KEY from settings")
             return settings.STRIPE_PUBLISHABLE_KEY
 
     # Then try from database
-    try:
-        # For secret key
-        if key_type == 'secret':
-            key_prefix = 'sk_'
-            possible_names = ["test_secret", "Test Secret", "secret", "Secret"]
-            key_types = ["sk_test", "sk_live"]
-        # For publishable key
-        else:
-            key_prefix = 'pk_'
-            possible_names = [
-                "test_publishable",
-                "Test Publishable",
-                "publishable",
-                "Publishable"]
-            key_types = ["pk_test", "pk_live"]
-
-        # Try by type first
-        for key_type_name in key_types:
-            api_key = APIKey.objects.filter(type=key_type_name).first()
-            if api_key and api_key.secret:
-                logger.debug(f"Using API key from database: {key_type_name}")
-                return api_key.secret
-
-        # If that doesn't work, try by name
-        for possible_name in possible_names:
-            api_key = APIKey.objects.filter(name__iexact=possible_name).first()
-            if api_key and api_key.secret:
-                logger.debug(f"Using API key from database: {possible_name}")
-                return api_key.secret
-
-        # If that doesn't work, try any key with appropriate prefix
-        for key in APIKey.objects.all():
-            if key.secret and key.secret.startswith(key_prefix):
-                logger.debug(
-                    f"Using API key from database with prefix {key_prefix}")
-                return key.secret
-
-    except Exception as e:
-        logger.error(f"Error retrieving API key from database: {e}")
+    key = _database_key(key_type)
+    if key:
+        return key
 
     # Final fallback for development
     if settings.DEBUG:
@@ -92,6 +194,31 @@ def get_stripe_key(key_type='secret'):
     return None
 
 
+def warm_stripe_keys():
+    """
+    Resolve the Stripe keys at startup and report configuration problems,
+    so the first checkout does not pay for the lookup
+
+    Returns:
+        List of problems found (empty when both keys look right)
+    """
+    problems = []
+    live_mode = getattr(settings, 'STRIPE_LIVE_MODE', False)
+    for key_type in DATABASE_KEY_LOOKUP:
+        key = get_stripe_key(key_type)
+        if not key:
+            problems.append(f"No {key_type} Stripe key is configured")
+            continue
+        mode = 'live' if '_live_' in key else 'test'
+        if mode != ('live' if live_mode else 'test'):
+            problems.append(
+                f"The {key_type} Stripe key is a {mode} key but "
+                f"STRIPE_LIVE_MODE is {live_mode}")
+    for problem in problems:
+        logger.warning(problem)
+    return problems
+
+
 def get_stripe_secret_key():
     """
     Get the Stripe secret key using the consolidated method
@@ -118,7 +245,7 @@ def create_payment_intent(request):
     cart = request.cart
 
     # Check if cart is empty
-    if not cart or cart.items.count() == 0:
+    if not cart:
         logger.warning("Attempted to create payment intent with empty cart")
         return None, "Your cart is empty"
 
@@ -128,8 +255,8 @@ def create_payment_intent(request):
         logger.error("No Stripe API key found")
         return None, "Payment system configuration error"
 
-    # Set the API key for this request
-    stripe.api_key = stripe_api_key
+    # Imported here; the gateway uses this module's key lookup
+    from .stripe_gateway import get_stripe_gateway
 
     try:
         # Calculate total for Stripe payment intent
@@ -141,18 +268,14 @@ def create_payment_intent(request):
         timestamp = int(time.time())
 
         # Create metadata about the cart for the payment intent
-        metadata = {
-            'username': (
-                request.user.username if request.user.is_authenticated
-                else 'AnonymousUser'),
-            'cart_items': json.dumps(
-                cart_to_dict(cart)),
+        metadata = payment_intent_metadata(request, cart)
+        metadata.update({
             'timestamp': str(timestamp),
             'created_at': timezone.now().isoformat(),
-        }
+        })
 
         # Create a fresh payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe_gateway().create_payment_intent(
             amount=stripe_total,
             currency=settings.STRIPE_CURRENCY,
             metadata=metadata,
@@ -179,6 +302,145 @@ def create_payment_intent(request):
         return None, "An unexpected error occurred"
 
 
+def payment_intent_metadata(request, cart):
+    """
+    Metadata describing the cart a payment intent is for; the webhook
+    builds the order from it if the checkout never posts back
+    """
+    return {
+        'username': (
+            request.user.username if request.user.is_authenticated
+            else 'AnonymousUser'),
+        'cart_items': json.dumps(cart_to_dict(cart)),
+    }
+
+
+def update_or_create_payment_intent(request):
+    """
+    Bring the session's payment intent in line with the current cart
+
+    An intent that has not been paid yet is updated in place with
+    PaymentIntent.modify, so changing the cart neither costs a new intent
+    nor leaves the old one orphaned. A new intent is only created when
+    there is none in the session or Stripe refuses the update (e.g. it has
+    already succeeded or been canceled).
+
+    Returns (client_secret, error_message)
+    """
+    cart = request.cart
+    client_secret = request.session.get('client_secret')
+    if not cart or not client_secret:
+        return create_payment_intent(request)
+
+    # Imported here; the gateway uses this module's key lookup
+    from .stripe_gateway import get_stripe_gateway
+
+    pid = client_secret.split('_secret')[0]
+    metadata = payment_intent_metadata(request, cart)
+    metadata['updated_at'] = timezone.now().isoformat()
+    try:
+        intent = get_stripe_gateway().modify_payment_intent(
+            pid,
+            amount=round(cart.total_price * 100),
+            metadata=metadata,
+        )
+    except stripe.error.StripeError as e:
+        logger.info(
+            f"Could not update payment intent {pid}, creating a new one: "
+            f"{e}")
+        return create_payment_intent(request)
+
+    request.session['client_secret'] = intent.client_secret
+    logger.info(f"Updated payment intent {pid} for the changed cart")
+    return intent.client_secret, None
+
+
+def sweep_abandoned_payment_intents(older_than=None, max_age=None,
+                                    batch_size=100, limit=None,
+                                    dry_run=False):
+    """
+    Cancel payment intents that were never paid and are no longer in use
+
+    Intents created between ``max_age`` and ``older_than`` ago are read
+    from Stripe a page at a time, newest first. One that is still waiting
+    for payment and has no order pointing at it is cancelled with reason
+    ``abandoned``. Older intents were seen by earlier runs, so they are
+    not listed again.
+
+    Args:
+        older_than: timedelta; defaults to STRIPE_INTENT_ABANDON_AFTER
+            seconds (one day)
+        max_age: timedelta; defaults to STRIPE_INTENT_SWEEP_MAX_AGE
+            seconds (seven days)
+        batch_size: Intents fetched per Stripe request (at most 100)
+        limit: Stop after cancelling this many
+        dry_run: Only count what would be cancelled
+
+    Returns:
+        Dict with the number of intents 'checked', 'cancelled' and
+        'failed'
+    """
+    # Imported here; the gateway uses this module's key lookup
+    from .stripe_gateway import get_stripe_gateway
+
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(
+            settings, 'STRIPE_INTENT_ABANDON_AFTER',
+            DEFAULT_INTENT_ABANDON_AFTER))
+    if max_age is None:
+        max_age = timedelta(seconds=getattr(
+            settings, 'STRIPE_INTENT_SWEEP_MAX_AGE',
+            DEFAULT_INTENT_SWEEP_MAX_AGE))
+    now = timezone.now()
+    created_before = (now - older_than).timestamp()
+    created_after = (now - max_age).timestamp()
+    gateway = get_stripe_gateway()
+    counts = {'checked': 0, 'cancelled': 0, 'failed': 0}
+
+    starting_after = None
+    while limit is None or counts['cancelled'] < limit:
+        intents, has_more = gateway.list_payment_intents(
+            created_before=created_before, created_after=created_after,
+            limit=batch_size,
+            starting_after=starting_after)
+        if not intents:
+            break
+        starting_after = intents[-1].id
+        counts['checked'] += len(intents)
+
+        waiting = [intent for intent in intents
+                   if intent.status in ABANDONABLE_INTENT_STATES]
+        ordered = set(Order.objects.filter(
+            stripe_pid__in=[intent.id for intent in waiting]
+        ).values_list('stripe_pid', flat=True))
+
+        for intent in waiting:
+            if intent.id in ordered:
+                continue
+            if limit is not None and counts['cancelled'] >= limit:
+                break
+            if dry_run:
+                counts['cancelled'] += 1
+                continue
+            try:
+                gateway.cancel_payment_intent(
+                    intent.id, cancellation_reason='abandoned')
+                counts['cancelled'] += 1
+            except stripe.error.StripeError as e:
+                counts['failed'] += 1
+                logger.warning(
+                    f"Could not cancel payment intent {intent.id}: {e}")
+
+        if not has_more:
+            break
+
+    logger.info(
+        f"Payment intent sweep checked {counts['checked']}, cancelled "
+        f"{counts['cancelled']}, failed {counts['failed']}"
+        f"{' (dry run)' if dry_run else ''}")
+    return counts
+
+
 def cart_to_dict(cart):
     """
     Convert cart to a dictionary suitable for JSON serialization
@@ -192,7 +454,7 @@ def cart_to_dict(cart):
         'total': str(cart.total_price)
     }
 
-    for item in cart.items.all():
+    for item in cart.items.select_related('product'):
         cart_data['items'].append({
             'product_id': item.product.id,
             'product_name': item.product.name,
@@ -8,6 +8,7 @@ from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.views import View
 
+from products.card_cache import render_product_card
 from products.models import Product
 
 from .mixins import CartAccessMixin
@@ -118,10 +119,11 @@ class AjaxQuickViewView(View):
         try:
             product = Product.objects.get(id=product_id, is_active=True)
 
-            # Render the product details to HTML
-            html = render_to_string(
+            # Render the product details to HTML; the fragment only
+            # depends on the product, so it is served from the card cache
+            html = render_product_card(
+                product,
                 'shop/includes/product_quick_view.html',
-                {'product': product},
                 request=request
             )
 
@@ -84,7 +84,7 @@ class CartAddView(CartAccessMixin, View):
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 # Get cart summary for enhanced response
                 cart_items = []
-                for item in cart.items.all():
+                for item in cart.snapshot():
                     cart_items.append({
                         'id': item.product.id,
                         'name': item.product.name,
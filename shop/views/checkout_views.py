@@ -5,19 +5,21 @@ import json
 import logging
 
 from django.contrib import messages
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import TemplateView, View
 
-import stripe
-
 from ..forms import CheckoutForm
-from ..models import Order, OrderItem
+from ..models import Order
+from ..utils.order_utils import add_order_items
 from ..utils.session_utils import (
     clear_stripe_session_data, is_client_secret_valid,
     store_stripe_session_data,
 )
+from ..utils.stripe_gateway import get_stripe_gateway
 from ..utils.stripe_utils import (
     create_payment_intent, get_stripe_publishable_key, get_stripe_secret_key,
+    update_or_create_payment_intent,
 )
 from .mixins import CartAccessMixin
 
@@ -39,13 +41,13 @@ class CheckoutView(CartAccessMixin, View):
         cart = request.cart
 
         # Check if cart is empty - redirect to cart instead of prefilling forms
-        if cart.items.count() == 0:
+        if not cart:
             logger.debug("Cart is empty, redirecting to cart")
             messages.warning(request, "Your cart is empty!")
             return redirect('shop:cart')
 
         logger.debug(
-            f"Cart contains {cart.items.count()} \
+            f"Cart contains {len(cart)} \
                 items with total price {cart.total_price}")
 
         # Get Stripe publishable key from utils
@@ -63,15 +65,14 @@ class CheckoutView(CartAccessMixin, View):
             logger.debug("Using existing valid client_secret from session")
             client_secret = request.session.get('client_secret')
         else:
-            # Clear any existing invalid client secret
-            clear_stripe_session_data(request)
-
-            # Create a new payment intent for the checkout
-            logger.debug("Creating new payment intent for checkout")
-            client_secret, error = create_payment_intent(request)
+            # Update the session's payment intent for the changed cart, or
+            # create one if it has none that can still be changed
+            logger.debug("Updating payment intent for checkout")
+            client_secret, error = update_or_create_payment_intent(request)
 
             if error:
                 logger.error(f"Error creating payment intent: {error}")
+                clear_stripe_session_data(request)
                 messages.error(
                     request,
                     f"Payment error: {error}. Please try again.")
@@ -221,7 +222,7 @@ class CheckoutView(CartAccessMixin, View):
         logger.info("Processing checkout form submission")
 
         # Return to cart if empty
-        if cart.items.count() == 0:
+        if not cart:
             logger.warning("Attempted to submit checkout with empty cart")
             messages.error(request, "Your cart is empty!")
             return redirect('shop:cart')
@@ -272,27 +273,28 @@ class CheckoutView(CartAccessMixin, View):
         # Validate client_secret against current cart state
         has_valid_client_secret = is_client_secret_valid(request, cart)
 
-        # Get client_secret from POST or session
-        client_secret = request.POST.get('client_secret')
-        if client_secret:
-            logger.debug(
-                f"Received client_secret from POST: {client_secret[:10]}...")
-        else:
-            logger.debug("No client_secret in POST data, checking session")
-            client_secret = request.session.get('client_secret')
+        # Only the session's intent is ever changed. A posted secret that
+        # does not match it comes from a stale page
+        client_secret = request.session.get('client_secret')
+        posted_secret = request.POST.get('client_secret')
+        stale_page = bool(posted_secret) and posted_secret != client_secret
 
         # Check if we need to create a new payment intent
-        if not client_secret or not has_valid_client_secret:
-            logger.warning(
-                "No valid client_secret found, creating new payment intent")
-            # Clear any existing invalid client secret
-            clear_stripe_session_data(request)
-
-            # Create a new payment intent
-            client_secret, error = create_payment_intent(request)
+        if stale_page or not client_secret or not has_valid_client_secret:
+            if stale_page:
+                logger.warning(
+                    "Posted client_secret does not match the session, "
+                    "creating a new payment intent")
+                client_secret, error = create_payment_intent(request)
+            else:
+                logger.warning(
+                    "No valid client_secret found, updating payment intent")
+                client_secret, error = update_or_create_payment_intent(
+                    request)
 
             if error:
                 logger.error(f"Error creating new payment intent: {error}")
+                clear_stripe_session_data(request)
                 messages.error(
                     request,
                     f"Payment error: {error}. Please try again.")
@@ -326,11 +328,10 @@ class CheckoutView(CartAccessMixin, View):
                     # Get the API key from utils
                     stripe_api_key = get_stripe_secret_key()
                     if stripe_api_key:
-                        stripe.api_key = stripe_api_key
-
                         # Retrieve the payment intent to verify it exists and
                         # is valid
-                        payment_intent = stripe.PaymentIntent.retrieve(pid)
+                        payment_intent = (
+                            get_stripe_gateway().retrieve_payment_intent(pid))
 
                         # Check if the payment intent is in a valid state
                         valid_states = [
@@ -414,35 +415,49 @@ class CheckoutView(CartAccessMixin, View):
                         f"{request.user.username}")
                     order.user = request.user
 
-                # Save the order to generate order number
-                order.save()
+                # Save the order and its lines together. stripe_pid is
+                # unique, so the save fails if the webhook already created
+                # the order for this PaymentIntent; use that order instead.
+                # Stock is taken when the webhook confirms the payment
+                existing_order = None
+                lines = [(item.product_id, item.quantity, item.price)
+                         for item in cart.snapshot()]
+                try:
+                    with transaction.atomic():
+                        try:
+                            with transaction.atomic():
+                                order.save()
+                        except IntegrityError:
+                            existing_order = Order.objects.get(stripe_pid=pid)
+                        else:
+                            _, missing = add_order_items(
+                                order, lines, adjust_stock=False)
+                            if missing:
+                                raise ValueError(
+                                    f"Products {missing} no longer exist")
+                except Exception as item_creation_exception:
+                    logger.error(
+                        f"Error creating order items: "
+                        f"{item_creation_exception}")
+                    messages.error(
+                        request,
+                        "There was an error processing your order. \
+                            Please try again.")
+                    return redirect('shop:checkout')
+
+                if existing_order is not None:
+                    logger.info(
+                        f"Order {existing_order.order_number} for {pid} was "
+                        f"already created by the webhook")
+                    cart.clear()
+                    request.session['order_id'] = existing_order.id
+                    return redirect(
+                        'shop:checkout_success', order_id=existing_order.id)
                 logger.info(
                     f"Order created with number: {order.order_number}")
                 logger.debug(
                     f"Billing same as shipping: {billing_same_as_shipping}")
 
-                # Populate order with items from cart
-                logger.debug("Adding cart items to order")
-                for item in cart.items.all():
-                    try:
-                        OrderItem.objects.create(
-                            order=order,
-                            product=item.product,
-                            quantity=item.quantity,
-                            price=item.price,
-                        )
-                    except Exception as item_creation_exception:
-                        logger.error(
-                            f"Error creating order item for product "
-                            f"{item.product.name}: {item_creation_exception}"
-                        )
-                        order.delete()  # Remove incomplete order
-                        messages.error(
-                            request,
-                            "There was an error processing your order. \
-                                Please try again.")
-                        return redirect('shop:checkout')
-
                 # Clear the cart
                 cart.clear()
                 logger.info("Cart cleared after successful order")
@@ -10,7 +10,7 @@ from django.views.generic import ListView, View
 
 from products.models import ProductAttributeType
 
-from ..models import ComparisonList, Product
+from ..models import Product
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +28,14 @@ class ComparisonView(ListView):
         """
         if self.request.user.is_authenticated:
             # For authenticated users, get from database
-            try:
-                comparison_list = ComparisonList.objects.get(
-                    user=self.request.user)
-                products = comparison_list.products.all()
-                logger.debug(f"Retrieved {products.count()} products for "
-                             f"authenticated user comparison")
-                return products
-            except ComparisonList.DoesNotExist:
+            comparison_list = self.request.comparison_list
+            if comparison_list.comparison_list is None:
                 logger.debug("No comparison list found for authenticated user")
                 return Product.objects.none()
+            products = comparison_list.products.all()
+            logger.debug(f"Retrieved {products.count()} products for "
+                         f"authenticated user comparison")
+            return products
         else:
             # For anonymous users, get from session
             comparison_list = self.request.session.get('comparison', [])
@@ -115,7 +115,7 @@ class SecureCheckoutMixin(LoginRequiredMixin):
             return self.handle_no_permission()
 
         # Check if cart exists and has items
-        if not request.cart or not request.cart.items.exists():
+        if not request.cart:
             messages.warning(
                 request, "Your cart is empty. Add items before checkout.")
             return redirect('shop:cart')
@@ -14,7 +14,9 @@ from django.views import View
 from django.views.decorators.http import require_POST
 
 import stripe
-from djstripe.models import APIKey
+
+from ..utils.stripe_gateway import get_stripe_gateway
+from ..utils.stripe_utils import get_stripe_secret_key
 
 logger = logging.getLogger(__name__)
 
@@ -46,9 +48,6 @@ class CreatePaymentIntentView(View):
                 return JsonResponse(
                     {'error': 'Stripe API key is not configured correctly'},
                     status=500)
-
-            # Set the API key for this request
-            stripe.api_key = stripe_api_key
         except Exception as e:
             logger.error(f"Error getting Stripe API key: {e}")
             return JsonResponse(
@@ -77,7 +76,7 @@ class CreatePaymentIntentView(View):
                 'created_at': timezone.now().isoformat(),
             }
 
-            intent = stripe.PaymentIntent.create(
+            intent = get_stripe_gateway().create_payment_intent(
                 amount=stripe_total,
                 currency=settings.STRIPE_CURRENCY,
                 metadata=metadata,
@@ -114,46 +113,7 @@ class CreatePaymentIntentView(View):
         """
         Get the Stripe API key from multiple possible sources
         """
-        # First try from settings
-        if hasattr(
-                settings,
-                'STRIPE_SECRET_KEY') and settings.STRIPE_SECRET_KEY:
-            logger.debug("Using STRIPE_SECRET_KEY from settings")
-            return settings.STRIPE_SECRET_KEY
-
-        # Then try from database
-        try:
-            # Try by type first
-            api_key = APIKey.objects.filter(type="sk_test").first()
-
-            # If that doesn't work, try by name
-            if not api_key:
-                for possible_name in [
-                    "test_secret",
-                    "Test Secret",
-                    "secret",
-                        "Secret"]:
-                    api_key = APIKey.objects.filter(
-                        name__iexact=possible_name).first()
-                    if api_key:
-                        break
-
-            # If that doesn't work, try any key with sk_test
-            if not api_key:
-                for key in APIKey.objects.all():
-                    if key.secret and key.secret.startswith('sk_test'):
-                        api_key = key
-                        break
-
-            if api_key and api_key.secret:
-                logger.debug(
-                    f"Using API key from database: "
-                    f"{getattr(api_key, 'name', 'unknown')}")
-                return api_key.secret
-        except Exception as e:
-            logger.error(f"Error retrieving API key from database: {e}")
-
-        return None
+        return get_stripe_secret_key()
 
     def get_cart_data(self, cart):
         """
@@ -168,7 +128,7 @@ class CreatePaymentIntentView(View):
             'total': str(cart.total_price)
         }
 
-        for item in cart.items.all():
+        for item in cart.items.select_related('product'):
             cart_data['items'].append({
                 'product_id': item.product.id,
                 'product_name': item.product.name,
@@ -218,8 +178,7 @@ def cache_checkout_data(request):
             }, status=400)
 
         # Get Stripe API key
-        stripe.api_key = CreatePaymentIntentView().get_stripe_api_key()
-        if not stripe.api_key:
+        if not CreatePaymentIntentView().get_stripe_api_key():
             logger.error("No Stripe API key available")
             return JsonResponse(
                 {'error': 'Stripe API key is not configured correctly'},
@@ -231,7 +190,7 @@ def cache_checkout_data(request):
             cart_data = request.cart.to_dict()
         elif hasattr(request.cart, 'items'):
             cart_items = []
-            for item in request.cart.items.all():
+            for item in request.cart.items.select_related('product'):
                 cart_items.append({
                     'product_id': item.product.id,
                     'quantity': item.quantity,
@@ -243,7 +202,7 @@ def cache_checkout_data(request):
         try:
             logger.info(f"Modifying payment intent: {pid}")
             try:
-                stripe.PaymentIntent.modify(pid, metadata={
+                get_stripe_gateway().modify_payment_intent(pid, metadata={
                     'cart': json.dumps(cart_data),
                     'save_info': save_info,
                     'username': (request.user.username if
@@ -309,9 +268,6 @@ def reset_payment_intent(request):
                 request,
                 "Payment system configuration error. Please try again later.")
             return redirect('shop:checkout')
-
-        # Set the API key for this request
-        stripe.api_key = stripe_api_key
     except Exception as e:
         logger.error(f"Error getting Stripe API key: {e}")
         messages.error(
@@ -340,7 +296,7 @@ def reset_payment_intent(request):
         }
 
         # Create a fresh payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe_gateway().create_payment_intent(
             amount=stripe_total,
             currency=settings.STRIPE_CURRENCY,
             metadata=metadata,
@@ -402,9 +358,6 @@ def create_new_payment_intent(request):
         if not stripe_api_key:
             logger.error("No Stripe API key found")
             return None, "Payment system configuration error"
-
-        # Set the API key for this request
-        stripe.api_key = stripe_api_key
     except Exception as e:
         logger.error(f"Error getting Stripe API key: {e}")
         return None, "Payment system configuration error"
@@ -430,7 +383,7 @@ def create_new_payment_intent(request):
         }
 
         # Create a fresh payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe_gateway().create_payment_intent(
             amount=stripe_total,
             currency=settings.STRIPE_CURRENCY,
             metadata=metadata,
@@ -3,21 +3,31 @@ Views for product display and management
 """
 import logging
 
-from django.db.models import Q
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views.generic import DetailView, ListView
 
-from products.models import Category, Product
+from products.category_tree import category_subtree_q, get_category_tree
+from products.models import Product
+from products.search import search_products
+from skunkmonkey.utils.pagination import KeysetPaginationMixin
 
 from ..forms import CartAddProductForm
 from ..models import RecentlyViewedItem
+from ..utils.shopper_state import get_shopper_state
 from .mixins import CartAccessMixin
 
 logger = logging.getLogger(__name__)
 
+# Search ranks are floats (a float4 on PostgreSQL) that do not survive a
+# JSON round trip in a cursor exactly, so relevance pages seek on this
+# many steps per unit of rank instead
+RANK_KEY_SCALE = 10 ** 6
+
 
 def product_list_ajax(request):
     """
@@ -27,28 +37,23 @@ def product_list_ajax(request):
         # Handle category filter
         category = request.GET.get('category')
         search = request.GET.get('search', '').lower()
-        sort = request.GET.get('sort', 'name-asc')
+        sort = request.GET.get(
+            'sort', 'relevance' if search else 'name-asc')
         count_only = request.GET.get('count_only') == 'true'
 
         products = Product.objects.filter(is_active=True)
 
-        # Apply filters
+        # Apply filters; each category includes its subcategories
         if category:
-            if ',' in category:
-                category_ids = [c for c in category.split(',') if c]
-                if category_ids:
-                    products = products.filter(category_id__in=category_ids)
-            else:
-                products = products.filter(category_id=category)
+            category_ids = [c for c in category.split(',') if c]
+            if category_ids:
+                products = products.filter(
+                    category_subtree_q(category_ids))
 
         if search:
-            products = products.filter(
-                Q(name__icontains=search)
-                | Q(description__icontains=search)
-                | Q(category__name__icontains=search)
-            )
+            products = search_products(products, search)
 
-        # Apply sorting
+        # Apply sorting; relevance keeps the search rank ordering
         sort_mapping = {
             'name-asc': 'name',
             'name-desc': '-name',
@@ -57,7 +62,8 @@ def product_list_ajax(request):
             'newest': '-created_at',
             'popularity': '-view_count',  # If you track view counts
         }
-        products = products.order_by(sort_mapping.get(sort, 'name'))
+        if not (search and sort == 'relevance'):
+            products = products.order_by(sort_mapping.get(sort, 'name'))
 
         product_count = products.count()
 
@@ -96,9 +102,12 @@ def product_list_ajax(request):
     return redirect('shop:product_list')
 
 
-class ProductListView(ListView):
+class ProductListView(KeysetPaginationMixin, ListView):
     """
     View for displaying products, with optional category filtering and search
+
+    Paginated by cursor on the selected sort order (see
+    skunkmonkey.utils.pagination).
     """
     model = Product
     template_name = 'shop/product_list.html'
@@ -108,27 +117,27 @@ class ProductListView(ListView):
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True)
 
-        # Category filtering
+        # Category filtering covers the whole subtree in one IN lookup
         category_slug = self.kwargs.get('category_slug')
         if category_slug:
-            self.current_category = get_object_or_404(
-                Category, slug=category_slug)
-            queryset = queryset.filter(category=self.current_category)
+            tree = get_category_tree()
+            self.current_category = tree.get_by_slug(category_slug)
+            if self.current_category is None:
+                raise Http404("No category matches the given query.")
+            queryset = queryset.filter(category_id__in=tree.descendant_ids(
+                self.current_category.pk))
         else:
             self.current_category = None
 
         # Search filtering
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query)
-                | Q(description__icontains=search_query)
-                | Q(category__name__icontains=search_query)
-            )
+            queryset = search_products(queryset, search_query)
         self.search_query = search_query
 
-        # Sorting
-        sort = self.request.GET.get('sort', 'name-asc')
+        # Sorting - searches default to relevance (search rank) ordering
+        sort = self.request.GET.get(
+            'sort', 'relevance' if search_query else 'name-asc')
         sort_mapping = {
             'name-asc': 'name',
             'name-desc': '-name',
@@ -139,13 +148,17 @@ class ProductListView(ListView):
         }
 
         self.current_sort = sort
+        if search_query and sort == 'relevance':
+            return queryset.annotate(search_rank_key=Cast(
+                F('search_rank') * RANK_KEY_SCALE, IntegerField(),
+            )).order_by('-search_rank_key', 'name')
         return queryset.order_by(sort_mapping.get(sort, 'name'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         # Add categories for sidebar navigation
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_category_tree().categories
         context['current_category'] = getattr(self, 'current_category', None)
         context['search_query'] = getattr(self, 'search_query', '')
         context['current_sort'] = getattr(self, 'current_sort', 'name-asc')
@@ -168,12 +181,10 @@ class ProductListView(ListView):
             from ..models import WishlistItem
             context['wishlist_items'] = WishlistItem.objects.filter(
                 user=self.request.user)
-            context['wishlist_product_ids'] = list(
-                context['wishlist_items'].values_list(
-                    'product_id', flat=True))
         else:
             context['wishlist_items'] = []
-            context['wishlist_product_ids'] = []
+        context['wishlist_product_ids'] = sorted(
+            get_shopper_state(self.request).wishlist_ids)
 
         # Initialize other potentially used context variables to avoid None
         # references
@@ -278,16 +289,12 @@ class ProductSearchView(ListView):
         self.query = query
 
         if query:
-            return Product.objects.filter(
-                Q(name__icontains=query)
-                | Q(description__icontains=query)
-                | Q(category__name__icontains=query),
-                is_active=True
-            )
+            return search_products(
+                Product.objects.filter(is_active=True), query)
         return Product.objects.none()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = getattr(self, 'query', '')
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_category_tree().categories
         return context
@@ -19,7 +19,7 @@ from django.views.generic import View
 # Local Imports
 from products.models import Product
 
-from ..models import ComparisonList
+from ..utils.comparison_utils import LazyComparisonList
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
@@ -77,17 +77,16 @@ class ToggleComparisonView(View):
 
             if request.user.is_authenticated:
                 # Handle authenticated users with database storage
-                with transaction.atomic():
-                    comparison_list, created = (
-                        ComparisonList.objects.get_or_create(
-                            user=request.user,
-                            defaults={'session_id': ''}
-                        )
-                    )
+                # The list row is only created (and any duplicates merged)
+                # when a product is actually added
+                comparison_list = getattr(request, 'comparison_list', None)
+                if comparison_list is None:
+                    comparison_list = LazyComparisonList(request)
 
-                    if comparison_list.products.filter(id=product_id).exists():
+                with transaction.atomic():
+                    if product_id in comparison_list.product_ids:
                         # Product is already in comparison, remove it
-                        comparison_list.products.remove(product)
+                        comparison_list.remove(product)
                         is_in_comparison = False
                         was_removed = True
                         message = f"'{product.name}' removed from comparison."
@@ -97,7 +96,7 @@ class ToggleComparisonView(View):
                         )
                     else:
                         # Check if we're at the limit (4 products max)
-                        if comparison_list.products.count() >= 4:
+                        if len(comparison_list.product_ids) >= 4:
                             message = (
                                 "You can compare up to 4 products at a time. "
                                 "Remove a product to add another."
@@ -111,15 +110,14 @@ class ToggleComparisonView(View):
                                 return JsonResponse({
                                     'success': False,
                                     'message': message,
-                                    'comparison_count': (
-                                        comparison_list.products.count()
-                                    ),
+                                    'comparison_count': len(
+                                        comparison_list.product_ids),
                                 })
                             messages.warning(request, message)
                             return redirect('shop:comparison')
 
                         # Add product to comparison
-                        comparison_list.products.add(product)
+                        comparison_list.add(product)
                         is_in_comparison = True
                         was_added = True
                         message = f"'{product.name}' added to comparison."
@@ -128,7 +126,7 @@ class ToggleComparisonView(View):
                             f"{product.id} ('{product.name}') to comparison."
                         )
 
-                count = comparison_list.products.count()
+                count = len(comparison_list.product_ids)
 
             else:
                 # Handle anonymous users with session storage
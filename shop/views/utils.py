@@ -1,6 +1,8 @@
-from django.db.models import Q
 from django.utils import timezone
 
+from products.category_tree import category_subtree_q
+from products.search import search_products
+
 from ..models import RecentlyViewedItem
 
 
@@ -62,25 +64,15 @@ def apply_product_filters(queryset, category=None, search=None):
     Returns:
         Filtered queryset
     """
-    # Apply category filter
+    # Apply category filter; each category includes its subcategories
     if category:
-        # Check if we have multiple categories (comma-separated)
-        if ',' in category:
-            category_ids = [c for c in category.split(',') if c]
-            if category_ids:
-                # Filter products that have any of the selected categories
-                queryset = queryset.filter(category_id__in=category_ids)
-        else:
-            # Single category case
-            queryset = queryset.filter(category_id=category)
-
-    # Apply search filter
+        category_ids = [c for c in category.split(',') if c]
+        if category_ids:
+            queryset = queryset.filter(category_subtree_q(category_ids))
+
+    # Apply full-text search filter (ranked)
     if search:
-        queryset = queryset.filter(
-            Q(name__icontains=search)
-            | Q(description__icontains=search)
-            | Q(category__name__icontains=search)
-        )
+        queryset = search_products(queryset, search)
 
     return queryset
 
@@ -96,12 +88,17 @@ def apply_product_sorting(queryset, sort='name-asc'):
             name-desc,
             price-asc,
             price-desc,
-            newest
+            newest,
+            relevance
         )
 
     Returns:
         Sorted queryset
     """
+    # Relevance keeps the ordering applied by search_products()
+    if sort == 'relevance' and 'search_rank' in queryset.query.annotations:
+        return queryset
+
     sort_mapping = {
         'name-asc': 'name',
         'name-desc': '-name',
@@ -1,16 +1,20 @@
 import json
 import logging
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
 
-import stripe
+from users.utils.email_queue import queue_email
 
-from products.models import Product
-
-from .models import Order, OrderItem
+from .models import Order
+from .utils.order_utils import (
+    add_order_items, parse_cart_lines, take_order_stock,
+)
+from .utils.stripe_gateway import get_stripe_gateway
 from .utils.stripe_utils import get_stripe_key
 
 # Get a logger instance for this file
@@ -26,15 +30,73 @@ class StripeWH_Handler:
     def __init__(self, request):
         self.request = request
         logger.debug("StripeWH_Handler initialized")
-        # Set the Stripe API key using our utility function
-        stripe.api_key = get_stripe_key('secret')
+        # Stripe calls pass the API key per request through the gateway
+        self.gateway = get_stripe_gateway()
 
     def _send_confirmation_email(self, order):
-        """Send the user a confirmation email"""
-        # This would be implemented to send an actual email
+        """
+        Queue the user's confirmation email in the surrounding
+        transaction, keyed on the order number, so a rolled back (and
+        later retried) or redelivered event never sends it twice
+        """
+        body = render_to_string(
+            'shop/confirmation_emails/confirmation_email_body.txt',
+            {'order': order, 'contact_email': settings.DEFAULT_FROM_EMAIL})
+        queue_email(
+            subject=f'SkunkMonkey order confirmation {order.order_number}',
+            body=body,
+            to=order.email,
+            dedupe_key=f'order-confirmation:{order.order_number}',
+        )
         logger.info(
-            f"Confirmation email would be sent for order "
-            f"{order.order_number}")
+            f"Confirmation email queued for order {order.order_number}")
+
+    def _mark_order_paid(self, order, payment_intent,
+                         billing_same_as_shipping):
+        """
+        Mark an existing order as paid, take its lines out of stock and
+        send its confirmation email
+
+        Does nothing for orders that are already paid, so redelivered events
+        and the checkout POST racing the webhook never repeat Stripe lookups
+        or emails.
+
+        Args:
+            order: Order locked with select_for_update
+            payment_intent: The Stripe payment intent object
+            billing_same_as_shipping: Whether billing address is
+            same as shipping
+
+        Returns:
+            True if the order was changed
+        """
+        if order.is_paid:
+            logger.info(f"Order {order.order_number} is already paid")
+            return False
+
+        order.status = 'paid'
+        order.is_paid = True
+        order.payment_status = 'completed'
+        order.paid_at = timezone.now()
+
+        # Update payment method type if available
+        payment_method_type = self.get_payment_method_type(payment_intent)
+        if payment_method_type:
+            order.payment_method_type = payment_method_type
+
+        # Update billing information if needed
+        self.update_billing_information(
+            order, payment_intent, billing_same_as_shipping)
+
+        order.save()
+        logger.debug(f"Order {order.order_number} updated to paid status")
+
+        # Orders placed through the checkout view reserve no stock until
+        # their payment is confirmed
+        take_order_stock(order)
+
+        self._send_confirmation_email(order)
+        return True
 
     def handle_event(self, event):
         """
@@ -48,6 +110,48 @@ class StripeWH_Handler:
             status=200
         )
 
+    def get_event_handler(self, event_type):
+        """
+        Return the handler method for a Stripe event type
+
+        Args:
+            event_type: The Stripe event type, e.g. 'payment_intent.succeeded'
+
+        Returns:
+            Bound handler method; handle_event for unmapped types
+        """
+        # Map webhook events to relevant handler functions
+        # Enhanced to support Payment Element events
+        event_map = {
+            # Payment Intent events
+            'payment_intent.succeeded': self.handle_payment_intent_succeeded,
+            'payment_intent.payment_failed': (
+                self.handle_payment_intent_payment_failed),
+            'payment_intent.created': self.handle_event,
+            'payment_intent.canceled': self.handle_event,
+
+            # Payment Method events
+            'payment_method.attached': self.handle_payment_method_attached,
+            'payment_method.detached': self.handle_event,
+            'payment_method.updated': self.handle_event,
+
+            # Setup Intent events (for saving payment methods)
+            'setup_intent.created': self.handle_event,
+            'setup_intent.setup_failed': self.handle_event,
+            'setup_intent.succeeded': self.handle_event,
+
+            # Customer events
+            'customer.created': self.handle_event,
+            'customer.updated': self.handle_event,
+            'customer.deleted': self.handle_event,
+
+            # Checkout Session events (if using Checkout)
+            'checkout.session.completed': self.handle_event,
+            'checkout.session.async_payment_succeeded': self.handle_event,
+            'checkout.session.async_payment_failed': self.handle_event,
+        }
+        return event_map.get(event_type, self.handle_event)
+
     def handle_payment_method_attached(self, event):
         """
         Handle the payment_method.attached webhook from Stripe
@@ -129,9 +233,10 @@ class StripeWH_Handler:
         logger.debug(f"Billing same as shipping: {billing_same_as_shipping}")
 
         try:
-            # Try to get the order from the database - use filter().first()
-            # instead of get() to avoid MultipleObjectsReturned error
-            order = Order.objects.filter(stripe_pid=pid).first()
+            # Look the order up by its unique stripe_pid, locking it so the
+            # checkout POST cannot update it at the same time
+            order = Order.objects.select_for_update().filter(
+                stripe_pid=pid).first()
 
             if order:
                 logger.info(
@@ -139,27 +244,7 @@ class StripeWH_Handler:
                     f"payment intent {pid}")
 
                 # Ensure order is marked as paid if not already
-                if not order.is_paid:
-                    order.status = 'paid'
-                    order.is_paid = True
-                    order.payment_status = 'completed'
-                    order.paid_at = timezone.now()
-
-                    # Update payment method type if available
-                    payment_method_type = self.get_payment_method_type(intent)
-                    if payment_method_type:
-                        order.payment_method_type = payment_method_type
-
-                    # Update billing information if needed
-                    self.update_billing_information(
-                        order, intent, billing_same_as_shipping)
-
-                    order.save()
-                    logger.debug(
-                        f"Order {order.order_number} updated to paid status")
-
-                # Send confirmation email
-                self._send_confirmation_email(order)
+                self._mark_order_paid(order, intent, billing_same_as_shipping)
 
                 logger.info(
                     f"Order {order.order_number} marked as paid via webhook")
@@ -230,18 +315,19 @@ class StripeWH_Handler:
                         ),
                         status=500)
 
-                stripe.api_key = stripe_api_key
                 logger.debug(
                     "Retrieving full payment intent details from Stripe")
-                payment_intent = stripe.PaymentIntent.retrieve(pid)
+                payment_intent = self.gateway.retrieve_payment_intent(
+                    pid, use_cache=False)
 
                 # Get payment method details if available
                 payment_method = None
                 if (hasattr(payment_intent, 'payment_method')
                         and payment_intent.payment_method):
                     try:
-                        payment_method = stripe.PaymentMethod.retrieve(
-                            payment_intent.payment_method)
+                        payment_method = (
+                            self.gateway.retrieve_payment_method(
+                                payment_intent.payment_method))
                         logger.debug(
                             f"Retrieved payment method: {payment_method.id}")
                     except Exception as e:
@@ -283,7 +369,7 @@ class StripeWH_Handler:
                         and payment_intent.customer):
                     # Try to get from customer
                     try:
-                        customer = stripe.Customer.retrieve(
+                        customer = self.gateway.retrieve_customer(
                             payment_intent.customer)
                         logger.debug(f"Got customer details: {customer.id}")
                         if hasattr(customer, 'email'):
@@ -332,49 +418,6 @@ class StripeWH_Handler:
                             f"details: {e}")
                     return default
 
-                # Double-check for existing orders to prevent duplicates
-                existing_order = Order.objects.filter(stripe_pid=pid).first()
-                if existing_order:
-                    logger.warning(
-                        f"Order with pid {pid} already exists (order "
-                        f"number: {existing_order.order_number}), "
-                        f"skipping creation")
-                    # Update the existing order if needed
-                    if not existing_order.is_paid:
-                        existing_order.status = 'paid'
-                        existing_order.is_paid = True
-                        existing_order.payment_status = 'completed'
-                        existing_order.paid_at = timezone.now()
-
-                        # Update payment method type
-                        payment_method_type = self.get_payment_method_type(
-                            payment_intent)
-                        if payment_method_type:
-                            existing_order.payment_method_type = (
-                                payment_method_type)
-
-                        # Update billing information
-                        self.update_billing_information(
-                            existing_order,
-                            payment_intent,
-                            billing_same_as_shipping)
-
-                        existing_order.save()
-                        logger.debug(
-                            f"Existing order {existing_order.order_number} "
-                            f"updated to paid status")
-
-                    # Send confirmation email
-                    self._send_confirmation_email(existing_order)
-
-                    return HttpResponse(
-                        content=(
-                            f"Webhook received: {event.type} | SUCCESS: "
-                            f"Order {existing_order.order_number} "
-                            f"already exists"
-                        ),
-                        status=200)
-
                 # Get name from billing or shipping details
                 full_name = ''
                 if (isinstance(shipping_details, dict)
@@ -476,125 +519,68 @@ class StripeWH_Handler:
                     f"{shipping_line1}, {shipping_city}, {shipping_state}, "
                     f"{shipping_zipcode}, {shipping_country}")
 
-                # Create new order with enhanced billing information
-                order = Order.objects.create(
-                    user=user,
-                    full_name=full_name,
-                    email=email or (
-                        user.email if user else 'customer@example.com'),
-                    phone_number=phone or '',
-                    shipping_address1=shipping_line1,
-                    shipping_address2=shipping_line2,
-                    shipping_city=shipping_city,
-                    shipping_state=shipping_state,
-                    shipping_zipcode=shipping_zipcode,
-                    shipping_country=shipping_country,
-                    billing_name=billing_name,
-                    billing_address1=billing_line1,
-                    billing_address2=billing_line2,
-                    billing_city=billing_city,
-                    billing_state=billing_state,
-                    billing_zipcode=billing_zipcode,
-                    billing_country=billing_country,
-                    total_price=round(payment_intent.amount / 100, 2),
-                    grand_total=round(payment_intent.amount / 100, 2),
-                    status='paid',
-                    is_paid=True,
-                    payment_status='completed',
-                    paid_at=timezone.now(),
-                    stripe_pid=pid,
-                    stripe_client_secret=payment_intent.client_secret,
-                    payment_method_type=payment_method_type,
-                    original_cart=cart_data_str or '',
-                )
+                # Create new order with enhanced billing information and
+                # its lines in one transaction. The unique stripe_pid makes
+                # this fail if the checkout POST created the order while
+                # Stripe was being queried
+                try:
+                    with transaction.atomic():
+                        order = Order.objects.create(
+                            user=user,
+                            full_name=full_name,
+                            email=email or (
+                                user.email if user
+                                else 'customer@example.com'),
+                            phone_number=phone or '',
+                            shipping_address1=shipping_line1,
+                            shipping_address2=shipping_line2,
+                            shipping_city=shipping_city,
+                            shipping_state=shipping_state,
+                            shipping_zipcode=shipping_zipcode,
+                            shipping_country=shipping_country,
+                            billing_name=billing_name,
+                            billing_address1=billing_line1,
+                            billing_address2=billing_line2,
+                            billing_city=billing_city,
+                            billing_state=billing_state,
+                            billing_zipcode=billing_zipcode,
+                            billing_country=billing_country,
+                            total_price=round(payment_intent.amount / 100, 2),
+                            grand_total=round(payment_intent.amount / 100, 2),
+                            status='paid',
+                            is_paid=True,
+                            payment_status='completed',
+                            paid_at=timezone.now(),
+                            stripe_pid=pid,
+                            stripe_client_secret=payment_intent.client_secret,
+                            payment_method_type=payment_method_type,
+                            original_cart=cart_data_str or '',
+                        )
+                        items, missing = add_order_items(
+                            order, parse_cart_lines(cart_data))
+                except IntegrityError:
+                    existing_order = Order.objects.select_for_update().get(
+                        stripe_pid=pid)
+                    logger.warning(
+                        f"Order with pid {pid} already exists (order "
+                        f"number: {existing_order.order_number}), "
+                        f"skipping creation")
+                    self._mark_order_paid(
+                        existing_order, payment_intent,
+                        billing_same_as_shipping)
+                    return HttpResponse(
+                        content=(
+                            f"Webhook received: {event.type} | SUCCESS: "
+                            f"Order {existing_order.order_number} "
+                            f"already exists"
+                        ),
+                        status=200)
                 logger.debug(
                     f"Order created with order number: {order.order_number}")
 
-                # Create order items from cart data
-                items_count = 0
-                items_failed = 0
-
-                # Handle different cart data formats
-                if isinstance(cart_data, dict):
-                    if ('items' in cart_data
-                            and isinstance(cart_data['items'], dict)):
-                        # Format: {'items': {id: {quantity: x}}}
-                        for item_id, item_data in cart_data['items'].items():
-                            try:
-                                product = Product.objects.get(id=item_id)
-                                quantity = item_data.get('quantity', 1)
-                                logger.debug(
-                                    f"Adding order item: {product.name} "
-                                    f"x {quantity}")
-
-                                # Create the order item
-                                OrderItem.objects.create(
-                                    order=order,
-                                    product=product,
-                                    quantity=quantity,
-                                    price=product.price
-                                )
-                                items_count += 1
-
-                                # Decrease product stock
-                                if hasattr(product, 'stock_quantity'):
-                                    product.stock_quantity = max(
-                                        0,
-                                        product.stock_quantity - quantity)
-                                    product.save()
-                                    logger.debug(
-                                        f"Updated stock for {product.name}: "
-                                        f"new stock = "
-                                        f"{product.stock_quantity}")
-                            except Product.DoesNotExist:
-                                logger.error(
-                                    f"Product with ID {item_id} not found")
-                                items_failed += 1
-                    elif ('items' in cart_data
-                            and isinstance(cart_data['items'], list)):
-                        # Format: {'items': [{product_id: x, quantity: y}]}
-                        for item_data in cart_data['items']:
-                            try:
-                                product_id = item_data.get('product_id')
-                                if not product_id:
-                                    product_id = item_data.get('id')
-
-                                if product_id:
-                                    product = Product.objects.get(
-                                        id=product_id)
-                                    quantity = item_data.get('quantity', 1)
-                                    logger.debug(
-                                        f"Adding order item: {product.name} "
-                                        f"x {quantity}")
-
-                                    # Create the order item
-                                    OrderItem.objects.create(
-                                        order=order,
-                                        product=product,
-                                        quantity=quantity,
-                                        price=product.price
-                                    )
-                                    items_count += 1
-
-                                    # Decrease product stock
-                                    if hasattr(product, 'stock_quantity'):
-                                        product.stock_quantity = max(
-                                            0,
-                                            (product.stock_quantity
-                                             - quantity))
-                                        product.save()
-                                        logger.debug(
-                                            f"Updated stock for "
-                                            f"{product.name}: new stock = "
-                                            f"{product.stock_quantity}")
-                            except Product.DoesNotExist:
-                                logger.error(
-                                    f"Product with ID {product_id} not found")
-                                items_failed += 1
-
                 logger.info(
-                    f"Added {items_count} items to order, "
-                    f"{items_failed} items failed")
+                    f"Added {len(items)} items to order, "
+                    f"{len(missing)} items failed")
 
                 # Save payment method for future use if requested
                 if (save_info and user and payment_method
@@ -691,7 +677,7 @@ class StripeWH_Handler:
         if (hasattr(payment_intent, 'payment_method')
                 and payment_intent.payment_method):
             try:
-                payment_method = stripe.PaymentMethod.retrieve(
+                payment_method = self.gateway.retrieve_payment_method(
                     payment_intent.payment_method)
                 if hasattr(payment_method, 'type'):
                     return payment_method.type
@@ -767,7 +753,7 @@ class StripeWH_Handler:
         if (hasattr(payment_intent, 'payment_method')
                 and payment_intent.payment_method):
             try:
-                payment_method = stripe.PaymentMethod.retrieve(
+                payment_method = self.gateway.retrieve_payment_method(
                     payment_intent.payment_method)
             except Exception as e:
                 logger.error(f"Error retrieving payment method: {e}")
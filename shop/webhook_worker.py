@@ -0,0 +1,184 @@
+"""
+Worker that drains the Stripe WebhookEvent inbox.
+
+Events are claimed in small batches (``SELECT ... FOR UPDATE SKIP LOCKED``
+where the database supports it, so several workers can run side by side),
+dispatched to StripeWH_Handler, and marked succeeded in the same
+transaction as the handler's writes, or rescheduled with exponential
+backoff when the handler fails. An event still failing after
+``STRIPE_WEBHOOK_MAX_ATTEMPTS`` tries is marked failed for a human to look
+at. Events left in processing by a crashed worker are reclaimed once their
+lock is older than ``STRIPE_WEBHOOK_LOCK_TIMEOUT`` seconds.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+import stripe
+
+from skunkmonkey.utils import workers
+
+from .models import WebhookEvent
+from .webhook_handler import StripeWH_Handler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_BASE_DELAY = 30  # seconds, doubled after every failure
+DEFAULT_RETRY_MAX_DELAY = 60 * 60
+DEFAULT_LOCK_TIMEOUT = 10 * 60
+
+
+class WebhookProcessingError(Exception):
+    """Raised when a webhook handler reports a failure"""
+
+
+def retry_delay(attempts):
+    """
+    Backoff before the next try of an event that has failed ``attempts``
+    times (see skunkmonkey.utils.workers.retry_delay)
+
+    Returns:
+        timedelta
+    """
+    return workers.retry_delay(
+        attempts,
+        getattr(settings, 'STRIPE_WEBHOOK_RETRY_BASE_DELAY',
+                DEFAULT_RETRY_BASE_DELAY),
+        getattr(settings, 'STRIPE_WEBHOOK_RETRY_MAX_DELAY',
+                DEFAULT_RETRY_MAX_DELAY))
+
+
+def claim_events(worker_id, limit=10):
+    """
+    Lock a batch of due events for this worker
+
+    Args:
+        worker_id: Identifier stored in locked_by
+        limit: Maximum number of events to claim
+
+    Returns:
+        List of claimed WebhookEvent instances, oldest first
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(
+        settings, 'STRIPE_WEBHOOK_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    due = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='processing', locked_at__lt=stale)
+    )
+    return workers.claim_rows(
+        WebhookEvent, worker_id, due, ('next_attempt_at', 'pk'), limit,
+        status='processing')
+
+
+def process_event(webhook_event):
+    """
+    Run the Stripe handler for one claimed event and record the outcome
+
+    Args:
+        webhook_event: A WebhookEvent claimed by claim_events()
+
+    Returns:
+        True if the handler succeeded
+    """
+    try:
+        # The handler's writes and the succeeded mark commit together, so
+        # an event is either fully handled once or rolled back for a retry
+        with transaction.atomic():
+            locked = WebhookEvent.objects.select_for_update().get(
+                pk=webhook_event.pk)
+            if locked.status == 'succeeded':
+                logger.info(
+                    f"Webhook {webhook_event.event_id} was already "
+                    f"processed, skipping")
+                return True
+
+            handler = StripeWH_Handler(None)
+            event = stripe.Event.construct_from(
+                webhook_event.payload, stripe.api_key)
+            response = handler.get_event_handler(
+                webhook_event.event_type)(event)
+            if response.status_code >= 400:
+                raise WebhookProcessingError(
+                    response.content.decode(errors='replace'))
+
+            WebhookEvent.objects.filter(pk=webhook_event.pk).update(
+                status='succeeded',
+                processed_at=timezone.now(),
+                locked_by='',
+                locked_at=None,
+                last_error='',
+            )
+    except Exception as e:
+        _record_failure(webhook_event, e)
+        return False
+
+    logger.info(
+        f"Processed webhook {webhook_event.event_type} "
+        f"({webhook_event.event_id}) on attempt {webhook_event.attempts}")
+    return True
+
+
+def _record_failure(webhook_event, error):
+    max_attempts = getattr(
+        settings, 'STRIPE_WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    attempts = webhook_event.attempts
+    update = {
+        'locked_by': '',
+        'locked_at': None,
+        'last_error': str(error)[:2000],
+    }
+    if attempts >= max_attempts:
+        update['status'] = 'failed'
+        logger.error(
+            f"Giving up on webhook {webhook_event.event_id} after "
+            f"{attempts} attempts: {error}")
+    else:
+        update['status'] = 'pending'
+        update['next_attempt_at'] = timezone.now() + retry_delay(attempts)
+        logger.warning(
+            f"Webhook {webhook_event.event_id} failed (attempt "
+            f"{attempts} of {max_attempts}), retrying at "
+            f"{update['next_attempt_at']:%H:%M:%S}: {error}")
+    WebhookEvent.objects.filter(pk=webhook_event.pk).update(**update)
+
+
+def process_due_events(worker_id=None, batch_size=10):
+    """
+    Claim and process one batch of due events
+
+    Args:
+        worker_id: Identifier for locked_by; generated if omitted
+        batch_size: Maximum number of events to claim
+
+    Returns:
+        Number of events processed (successfully or not)
+    """
+    worker_id = worker_id or workers.make_worker_id()
+    events = claim_events(worker_id, limit=batch_size)
+    for webhook_event in events:
+        process_event(webhook_event)
+    return len(events)
+
+
+def run_worker(batch_size=10, poll_interval=5, once=False, stop=None):
+    """
+    Process events until stopped
+
+    Args:
+        batch_size: Events claimed per round trip
+        poll_interval: Seconds to sleep when the inbox has nothing due
+        once: Return as soon as nothing is due instead of polling
+        stop: Optional threading.Event that ends the loop when set
+
+    Returns:
+        Total number of events processed
+    """
+    return workers.poll(
+        lambda worker_id: process_due_events(worker_id, batch_size),
+        poll_interval=poll_interval, once=once, stop=stop)
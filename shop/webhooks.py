@@ -1,3 +1,4 @@
+import json
 import logging
 
 from django.conf import settings
@@ -7,8 +8,7 @@ from django.views.decorators.http import require_POST
 
 import stripe
 
-from .utils.stripe_utils import get_stripe_key
-from .webhook_handler import StripeWH_Handler
+from .models import WebhookEvent
 
 # Get a logger instance for this file
 logger = logging.getLogger(__name__)
@@ -19,21 +19,17 @@ logger = logging.getLogger(__name__)
 def webhook(request):
     """
     Listen for webhooks from Stripe
-    Enhanced for Payment Element integration
+
+    Only the signature is checked here; the verified event is stored in the
+    WebhookEvent inbox and acknowledged straight away. The
+    process_webhook_events worker does the actual work (Stripe lookups,
+    order creation, emails) so slow upstream calls never time out the
+    webhook delivery.
     """
     # Setup
     wh_secret = settings.DJSTRIPE_WEBHOOK_SECRET
     logger.info("Webhook received - Starting processing")
 
-    # Get the Stripe API key
-    stripe_api_key = get_stripe_key('secret')
-    if not stripe_api_key:
-        logger.error("No Stripe API key available for webhook processing")
-        return HttpResponse("Configuration error", status=500)
-
-    # Set the API key for this request
-    stripe.api_key = stripe_api_key
-
     # Get the webhook data and verify its signature
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -65,65 +61,29 @@ def webhook(request):
         logger.error(f"Webhook error: {str(e)}", exc_info=True)
         return HttpResponse(content=str(e), status=400)
 
-    # Set up a webhook handler
-    handler = StripeWH_Handler(request)
-    logger.debug("Webhook handler initialized")
-
-    # Map webhook events to relevant handler functions
-    # Enhanced to support Payment Element events
-    event_map = {
-        # Payment Intent events
-        'payment_intent.succeeded': handler.handle_payment_intent_succeeded,
-        'payment_intent.payment_failed': (
-            handler.handle_payment_intent_payment_failed),
-        'payment_intent.created': handler.handle_event,
-        'payment_intent.canceled': handler.handle_event,
-
-        # Payment Method events
-        'payment_method.attached': handler.handle_payment_method_attached,
-        'payment_method.detached': handler.handle_event,
-        'payment_method.updated': handler.handle_event,
-
-        # Setup Intent events (for saving payment methods)
-        'setup_intent.created': handler.handle_event,
-        'setup_intent.setup_failed': handler.handle_event,
-        'setup_intent.succeeded': handler.handle_event,
-
-        # Customer events
-        'customer.created': handler.handle_event,
-        'customer.updated': handler.handle_event,
-        'customer.deleted': handler.handle_event,
-
-        # Checkout Session events (if using Checkout)
-        'checkout.session.completed': handler.handle_event,
-        'checkout.session.async_payment_succeeded': handler.handle_event,
-        'checkout.session.async_payment_failed': handler.handle_event,
-    }
-
-    # Get the webhook type from Stripe
-    event_type = event.type
-
-    logger.info(f"Processing webhook: {event_type} (ID: {event.id})")
-
-    # If there's a handler for it, get it from the event map
-    # Use the generic one by default
-    event_handler = event_map.get(event_type, handler.handle_event)
-    logger.debug(f"Using handler: {event_handler.__name__}")
-
-    # Call the event handler with the event
+    # Queue the event for the worker; a redelivered event is already in
+    # the inbox (processed or not) and is just acknowledged again
     try:
-        response = event_handler(event)
-        logger.info(
-            f"Webhook {event_type} handled successfully - "
-            f"Response: {response.status_code}"
+        queued, created = WebhookEvent.objects.get_or_create(
+            event_id=event.id,
+            defaults={
+                'event_type': event.type,
+                'payload': json.loads(payload),
+            },
         )
-        return response
     except Exception as e:
+        # Not stored, so let Stripe deliver it again later
         logger.error(
-            f"Error during webhook handler execution: {str(e)}",
-            exc_info=True
-        )
+            f"Could not queue webhook {event.id}: {str(e)}", exc_info=True)
         return HttpResponse(
-            content=f"Webhook handler error: {str(e)}",
-            status=500
-        )
+            content="Webhook could not be queued", status=500)
+
+    if not created:
+        logger.info(
+            f"Duplicate delivery of webhook {event.id} ignored "
+            f"(inbox event {queued.pk} is {queued.status})")
+    else:
+        logger.info(f"Queued webhook {event.type} (ID: {event.id}) "
+                    f"as inbox event {queued.pk}")
+    return HttpResponse(
+        content=f'Webhook received: {event.type}', status=200)
@@ -1,23 +1,66 @@
 """
 Custom storage classes for Django using AWS S3 with CloudFront CDN
+
+Media files are stored under content-hash versioned keys
+(``name.<hash>.ext``), so a key never changes content and is served with
+a far-future immutable Cache-Control. URLs are then a pure function of
+the name and are memoized. Image derivatives are the exception: they are
+rewritten under the same key when regenerated, so they get a Cache-Control
+that lets CDNs and browsers pick up the new file.
 """
+import hashlib
 import logging
 import os  # noqa: F401
-import random
-import string
-import time
+import re
 import traceback
 import uuid  # noqa: F401
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 
-import boto3
 from botocore.exceptions import ClientError
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from skunkmonkey.utils.image_derivatives import is_derivative_name
+from skunkmonkey.utils.s3_common import get_s3_client_config
+
 logger = logging.getLogger('django')
 
+VERSION_LENGTH = 12
+DEFAULT_MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_DERIVATIVE_CACHE_CONTROL = 'public, max-age=86400'
+
+# A name already versioned by versioned_name()
+VERSIONED_NAME_RE = re.compile(
+    rf'\.[0-9a-f]{{{VERSION_LENGTH}}}\.[^./]+$')
+
+
+def content_version(content):
+    """Short SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'chunks'):
+        for chunk in content.chunks():
+            digest.update(chunk)
+    else:
+        content.seek(0)
+        for chunk in iter(lambda: content.read(64 * 1024), b''):
+            digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:VERSION_LENGTH]
+
+
+def versioned_name(name, version):
+    """Insert a content version before the extension: a.jpg -> a.<v>.jpg"""
+    root, ext = os.path.splitext(name)
+    return f"{root}.{version}{ext}"
+
+
+@lru_cache(maxsize=4096)
+def cloudfront_url(domain, location, name):
+    """The CloudFront URL of a stored file"""
+    return f"https://{domain}/{location}/{name}"
+
 
 def log_s3_operation(message, level='info', error=None):
     """Log S3 operations with a consistent format for easier filtering in
@@ -62,8 +105,13 @@ class MediaStorage(S3Boto3Storage):
     # Disable ACL usage for buckets with Object Ownership set to
     # "Bucket owner enforced"
     default_acl = ''  # Empty string instead of None
-    # Omit ACL parameter entirely instead of setting to None
-    object_parameters = {}  # Empty dict without ACL key
+    # Omit ACL parameter entirely instead of setting to None. Keys are
+    # versioned by content, so they can be cached for good
+    object_parameters = {
+        'CacheControl': getattr(
+            settings, 'AWS_S3_MEDIA_CACHE_CONTROL',
+            DEFAULT_MEDIA_CACHE_CONTROL),
+    }
 
     def __init__(self, *args, **kwargs):
         # Clean the AWS region name first to ensure it doesn't have comments
@@ -83,6 +131,10 @@ class MediaStorage(S3Boto3Storage):
             else None
         )
 
+        # Pooled connections and adaptive retries, as for the shared
+        # client in skunkmonkey.utils.s3_common
+        kwargs.setdefault('client_config', get_s3_client_config())
+
         print(
             f"DEBUG: Initializing MediaStorage with region: {region}, "
             f"bucket: {settings.AWS_STORAGE_BUCKET_NAME}"
@@ -103,170 +155,70 @@ class MediaStorage(S3Boto3Storage):
     def url(self, name, parameters=None, expire=None):
         """
         Override the URL method to ensure CloudFront domain is used if
-        available
-        Adds cache busting for profile images to prevent CloudFront
-        caching issues
+        available. Keys are content versioned, so the URL needs no cache
+        buster and is memoized per name.
         """
-        # Use CloudFront URL if available
-        if (
-            hasattr(settings, 'AWS_S3_CUSTOM_DOMAIN')
-            and settings.AWS_S3_CUSTOM_DOMAIN
-        ):
-            url = (
-                f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/"
-                f"{self.location}/{name}"
-            )
-
-            # Add cache-busting parameter for profile images to prevent
-            # CloudFront caching issues
-            if 'profile_images/' in name:
-                # Generate a more robust cache buster with timestamp and
-                # random string
-                timestamp = int(time.time())
-                random_str = ''.join(
-                    random.choices(
-                        string.ascii_letters + string.digits, k=8
-                    )
-                )
-                cache_buster = f"{timestamp}_{random_str}"
-
-                url = f"{url}?v={cache_buster}"
-                print(
-                    "DEBUG: Generated CloudFront URL with cache busting for "
-                    f"profile image: {url}"
-                )
-                logger.info(
-                    "Generated CloudFront URL with cache busting for "
-                    f"profile image: {url}"
-                )
-            else:
-                logger.info(f"Generated CloudFront URL: {url}")
-
-            return url
+        if self.custom_domain:
+            return cloudfront_url(self.custom_domain, self.location, name)
         # Fall back to S3 URL
         return super().url(name, parameters=parameters, expire=expire)
 
+    def save(self, name, content, max_length=None):
+        """
+        Save under a content-hash versioned name, e.g.
+        product_images/photo.3f2a9c1b0d4e.jpg
+
+        Image derivatives keep the names derivative_name() gives them, as
+        they are found by name; they are versioned through their source.
+        """
+        if (name and not VERSIONED_NAME_RE.search(name)
+                and not is_derivative_name(name)):
+            name = versioned_name(name, content_version(content))
+        return super().save(name, content, max_length=max_length)
+
+    def get_object_parameters(self, name):
+        """
+        Upload parameters for a key. Derivatives may be regenerated under
+        the same name, so they must not be cached as immutable.
+        """
+        params = super().get_object_parameters(name)
+        if is_derivative_name(name):
+            params['CacheControl'] = getattr(
+                settings, 'AWS_S3_DERIVATIVE_CACHE_CONTROL',
+                DEFAULT_DERIVATIVE_CACHE_CONTROL)
+        return params
+
     def _save(self, name, content):
         """
         Override _save to enhance error handling and logging when uploading
         to S3
-        """
-        log_s3_operation(f"Starting upload process for file: {name}")
 
+        Throttling and transient errors are retried by botocore's adaptive
+        retry mode, so nothing here sleeps; a save that still fails goes
+        to the fallback storage.
+        """
         try:
-            # Try to connect to S3 directly to test connection
-            s3 = boto3.client(
-                's3',
-                region_name=settings.AWS_S3_REGION_NAME.split('#')[0].strip(),
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+            result = super()._save(name, content)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            error_message = e.response['Error']['Message']
+            log_s3_operation(
+                f"Upload failed for {name}",
+                level='error',
+                error=f"AWS S3 error: {error_code} - {error_message}"
             )
-
-            # Test S3 connection by listing objects
-            try:
-                log_s3_operation(
-                    f"Testing S3 connection to bucket: "
-                    f"{settings.AWS_STORAGE_BUCKET_NAME}"
-                )
-                s3.list_objects_v2(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    MaxKeys=1
-                )
-                log_s3_operation("S3 connection test successful")
-            except Exception as e:
-                log_s3_operation(
-                    "S3 connection test failed",
-                    level='error',
-                    error=str(e)
-                )
-                return self._save_to_fallback(name, content)
-
-            # Try uploading to S3 with retries
-            retry_count = 0
-            while retry_count < self.max_retries:
-                try:
-                    log_s3_operation(
-                        f"Upload attempt {retry_count + 1} for {name}"
-                    )
-
-                    # Log S3 configuration for debugging
-                    log_s3_operation(
-                        "S3 Configuration: Bucket={}, Region={}".format(
-                            settings.AWS_STORAGE_BUCKET_NAME,
-                            settings.AWS_S3_REGION_NAME
-                        )
-                    )
-
-                    # First check content for debugging
-                    if hasattr(content, 'name'):
-                        content_size = getattr(
-                            content, 'size', 'unknown'
-                        )
-                        log_s3_operation(
-                            f"File info: name={content.name}, "
-                            f"size={content_size}"
-                        )
-
-                    # Log the S3 key that will be used
-                    s3_key = f"{self.location}/{name}"
-                    log_s3_operation(f"Full S3 key for upload: {s3_key}")
-
-                    # Perform the actual save operation
-                    result = super()._save(name, content)
-
-                    # Log success
-                    log_s3_operation(
-                        f"Successfully saved file to S3: {name}"
-                    )
-                    log_s3_operation(f"Upload result: {result}")
-
-                    # Return the result
-                    return result
-
-                except ClientError as e:
-                    # Log detailed S3 errors
-                    error_code = e.response['Error']['Code']
-                    error_message = e.response['Error']['Message']
-                    error_msg = (
-                        f"AWS S3 error: {error_code} - {error_message}"
-                    )
-                    log_s3_operation(
-                        f"Upload attempt {retry_count + 1} failed for "
-                        f"{name}",
-                        level='error',
-                        error=error_msg
-                    )
-
-                    retry_count += 1
-                    if retry_count < self.max_retries:
-                        # Wait before retrying (exponential backoff)
-                        time.sleep(2 ** retry_count)
-                    else:
-                        # All retries failed, try fallback storage
-                        log_s3_operation(
-                            f"S3 upload failed after "
-                            f"{self.max_retries} attempts for {name}",
-                            level='warning'
-                        )
-                        return self._save_to_fallback(name, content)
-
-                except Exception as e:
-                    # Log other unexpected errors
-                    log_s3_operation(
-                        f"Unexpected error saving file {name} to S3",
-                        level='error',
-                        error=str(e)
-                    )
-                    return self._save_to_fallback(name, content)
-
-        except Exception as outer_e:
+            return self._save_to_fallback(name, content)
+        except Exception as e:
             log_s3_operation(
-                f"Error in S3 upload wrapper for {name}",
+                f"Unexpected error saving file {name} to S3",
                 level='error',
-                error=str(outer_e)
+                error=str(e)
             )
             return self._save_to_fallback(name, content)
 
+        logger.debug(f"Saved {self.location}/{result} to S3")
+        return result
+
     def _save_to_fallback(self, name, content):
         """
         Save file to local storage as fallback when S3 fails
@@ -366,6 +318,8 @@ class StaticStorage(S3Boto3Storage):
         self.region_name = region
         self.signature_version = settings.AWS_S3_SIGNATURE_VERSION
 
+        kwargs.setdefault('client_config', get_s3_client_config())
+
         super().__init__(*args, **kwargs)
         self.fallback_storage = FileSystemStorage(
             location=settings.STATIC_ROOT
@@ -377,119 +331,34 @@ class StaticStorage(S3Boto3Storage):
         available
         """
         # Use CloudFront URL if available
-        if (
-            hasattr(settings, 'AWS_S3_CUSTOM_DOMAIN')
-            and settings.AWS_S3_CUSTOM_DOMAIN
-        ):
-            url = (
-                f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/"
-                f"{self.location}/{name}"
-            )
-            logger.info(f"Generated CloudFront static URL: {url}")
-            return url
+        custom_domain = getattr(settings, 'AWS_S3_CUSTOM_DOMAIN', None)
+        if custom_domain:
+            return cloudfront_url(custom_domain, self.location, name)
         # Fall back to S3 URL
         return super().url(name, parameters=parameters, expire=expire)
 
     def _save(self, name, content):
         """
         Override _save to ensure S3 upload failures raise errors and do not
-        fallback to local storage.
+        fallback to local storage. Retries happen inside botocore.
         """
-        logger.info(f"Attempting to save static file to S3: {name}")
-
         try:
-            s3 = boto3.client(
-                's3',
-                region_name=settings.AWS_S3_REGION_NAME.split('#')[0].strip(),
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+            super()._save(name, content)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            error_message = e.response['Error']['Message']
+            logger.error(
+                f"AWS S3 error saving static file {name}: "
+                f"{error_code} - {error_message}"
+            )
+            raise
+        except Exception as e:
+            logger.error(
+                f"Unexpected error saving static file to S3: {name} - "
+                f"Error: {str(e)}"
             )
-            try:
-                print(
-                    f"DEBUG: Testing S3 connection to bucket: "
-                    f"{settings.AWS_STORAGE_BUCKET_NAME}"
-                )
-                s3.list_objects_v2(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    MaxKeys=1
-                )
-                logger.info("S3 connection test successful for static files")
-            except Exception as e:
-                logger.error(
-                    "S3 connection test failed for static files: %s", str(e)
-                )
-                raise  # Raise the error instead of falling back
-
-            retry_count = 0
-            while retry_count < self.max_retries:
-                try:
-                    print(
-                        f"DEBUG: S3 upload attempt {retry_count + 1} for "
-                        f"{name}"
-                    )
-                    logger.info(
-                        f"S3 upload attempt {retry_count + 1} for {name}"
-                    )
-                    print(
-                        "DEBUG: S3 configuration - Bucket: {}, Region: {}, "
-                        "Location: {}".format(
-                            settings.AWS_STORAGE_BUCKET_NAME,
-                            settings.AWS_S3_REGION_NAME,
-                            self.location
-                        )
-                    )
-                    logger.info(
-                        "S3 Static Configuration: Bucket=%s, Region=%s, "
-                        "Location=%s",
-                        settings.AWS_STORAGE_BUCKET_NAME,
-                        settings.AWS_S3_REGION_NAME,
-                        self.location
-                    )
-                    print(f"DEBUG: Calling super()._save for {name}")
-                    # Call the actual S3Boto3Storage._save method
-                    super()._save(name, content)
-                    print(f"DEBUG: Successfully uploaded {name} to S3")
-                    logger.info(
-                        f"Successfully saved static file to S3: {name}")
-                    # Critical fix: Return the name, which is what Django
-                    # expects
-                    # The parent method returns name, so we must do the same
-                    return name
-                except ClientError as e:
-                    # Log detailed S3 errors
-                    error_code = e.response['Error']['Code']
-                    error_message = e.response['Error']['Message']
-                    logger.error(
-                        (
-                            f"AWS S3 error saving static file {name}: "
-                            f"{error_code} - {error_message}"
-                        )
-                    )
-                    retry_count += 1
-                    if retry_count < self.max_retries:
-                        # Wait before retrying (exponential backoff)
-                        time.sleep(2 ** retry_count)
-                    else:
-                        print(
-                            f"DEBUG: S3 upload failed after "
-                            f"{self.max_retries} attempts, raising error"
-                        )
-                        logger.error(
-                            f"S3 static upload failed after "
-                            f"{self.max_retries} attempts for {name}"
-                        )
-                        raise  # Raise the last S3 error
-                except Exception as e:
-                    # Log other unexpected errors
-                    logger.error(
-                        f"Unexpected error saving static file to S3: {name} - "
-                        f"Error: {str(e)}"
-                    )
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-                    raise  # Raise the error instead of falling back
-
-        except Exception as outer_e:
-            print(f"DEBUG: Error in S3 upload wrapper: {str(outer_e)}")
-            logger.error(f"Error in S3 static upload wrapper: {str(outer_e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            raise  # Raise the error instead of falling back
+            raise
+        logger.info(f"Successfully saved static file to S3: {name}")
+        # Return the name, which is what Django expects
+        return name
@@ -0,0 +1,72 @@
+"""
+Django management command to generate responsive image derivatives for
+existing media.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from skunkmonkey.utils.image_derivatives import (
+    needs_derivatives, update_derivatives,
+)
+
+# Name accepted by --only: (model label, image field)
+IMAGE_FIELDS = {
+    'products': ('products.Product', 'image'),
+    'categories': ('products.Category', 'image'),
+    'profiles': ('users.UserProfile', 'profile_image'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the resized WebP/AVIF copies of product, category and '
+        'profile images that do not have current ones yet'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=sorted(IMAGE_FIELDS),
+            action='append',
+            help='Limit to these images (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives that are already up to date',
+        )
+
+    def handle(self, *args, **options):
+        total_updated = total_failed = 0
+        for name in options['only'] or sorted(IMAGE_FIELDS):
+            label, field_name = IMAGE_FIELDS[name]
+            model = apps.get_model(label)
+            instances = (
+                model.objects.exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{field_name: ''})
+                .order_by('pk')
+                .iterator(chunk_size=200)
+            )
+
+            updated = failed = 0
+            for instance in instances:
+                if not (options['force']
+                        or needs_derivatives(instance, field_name)):
+                    continue
+                try:
+                    update_derivatives(
+                        instance, field_name, force=options['force'])
+                    updated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{label} {instance.pk}: {e}')
+
+            self.stdout.write(
+                f'{name}: {updated} updated, {failed} failed')
+            total_updated += updated
+            total_failed += failed
+
+        style = self.style.WARNING if total_failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Generated derivatives for {total_updated} images '
+            f'({total_failed} failed)'))
@@ -375,6 +375,33 @@ SITE_URL = env('SITE_URL', default='http://hedgemonkey.ddns.net:8000')
 SITE_NAME = env('SITE_NAME', default='SkunkMonkey')
 CONTACT_EMAIL = env('CONTACT_EMAIL', default=DEFAULT_FROM_EMAIL)
 
+# Cache shared by every process, e.g. redis://host:6379/0, or
+# dbcache://skunkmonkey_cache after running createcachetable. Without
+# CACHE_URL each process keeps a private memory cache, and an invalidation
+# made in one process (web worker, webhook worker, job runner) never
+# reaches the others.
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+# Seconds to keep the category tree snapshot (0 = load it on every use).
+# Without a shared cache this is how long other processes may serve a
+# stale tree after a category changes.
+CATEGORY_TREE_CACHE_TIMEOUT = env.int(
+    'CATEGORY_TREE_CACHE_TIMEOUT', default=60 * 60 if SHARED_CACHE else 60)
+
+# Seconds a process keeps the Stripe keys it read from the database. Without
+# a shared cache this is how long other processes use a rotated key.
+STRIPE_KEYS_CACHE_TIMEOUT = env.int(
+    'STRIPE_KEYS_CACHE_TIMEOUT', default=60 * 60 if SHARED_CACHE else 5 * 60)
+
+# Seconds to cache per-user wishlist/comparison/cart/notification state
+# between requests (0 = compute once per request only). Only enable with a
+# shared cache backend so write invalidation reaches every worker.
+SHOPPER_STATE_CACHE_TIMEOUT = env.int(
+    'SHOPPER_STATE_CACHE_TIMEOUT', default=0)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -6,9 +6,12 @@ by providing shortcuts for frequently used asset combinations.
 import logging
 
 from django import template
+from django.conf import settings
 from django.utils.safestring import mark_safe
 
-from skunkmonkey.templatetags.direct_assets import direct_asset
+from skunkmonkey.templatetags.direct_assets import (
+    ASSET_GROUPS, direct_asset, get_asset_index,
+)
 
 logger = logging.getLogger(__name__)
 register = template.Library()
@@ -49,24 +52,34 @@ ASSET_MAPPINGS = {
 }
 
 
+# Rendered with the compiled manifest (see direct_assets.AssetIndex)
+ASSET_GROUPS.update(ASSET_MAPPINGS)
+
+
 @register.simple_tag
 def asset_group(group_name):
     """
     Load a predefined group of assets based on the group name.
 
+    The group's HTML is rendered once per compiled manifest; with the Vite
+    dev server in use, each asset is loaded from it instead.
+
     Args:
         group_name: The name of the asset group to load
 
     Returns:
         HTML for all assets in the group
     """
-    if group_name not in ASSET_MAPPINGS:
-        logger.warning(f"Asset group '{group_name}' not defined in mappings")
-        return mark_safe(f"<!-- Asset group '{group_name}' not found -->")
+    debug_mode = getattr(settings, 'DEBUG', False)
+    use_dev_server = getattr(settings, 'USE_VITE_DEV_SERVER', False)
 
-    html_parts = []
-    for asset_name in ASSET_MAPPINGS[group_name]:
-        asset_html = direct_asset(asset_name)
-        html_parts.append(asset_html)
+    if debug_mode and use_dev_server:
+        if group_name not in ASSET_MAPPINGS:
+            logger.warning(
+                f"Asset group '{group_name}' not defined in mappings")
+            return mark_safe(f"<!-- Asset group '{group_name}' not found -->")
+        return mark_safe('\n'.join(
+            direct_asset(asset_name)
+            for asset_name in ASSET_MAPPINGS[group_name]))
 
-    return mark_safe('\n'.join(html_parts))
+    return get_asset_index().group(group_name)
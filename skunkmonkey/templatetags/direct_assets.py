@@ -2,13 +2,13 @@
 Template tag for loading static assets in Django templates.
 Uses manifest.json from Vite to find and include JS and CSS assets.
 
-This is a simplified version that only searches for assets by
-their name attribute in the manifest.json file, with no fallback
-mechanisms or special cases.
+The manifest is compiled once into an AssetIndex that maps asset names
+and their aliases to rendered HTML, so each tag call is a dict lookup.
 """
 import json
 import logging
 import os
+import threading
 import time
 from pathlib import Path
 
@@ -19,10 +19,22 @@ from django.utils.safestring import mark_safe
 logger = logging.getLogger(__name__)
 register = template.Library()
 
-# Cache manifest data for 5 minutes in production, 10 seconds in development
+# How often a missing manifest (or, with DEBUG, a changed one) is looked
+# for again: 5 minutes in production, 10 seconds in development. A found
+# manifest is compiled once per process in production; deploys restart
+# the processes after the post-build step writes a new one.
 MANIFEST_CACHE_TIME = 300 if not getattr(settings, 'DEBUG', False) else 10
 _last_manifest_load = 0
-_cached_manifest = None
+_asset_index = None
+_asset_index_lock = threading.Lock()
+
+# Asset groups, name -> member asset names; filled in by asset_groups
+ASSET_GROUPS = {}
+
+# Directories tried for a name that matches no manifest entry name
+MODULE_PATTERNS = [
+    'js/', 'css/', 'staff/', 'users/', 'shop/', 'products/', 'core/'
+]
 
 
 @register.simple_tag
@@ -44,51 +56,40 @@ def direct_asset(name):
     debug_mode = getattr(settings, 'DEBUG', False)
     use_dev_server = getattr(settings, 'USE_VITE_DEV_SERVER', False)
 
-    # Normalize the asset name by stripping file extensions if present
-    if name.endswith('.js') or name.endswith('.css'):
-        name = name.rsplit('.', 1)[0]
-
     if debug_mode and use_dev_server:
         # In development with dev server, use that instead of manifest
         dev_server = getattr(
             settings, 'VITE_DEV_SERVER', 'http://localhost:5173'
         )
-        return _render_dev_asset(name, dev_server)
-
-    # Try to determine the module from the asset name if it includes a path
-    module = None
-    if '/' in name:
-        parts = name.split('/')
-        if len(parts) >= 2:
-            module, name = parts[0], parts[-1]
+        return _render_dev_asset(_strip_extension(name), dev_server)
 
     # Production mode - use compiled static files via manifest.json
-    result = _render_prod_asset(name)
-
-    # If nothing was found and we have a module prefix, try with
-    # just the base name
-    if '<!-- Asset' in result and module:
-        result = _render_prod_asset(name)
-
-    # Additional fallbacks for known naming pattern variations
-    if '<!-- Asset' in result:
-        # Try with camelCase
-        if '-' in name:
-            camel_name = ''.join(
-                x.capitalize() if i > 0 else x
-                for i, x in enumerate(name.split('-'))
-            )
-            result = _render_prod_asset(camel_name)
+    return get_asset_index().html(name)
+
+
+def _strip_extension(name):
+    """Normalize the asset name by stripping file extensions if present"""
+    if name.endswith('.js') or name.endswith('.css'):
+        name = name.rsplit('.', 1)[0]
+    return name
+
+
+def _normalize(name):
+    return name.replace('-', '').replace('_', '').lower()
+
+
+def _camel_case(name):
+    return ''.join(
+        x.capitalize() if i > 0 else x
+        for i, x in enumerate(name.split('-'))
+    )
 
-        # Try with kebab-case
-        elif any(c.isupper() for c in name):
-            kebab_name = ''.join(
-                '-' + c.lower() if c.isupper() else c
-                for c in name
-            ).lstrip('-')
-            result = _render_prod_asset(kebab_name)
 
-    return result
+def _kebab_case(name):
+    return ''.join(
+        '-' + c.lower() if c.isupper() else c
+        for c in name
+    ).lstrip('-')
 
 
 def _render_dev_asset(name, dev_server):
@@ -110,84 +111,213 @@ def _render_dev_asset(name, dev_server):
     return mark_safe(html)
 
 
-def _render_prod_asset(name):
+class AssetIndex:
     """
-    Render asset tags using compiled files via manifest.json.
+    manifest.json compiled into rendered HTML per asset name.
+
+    Entry names are indexed by exact and normalized name when the
+    manifest is loaded, and the HTML for every entry name, its camelCase
+    and kebab-case aliases and every asset group is rendered up front.
+    Any other name is resolved once and remembered, so each tag call is
+    a dict lookup.
+    """
+
+    def __init__(self, manifest, static_url, path=None, mtime=None):
+        self.manifest = manifest
+        self.static_url = static_url
+        self.path = path
+        self.mtime = mtime
+        self.checked = time.time()
+        self._by_name = {}
+        self._by_normalized = {}
+        self._html = {}
+        self._groups = {}
+
+        if not manifest:
+            return
+        for entry in manifest.values():
+            if isinstance(entry, dict) and 'name' in entry:
+                self._by_name.setdefault(entry['name'], entry)
+                self._by_normalized.setdefault(
+                    _normalize(entry['name']), entry)
+
+        for entry_name in list(self._by_name):
+            self.html(entry_name)
+            self.html(_camel_case(entry_name))
+            self.html(_kebab_case(entry_name))
+        for group_name in list(ASSET_GROUPS):
+            self.group(group_name)
+
+    def html(self, name):
+        """The rendered tags for an asset name"""
+        html = self._html.get(name)
+        if html is None:
+            # Concurrent misses render the same HTML twice at worst
+            html = self._html[name] = self._render(name)
+        return html
+
+    def group(self, group_name):
+        """The rendered tags for every asset in a group"""
+        html = self._groups.get(group_name)
+        if html is None:
+            if group_name not in ASSET_GROUPS:
+                logger.warning(
+                    f"Asset group '{group_name}' not defined in mappings")
+                return mark_safe(
+                    f"<!-- Asset group '{group_name}' not found -->")
+            html = self._groups[group_name] = mark_safe('\n'.join(
+                self.html(asset_name)
+                for asset_name in ASSET_GROUPS[group_name]
+            ))
+        return html
+
+    def _render(self, name):
+        name = _strip_extension(name)
+        # Module prefixes such as 'users/profile' are looked up by the
+        # base name
+        if '/' in name:
+            name = name.split('/')[-1]
+
+        if not self.manifest:
+            # If manifest couldn't be loaded, log an error and return empty
+            logger.error(f"No manifest data found for asset '{name}'")
+            return mark_safe(
+                f"<!-- Asset '{name}' not found: manifest.json missing -->")
+
+        asset_entry = self.find(name)
+        # Additional fallbacks for known naming pattern variations
+        if asset_entry is None:
+            if '-' in name:
+                name = _camel_case(name)
+                asset_entry = self.find(name)
+            elif any(c.isupper() for c in name):
+                name = _kebab_case(name)
+                asset_entry = self.find(name)
+
+        if asset_entry is None:
+            # Log that the asset wasn't found
+            logger.error(f"Asset '{name}' not found in manifest.json")
+            return mark_safe(
+                f"<!-- Asset '{name}' not found in manifest.json -->")
+
+        # Generate HTML for the found asset
+        return _generate_asset_html(asset_entry, self.static_url)
+
+    def find(self, name):
+        """
+        Find an asset entry in the manifest using multiple strategies.
+        First tries by exact 'name' attribute match, then by normalized
+        name, then by key pattern matching, and finally by path pattern
+        matching for better flexibility.
+
+        Args:
+            name: The name of the asset to find
+
+        Returns:
+            dict: The asset entry or None if not found
+        """
+        # 1. Entry with exact matching name attribute
+        entry = self._by_name.get(name)
+        if entry is None:
+            # 2. Normalized name matching
+            entry = self._by_normalized.get(_normalize(name))
+        if entry is None:
+            entry = _scan_manifest(self.manifest, name)
+        return entry
+
+    def is_stale(self, static_url):
+        """Whether the manifest or settings may have changed"""
+        if static_url != self.static_url:
+            return True
+        if self.manifest and not getattr(settings, 'DEBUG', False):
+            return False
+        if time.time() - self.checked < MANIFEST_CACHE_TIME:
+            return False
+        self.checked = time.time()
+        if not self.manifest:
+            return True
+        try:
+            return self.path.stat().st_mtime != self.mtime
+        except OSError:
+            return True
 
-    Args:
-        name: The asset name to find in the manifest
+
+def get_asset_index():
+    """
+    The compiled manifest for this process, built on first use
 
     Returns:
-        HTML tags for the CSS and JS files or empty string if not found
+        AssetIndex
     """
-    # Get the base URL for static assets
+    global _asset_index
     static_url = getattr(settings, 'STATIC_URL', '/static/')
+    index = _asset_index
+    if index is not None and not index.is_stale(static_url):
+        return index
 
-    # Load the manifest from static directory
-    manifest_data = _load_manifest()
+    with _asset_index_lock:
+        if _asset_index is index:
+            manifest, path, mtime = _read_manifest()
+            _asset_index = AssetIndex(manifest, static_url, path, mtime)
+        return _asset_index
 
-    if not manifest_data:
-        # If manifest couldn't be loaded, log an error and return empty
-        logger.error(f"No manifest data found for asset '{name}'")
-        return mark_safe(
-            f"<!-- Asset '{name}' not found: manifest.json missing -->")
 
-    # Find the asset by name in the manifest
-    asset_entry = _find_asset_by_name(manifest_data, name)
+def reset_asset_index():
+    """Forget the compiled manifest, e.g. after a build in development"""
+    global _asset_index
+    with _asset_index_lock:
+        _asset_index = None
 
-    if not asset_entry:
-        # Log that the asset wasn't found
-        logger.error(f"Asset '{name}' not found in manifest.json")
-        return mark_safe(f"<!-- Asset '{name}' not found in manifest.json -->")
 
-    # Generate HTML for the found asset
-    return _generate_asset_html(asset_entry, static_url)
+def _manifest_paths():
+    return [
+        Path(settings.BASE_DIR) / 'static' / 'manifest.json',
+        Path(settings.BASE_DIR) / 'staticfiles' / 'manifest.json',
+        Path(settings.BASE_DIR) / 'static' / '.vite' / 'manifest.json'
+    ]
 
 
-def _load_manifest():
+def _read_manifest():
     """
-    Load the manifest.json file from static or staticfiles directory.
-    Uses caching to avoid reloading the file on every request.
+    Read the manifest.json file from static or staticfiles directory.
 
     Returns:
-        dict: The manifest data or None if not found/invalid
+        tuple: (manifest data or None if not found/invalid, path, mtime)
     """
-    global _last_manifest_load, _cached_manifest
-
-    # Return cached manifest if it's still valid
-    now = time.time()
-    if _cached_manifest and now - _last_manifest_load < MANIFEST_CACHE_TIME:
-        return _cached_manifest
-
-    # Define potential manifest locations to check
-    manifest_paths = [
-        Path(settings.BASE_DIR) / 'static' / 'manifest.json',
-        Path(settings.BASE_DIR) / 'staticfiles' / 'manifest.json',
-        Path(settings.BASE_DIR) / 'static' / '.vite' / 'manifest.json'
-    ]
+    global _last_manifest_load
 
     # Try each path
-    for path in manifest_paths:
+    for path in _manifest_paths():
         try:
             if path.exists():
+                mtime = path.stat().st_mtime
                 with open(path, 'r') as file:
-                    _cached_manifest = json.load(file)
-                    _last_manifest_load = now
-                    logger.debug(f"Loaded manifest from {path}")
-                    return _cached_manifest
+                    manifest = json.load(file)
+                _last_manifest_load = time.time()
+                logger.debug(f"Loaded manifest from {path}")
+                return manifest, path, mtime
         except (IOError, json.JSONDecodeError) as e:
             logger.warning(f"Failed to load manifest from {path}: {e}")
             continue
 
     logger.warning("No valid manifest.json found")
-    return None
+    return None, None, None
+
+
+def _load_manifest():
+    """
+    The loaded manifest.json data.
+
+    Returns:
+        dict: The manifest data or None if not found/invalid
+    """
+    return get_asset_index().manifest
 
 
-def _find_asset_by_name(manifest, name):
+def _scan_manifest(manifest, name):
     """
-    Find an asset entry in the manifest using multiple strategies.
-    First tries by exact 'name' attribute match, then by key pattern matching,
-    and finally by path pattern matching for better flexibility.
+    Find an asset whose file or src path contains the name. Used for names
+    that match no entry name.
 
     Args:
         manifest: The loaded manifest.json data
@@ -196,26 +326,6 @@ def _find_asset_by_name(manifest, name):
     Returns:
         dict: The asset entry or None if not found
     """
-    # 1. Search for entry with exact matching name attribute
-    for key, entry in manifest.items():
-        if isinstance(entry, dict) and entry.get('name') == name:
-            logger.debug(f"Found asset '{name}' by exact name attribute")
-            return entry
-
-    # 2. Try normalized name matching with common prefixes
-    normalized_name = name.replace('-', '').replace('_', '').lower()
-
-    for entry in manifest.values():
-        if isinstance(entry, dict) and 'name' in entry:
-            entry_name = (
-                entry['name'].replace('-', '').replace('_', '').lower()
-            )
-            if entry_name == normalized_name:
-                logger.debug(
-                    f"Found asset '{name}' by normalized name {entry_name}"
-                )
-                return entry
-
     # 3. Try to match based on file path segments or src attribute
     # This helps with finding files in subdirectories
     for key, entry in manifest.items():
@@ -233,10 +343,7 @@ def _find_asset_by_name(manifest, name):
             return entry
 
     # 4. Try common module directory patterns if name might be a module path
-    module_patterns = [
-        'js/', 'css/', 'staff/', 'users/', 'shop/', 'products/', 'core/'
-    ]
-    for pattern in module_patterns:
+    for pattern in MODULE_PATTERNS:
         module_key = f"{pattern}{name}"
         for key, entry in manifest.items():
             if (
@@ -439,14 +546,8 @@ def debug_manifest():
             "<p>❌ <strong>Manifest not found or invalid</strong></p>")
 
         # Check potential manifest paths
-        manifest_paths = [
-            Path(settings.BASE_DIR) / 'static' / 'manifest.json',
-            Path(settings.BASE_DIR) / 'staticfiles' / 'manifest.json',
-            Path(settings.BASE_DIR) / 'static' / '.vite' / 'manifest.json'
-        ]
-
         output.append("<p>Searched in:</p><ul>")
-        for path in manifest_paths:
+        for path in _manifest_paths():
             status = "✅ Exists" if path.exists() else "❌ Not found"
             output.append(f"<li>{path}: {status}</li>")
         output.append("</ul>")
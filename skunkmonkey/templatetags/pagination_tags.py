@@ -0,0 +1,23 @@
+"""
+Template tags for keyset (cursor) pagination links.
+"""
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor=None):
+    """
+    Build a query string for another page, keeping the current filters
+
+    Usage: <a href="{% cursor_url page_obj.next_cursor %}">Next</a>
+    Passing no cursor links to the first page.
+    """
+    params = context['request'].GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
+    if cursor:
+        params['cursor'] = cursor
+    query = params.urlencode()
+    return f'?{query}' if query else '?'
@@ -0,0 +1,91 @@
+"""
+Template tags for serving image derivatives with srcset.
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from skunkmonkey.utils.image_derivatives import derivative_name
+
+register = template.Library()
+
+
+def _current_state(image, state):
+    """The derivative state if it was made from this image, else None"""
+    if image and state and state.get('source') == image.name:
+        return state
+    return None
+
+
+def _srcset(image, state, image_format):
+    storage = image.storage
+    return ', '.join(
+        f'{storage.url(derivative_name(image.name, width, image_format))} '
+        f'{width}w'
+        for width in state['widths']
+    )
+
+
+@register.simple_tag
+def responsive_image(image, state, sizes='100vw', **attrs):
+    """
+    Render an image as a <picture> with a srcset per derivative format
+
+    The original is kept as the <img> fallback. Images without current
+    derivatives render as a plain <img>. Extra keyword arguments become
+    attributes of the <img>.
+
+    Usage (on one line):
+        {% responsive_image product.image product.image_derivatives
+           sizes="(min-width: 992px) 25vw, 50vw" alt=product.name
+           class="card-img-top" %}
+    """
+    if not image:
+        return ''
+
+    attrs.setdefault('loading', 'lazy')
+    state = _current_state(image, state)
+    if state:
+        attrs.setdefault('width', state['width'])
+        attrs.setdefault('height', state['height'])
+
+    img = format_html(
+        '<img src="{}"{}>',
+        image.url,
+        format_html_join(
+            '', ' {}="{}"', sorted(attrs.items(), key=lambda a: a[0])),
+    )
+    if not state:
+        return img
+
+    sources = format_html_join(
+        '',
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        (
+            (image_format, _srcset(image, state, image_format), sizes)
+            for image_format in state['formats']
+        ),
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
+
+
+@register.simple_tag
+def image_variant_url(image, state, width):
+    """
+    URL of the smallest derivative at least ``width`` pixels wide, in the
+    most preferred format, falling back to the original
+
+    Usage (on one line):
+        data-image="{% image_variant_url product.image
+                       product.image_derivatives 640 %}"
+    """
+    if not image:
+        return ''
+    state = _current_state(image, state)
+    if not state or not state['formats']:
+        return image.url
+
+    chosen = next((w for w in state['widths'] if w >= int(width)), None)
+    if chosen is None:
+        return image.url
+    return image.storage.url(
+        derivative_name(image.name, chosen, state['formats'][0]))
@@ -0,0 +1,79 @@
+"""
+Binary image upload endpoint for the cropper widgets.
+"""
+import logging
+
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+
+from .utils.image_uploads import (
+    UPLOAD_FOLDERS, ImageUploadError, make_upload_token, spool_stream,
+    store_image,
+)
+
+logger = logging.getLogger('django')
+
+# Uploads any signed-in user may make; the rest are for staff
+USER_UPLOADS = {'profile'}
+
+
+def _read_upload(request):
+    """The posted image as a file object, read in chunks"""
+    upload = request.FILES.get('image')
+    if upload is not None:
+        # Django's upload handlers have already streamed it to memory
+        # or a temporary file; copy it on in chunks like a raw body
+        return spool_stream(upload.read)
+    if request.content_type.startswith('image/'):
+        return spool_stream(request.read)
+    raise ImageUploadError(
+        'Send the image as the request body or as an "image" file.')
+
+
+@require_POST
+def upload_image(request, purpose):
+    """
+    Store a cropped image sent as binary and return a token for the form
+
+    Accepts a raw ``image/*`` request body or a multipart ``image`` file.
+    The response's ``token`` goes in the form's ``cropped_image_token``
+    field.
+
+    Args:
+        request: The HTTP request
+        purpose: Key of UPLOAD_FOLDERS, e.g. "product" or "profile"
+
+    Returns:
+        JsonResponse with token and url (201), or an error
+    """
+    if purpose not in UPLOAD_FOLDERS:
+        raise Http404('Unknown upload type')
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'success': False, 'error': 'Please sign in to upload images.'},
+            status=401)
+    if purpose not in USER_UPLOADS and not request.user.is_staff:
+        return JsonResponse(
+            {'success': False, 'error': 'Staff access required.'},
+            status=403)
+
+    try:
+        source = _read_upload(request)
+        try:
+            name = store_image(
+                source,
+                UPLOAD_FOLDERS[purpose],
+                f'{purpose}_{request.user.pk}',
+            )
+        finally:
+            source.close()
+    except ImageUploadError as e:
+        logger.warning(f"Rejected {purpose} image upload: {e}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'token': make_upload_token(name, purpose, request.user),
+        'url': default_storage.url(name),
+    }, status=201)
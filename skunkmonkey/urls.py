@@ -28,6 +28,7 @@ from users import views as user_views
 
 from .asset_debug import check_asset_health, static_directory_info
 from .sitemaps import CategorySitemap, ProductSitemap, StaticViewSitemap
+from .upload_views import upload_image
 
 # Define the sitemaps dictionary
 sitemaps = {
@@ -57,6 +58,9 @@ urlpatterns = [
     path('stripe/webhook/', webhook, name='stripe_webhook'),  # Add webhook URL
     path('stripe/', include('djstripe.urls', namespace='djstripe')),
 
+    # Binary uploads from the image cropper widgets
+    path('uploads/image/<slug:purpose>/', upload_image, name='upload_image'),
+
     # Sitemap
     path('sitemap.xml', sitemap, {'sitemaps': sitemaps},
          name='django.contrib.sitemaps.views.sitemap'),
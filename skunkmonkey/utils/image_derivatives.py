@@ -0,0 +1,262 @@
+"""
+Responsive image derivatives for uploaded images.
+
+Each uploaded product, category or profile image is resized to a fixed
+set of widths and re-encoded to modern formats (WebP, and AVIF when the
+installed Pillow has an AVIF encoder). Derivatives are stored next to the
+original under deterministic keys::
+
+    product_images/abc123.jpg -> product_images/abc123.640w.webp
+
+The model records which source its derivatives were made from in a
+``<field>_derivatives`` JSONField, so templates can emit ``srcset``
+without touching storage, and a replaced image is detected by comparing
+names. Derivatives are generated by the ``image_derivatives`` staff job,
+queued when a model is saved with a new image, and by the
+``generate_image_derivatives`` command for existing media.
+"""
+import io
+import logging
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('django')
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+# Most preferred first; <source> elements are emitted in this order
+DEFAULT_FORMATS = ('avif', 'webp')
+DEFAULT_QUALITY = {'avif': 60, 'webp': 80}
+
+# Matches the names made by derivative_name()
+DERIVATIVE_NAME_RE = re.compile(r'\.\d+w\.[a-z0-9]+$')
+
+
+def state_field_name(field_name):
+    """Name of the JSONField holding the derivative state of an image"""
+    return f'{field_name}_derivatives'
+
+
+@lru_cache(maxsize=None)
+def _has_encoder(image_format):
+    Image.init()
+    return image_format.upper() in Image.SAVE
+
+
+def derivative_formats():
+    """Configured derivative formats that Pillow can encode here"""
+    return [
+        image_format
+        for image_format in getattr(
+            settings, 'IMAGE_DERIVATIVE_FORMATS', DEFAULT_FORMATS)
+        if _has_encoder(image_format)
+    ]
+
+
+def derivative_name(source, width, image_format):
+    """
+    Storage name of one derivative of an image
+
+    Args:
+        source: Storage name of the original image
+        width: Derivative width in pixels
+        image_format: Derivative format, e.g. "webp"
+
+    Returns:
+        str
+    """
+    root, _ = os.path.splitext(source)
+    return f'{root}.{width}w.{image_format}'
+
+
+def is_derivative_name(name):
+    """Whether a storage name is one made by derivative_name()"""
+    return bool(DERIVATIVE_NAME_RE.search(name))
+
+
+def derivative_names(state):
+    """Storage names of every derivative recorded in a state dict"""
+    if not state or not state.get('source'):
+        return []
+    return [
+        derivative_name(state['source'], width, image_format)
+        for image_format in state.get('formats', [])
+        for width in state.get('widths', [])
+    ]
+
+
+def needs_derivatives(instance, field_name):
+    """
+    Whether an image's recorded derivatives are missing or out of date
+
+    Args:
+        instance: Model instance with the image field
+        field_name: Name of the ImageField
+
+    Returns:
+        bool
+    """
+    field_file = getattr(instance, field_name)
+    state = getattr(instance, state_field_name(field_name)) or {}
+    if not field_file:
+        return bool(state)
+    return state.get('source') != field_file.name
+
+
+def _target_widths(original_width):
+    widths = [
+        width
+        for width in sorted(set(getattr(
+            settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS)))
+        if width < original_width
+    ]
+    # Small originals still get one full size copy in modern formats
+    return widths or [original_width]
+
+
+def _save_derivative(storage, name, image, image_format):
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', DEFAULT_QUALITY)
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=image_format.upper(),
+        quality=quality.get(image_format, 80),
+    )
+    # Deterministic keys: replace rather than let storage rename
+    if storage.exists(name):
+        storage.delete(name)
+    saved = storage.save(name, ContentFile(buffer.getvalue()))
+    if saved != name:
+        logger.warning(f"Derivative {name} was stored as {saved}")
+
+
+def delete_derivatives(storage, state):
+    """Delete the derivative files recorded in a state dict"""
+    for name in derivative_names(state):
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error(f"Error deleting image derivative {name}: {e}")
+
+
+def generate_derivatives(field_file):
+    """
+    Resize and re-encode an image into every derivative width and format
+
+    Widths are produced from largest to smallest, each resized from the
+    one before, so only the first resize works on the full original.
+
+    Args:
+        field_file: The ImageField's FieldFile
+
+    Returns:
+        dict: Derivative state to store on the model
+    """
+    storage = field_file.storage
+    formats = derivative_formats()
+
+    with storage.open(field_file.name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA')
+            or 'transparency' in image.info
+        )
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    original_width, original_height = image.size
+    widths = _target_widths(original_width)
+    resized = image
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(original_height * width / original_width))
+        if resized.width != width:
+            resized = resized.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            _save_derivative(
+                storage,
+                derivative_name(field_file.name, width, image_format),
+                resized,
+                image_format,
+            )
+
+    return {
+        'source': field_file.name,
+        'width': original_width,
+        'height': original_height,
+        'widths': widths,
+        'formats': formats,
+    }
+
+
+def update_derivatives(instance, field_name, force=False):
+    """
+    Bring the derivatives of a model's image up to date and record them
+
+    Derivatives of a replaced or cleared image are deleted. The state is
+    saved with ``update_fields``, so post_save handlers (card caches and
+    the like) see the change without the image being processed again.
+
+    Args:
+        instance: Model instance with the image field
+        field_name: Name of the ImageField
+        force: Regenerate even if the recorded derivatives are current
+
+    Returns:
+        bool: True if anything was generated or removed
+    """
+    state_field = state_field_name(field_name)
+    if not force and not needs_derivatives(instance, field_name):
+        return False
+
+    field_file = getattr(instance, field_name)
+    old_state = getattr(instance, state_field) or {}
+    state = generate_derivatives(field_file) if field_file else {}
+
+    if old_state.get('source') and old_state['source'] != state.get('source'):
+        delete_derivatives(field_file.storage, old_state)
+
+    setattr(instance, state_field, state)
+    instance.save(update_fields=[state_field])
+    logger.info(
+        f"Updated image derivatives of {instance._meta.label} "
+        f"{instance.pk}: {len(derivative_names(state))} files")
+    return True
+
+
+def queue_derivatives(instance, field_name):
+    """
+    Queue an image_derivatives job for a saved instance if its image
+    changed; call from post_save
+
+    Args:
+        instance: Saved model instance with the image field
+        field_name: Name of the ImageField
+    """
+    if not needs_derivatives(instance, field_name):
+        return
+
+    payload = {
+        'model': instance._meta.label_lower,
+        'pk': instance.pk,
+        'field': field_name,
+    }
+
+    def enqueue_job():
+        from staff.jobs import enqueue
+        enqueue(
+            'image_derivatives',
+            payload=payload,
+            description=(
+                f'Image sizes for {instance._meta.verbose_name} '
+                f'{instance.pk}'
+            ),
+            notify=False,
+        )
+
+    transaction.on_commit(enqueue_job)
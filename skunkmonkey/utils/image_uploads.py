@@ -0,0 +1,299 @@
+"""
+Streaming image uploads for the cropper widgets.
+
+Cropped images are posted as binary (a raw ``image/*`` request body or a
+multipart ``image`` file) to the upload_image endpoint. The body is read
+in chunks into a SpooledTemporaryFile, so large uploads spill to disk
+instead of being held in memory. Pillow validates and re-encodes the
+image from there into a second spooled file, and storage streams that to
+S3 (boto3 switches to a multipart upload for large files) or to a local
+file in chunks.
+
+The endpoint answers with a signed token naming the stored file; forms
+post the token in ``cropped_image_token`` and views turn it back into the
+name with claim_image_upload(). Base64 data URLs are still accepted
+through decode_data_url(), which feeds the same pipeline.
+"""
+import base64
+import binascii
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.template.defaultfilters import filesizeformat
+from django.utils.text import get_valid_filename
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger('django')
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+DEFAULT_SPOOL_SIZE = 1024 * 1024
+DEFAULT_TOKEN_MAX_AGE = 24 * 60 * 60
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+TOKEN_SALT = 'skunkmonkey.image_upload'
+
+# Where each kind of upload is stored
+UPLOAD_FOLDERS = {
+    'product': 'product_images',
+    'category': 'category_images',
+    'profile': 'profile_images',
+}
+
+# Signatures of base64 image data posted without a data URL prefix
+_BASE64_SIGNATURES = ('/9j/', 'iVBOR', 'R0lGOD', 'UklGR')
+
+
+class ImageUploadError(Exception):
+    """An upload that is not an acceptable image"""
+
+
+def _spooled_file():
+    return tempfile.SpooledTemporaryFile(
+        max_size=getattr(
+            settings, 'IMAGE_UPLOAD_SPOOL_SIZE', DEFAULT_SPOOL_SIZE))
+
+
+def spool_stream(read, max_size=None):
+    """
+    Copy a stream into a spooled temporary file in chunks
+
+    Args:
+        read: A read(size) callable, e.g. request.read
+        max_size: Largest accepted size in bytes (defaults to
+            IMAGE_UPLOAD_MAX_SIZE)
+
+    Returns:
+        SpooledTemporaryFile positioned at the start
+
+    Raises:
+        ImageUploadError: If the stream is empty or too large
+    """
+    max_size = max_size or getattr(
+        settings, 'IMAGE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+    spooled = _spooled_file()
+    size = 0
+    while True:
+        chunk = read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            spooled.close()
+            raise ImageUploadError(
+                f'Images may be at most {filesizeformat(max_size)}.')
+        spooled.write(chunk)
+
+    if not size:
+        spooled.close()
+        raise ImageUploadError('No image data was received.')
+    spooled.seek(0)
+    return spooled
+
+
+def decode_data_url(data):
+    """
+    Decode a base64 image (a data URL, or bare base64 of a known image
+    type) into a spooled temporary file
+
+    Args:
+        data: The posted string
+
+    Returns:
+        SpooledTemporaryFile positioned at the start
+
+    Raises:
+        ImageUploadError: If the data is not base64 image data
+    """
+    data = (data or '').strip()
+    if ';base64,' in data:
+        header, data = data.split(';base64,', 1)
+        if not header.startswith('data:image/'):
+            raise ImageUploadError('The data is not an image.')
+    elif not data.startswith(_BASE64_SIGNATURES):
+        raise ImageUploadError('Invalid base64 image data.')
+    if any(char in data for char in ' \r\n'):
+        data = ''.join(data.split())
+
+    # Decode in slices that are whole base64 quanta to keep memory flat
+    slice_size = CHUNK_SIZE // 3 * 4
+    position = 0
+
+    def read(size):
+        nonlocal position
+        piece = data[position:position + slice_size]
+        position += slice_size
+        try:
+            return base64.b64decode(piece, validate=False)
+        except (binascii.Error, ValueError) as e:
+            raise ImageUploadError(f'Invalid base64 image data: {e}')
+
+    return spool_stream(read)
+
+
+def reencode_image(source):
+    """
+    Validate an uploaded image with Pillow and re-encode it
+
+    Re-encoding applies the EXIF orientation and drops all metadata.
+    Images with transparency stay PNG; everything else becomes JPEG.
+
+    Args:
+        source: File object holding the upload
+
+    Returns:
+        tuple: (SpooledTemporaryFile, extension)
+
+    Raises:
+        ImageUploadError: If the file is not an allowed, readable image
+    """
+    try:
+        image = Image.open(source)
+        if image.format not in ALLOWED_FORMATS:
+            raise ImageUploadError(
+                f'{image.format or "This"} images are not supported.')
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    except ImageUploadError:
+        raise
+    except (UnidentifiedImageError, OSError, SyntaxError,
+            Image.DecompressionBombError) as e:
+        raise ImageUploadError(f'The file is not a valid image: {e}')
+
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    output = _spooled_file()
+    if has_alpha:
+        image.convert('RGBA').save(output, format='PNG', optimize=True)
+        extension = 'png'
+    else:
+        image.convert('RGB').save(
+            output, format='JPEG', quality=90, optimize=True)
+        extension = 'jpg'
+    output.seek(0)
+    return output, extension
+
+
+def image_upload_name(folder_path, file_name_prefix, extension):
+    """A unique storage name for an upload, e.g. product_images/x_1_ab.jpg"""
+    prefix = os.path.basename(file_name_prefix or '').strip()
+    if prefix:
+        prefix = get_valid_filename(prefix)
+        if not prefix.endswith('_'):
+            prefix += '_'
+    folder_path = folder_path.strip('/')
+    return (
+        f'{folder_path}/{prefix}{int(time.time())}_'
+        f'{uuid.uuid4().hex[:8]}.{extension}'
+    )
+
+
+def store_image(source, folder_path, file_name_prefix=''):
+    """
+    Validate, re-encode and store an uploaded image
+
+    Args:
+        source: File object holding the upload
+        folder_path: Folder within media, e.g. "product_images"
+        file_name_prefix: Optional prefix for the file name
+
+    Returns:
+        str: Storage name of the saved image
+
+    Raises:
+        ImageUploadError: If the file is not an acceptable image
+    """
+    encoded, extension = reencode_image(source)
+    try:
+        name = default_storage.save(
+            image_upload_name(folder_path, file_name_prefix, extension),
+            File(encoded),
+        )
+    finally:
+        encoded.close()
+    logger.info(f"Stored uploaded image {name}")
+    return name
+
+
+def make_upload_token(name, purpose, user):
+    """Sign the name of an upload for the user who made it"""
+    return signing.dumps(
+        {'name': name, 'purpose': purpose, 'user': user.pk},
+        salt=TOKEN_SALT,
+    )
+
+
+def claim_image_upload(token, purpose, user):
+    """
+    The storage name behind an upload token
+
+    Args:
+        token: Token returned by the upload endpoint
+        purpose: The key of UPLOAD_FOLDERS the form expects
+        user: The user submitting the form
+
+    Returns:
+        str: Storage name of the uploaded image
+
+    Raises:
+        ImageUploadError: If the token is invalid, expired or not for
+            this purpose and user
+    """
+    try:
+        data = signing.loads(
+            token,
+            salt=TOKEN_SALT,
+            max_age=getattr(
+                settings, 'IMAGE_UPLOAD_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE),
+        )
+    except signing.BadSignature:
+        raise ImageUploadError('The image upload has expired or is invalid.')
+    if data.get('purpose') != purpose or data.get('user') != user.pk:
+        raise ImageUploadError('The image upload does not belong here.')
+    return data['name']
+
+
+def apply_cropped_image(request, model_instance, field_name, purpose,
+                        file_name_prefix=''):
+    """
+    Point a model's image field at the cropped image posted with a form
+
+    Prefers ``cropped_image_token`` from the binary upload endpoint and
+    falls back to a base64 ``cropped_image_data`` data URL. The field is
+    set but the instance is not saved.
+
+    Args:
+        request: The form submission
+        model_instance: Instance whose field to set
+        field_name: Name of the ImageField
+        purpose: Key of UPLOAD_FOLDERS for this field
+        file_name_prefix: Prefix for base64 uploads' file names
+
+    Returns:
+        dict with success and message, or None if no cropped image was
+        posted
+    """
+    token = request.POST.get('cropped_image_token')
+    if token:
+        try:
+            name = claim_image_upload(token, purpose, request.user)
+        except ImageUploadError as e:
+            logger.warning(f"Rejected image upload token: {e}")
+            return {'success': False, 'message': str(e)}
+        setattr(model_instance, field_name, name)
+        return {'success': True, 'message': 'Image uploaded successfully.'}
+
+    data = request.POST.get('cropped_image_data')
+    if data:
+        # Imported here: s3_utils builds its shims on this module
+        from skunkmonkey.utils.s3_utils import upload_base64_to_model_field
+        return upload_base64_to_model_field(
+            model_instance, field_name, data, UPLOAD_FOLDERS[purpose],
+            file_name_prefix)
+    return None
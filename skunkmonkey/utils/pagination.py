@@ -0,0 +1,309 @@
+"""
+Keyset (cursor) pagination for the skunkmonkey project.
+
+Pages are fetched with a WHERE clause on the list's sort keys instead of
+OFFSET, so deep pages cost the same as the first one. Cursors are opaque,
+signed tokens holding the sort key values of the row at the page edge;
+a cursor from a different sort order or a tampered token simply starts
+again from the first page. Totals are estimated (see estimate_count) so
+the page UI never needs a full COUNT(*) on large tables.
+"""
+import datetime
+import json
+import logging
+import math
+import uuid
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+CURSOR_SALT = 'skunkmonkey.pagination.cursor'
+
+# Below this many estimated rows an exact COUNT(*) is cheap enough to run
+EXACT_COUNT_THRESHOLD = 1000
+
+
+def estimate_count(queryset, exact_below=EXACT_COUNT_THRESHOLD):
+    """
+    Estimate the number of rows a queryset returns.
+
+    On PostgreSQL the planner's row estimate is used when it is large; small
+    results and other databases fall back to an exact count.
+
+    Args:
+        queryset: The queryset to count
+        exact_below: Estimates under this are replaced by an exact count
+
+    Returns:
+        int: Estimated (or exact) row count
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= exact_below:
+                return estimate
+        except Exception as e:
+            logger.warning(f"Could not estimate row count: {e}")
+    return queryset.count()
+
+
+def _serialize_value(value):
+    """Make a sort key value JSON-safe; the ORM parses it back on filter"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _resolve_value(obj, name):
+    """Read a (possibly related, ``a__b``) sort key value from an object"""
+    if name == 'pk':
+        return obj.pk
+    for part in name.split('__'):
+        obj = getattr(obj, part, None)
+        if obj is None:
+            break
+    return obj
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by its sort keys.
+
+    The ordering defaults to the queryset's own ordering (or the model's
+    Meta.ordering) and always ends with the primary key as a tiebreak.
+    Sort keys must be plain field names, ``related__field`` lookups or
+    annotations, and should not contain NULLs.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.per_page = int(per_page)
+        ordering = list(
+            ordering
+            or queryset.query.order_by
+            or queryset.model._meta.ordering
+        )
+        keys = []
+        pk_desc = None
+        for field in ordering:
+            if not isinstance(field, str) or field == '?':
+                raise ValueError(
+                    f"Keyset pagination cannot order by {field!r}")
+            name = field.lstrip('-')
+            if name in ('pk', 'id', queryset.model._meta.pk.name):
+                pk_desc = field.startswith('-')
+                break
+            keys.append((name, field.startswith('-')))
+        # Primary key tiebreak keeps the order total
+        if pk_desc is None:
+            pk_desc = keys[0][1] if keys else False
+        keys.append(('pk', pk_desc))
+        self.keys = keys
+        self.ordering = [
+            f"{'-' if desc else ''}{name}" for name, desc in keys]
+        self.queryset = queryset.order_by(*self.ordering)
+
+    @cached_property
+    def count(self):
+        """Estimated total number of objects"""
+        return estimate_count(self.queryset)
+
+    @cached_property
+    def num_pages(self):
+        """Estimated total number of pages (at least one)"""
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def _token(self, direction, obj=None, number=1):
+        payload = {'d': direction, 'n': number, 'o': self.ordering}
+        if obj is not None:
+            payload['v'] = [
+                _serialize_value(_resolve_value(obj, name))
+                for name, desc in self.keys
+            ]
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return None
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            logger.debug("Ignoring invalid pagination cursor")
+            return None
+        if payload.get('o') != self.ordering:
+            return None
+        values = payload.get('v')
+        if payload.get('d') != 'last' and (
+                not isinstance(values, list)
+                or len(values) != len(self.keys)):
+            return None
+        return payload
+
+    def _seek(self, values, backwards):
+        """Q object for rows strictly after (or before) the given keys"""
+        condition = Q()
+        for i, (name, desc) in enumerate(self.keys):
+            lookup = 'lt' if desc != backwards else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(self.keys[:i]):
+                clause &= Q(**{prev_name: values[j]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the page a cursor points at, or the first page
+
+        Args:
+            cursor: Token from a previous page's next/previous/last cursor
+
+        Returns:
+            KeysetPage
+        """
+        payload = self._decode(cursor)
+        per_page = self.per_page
+
+        if payload is None:
+            rows = list(self.queryset[:per_page + 1])
+            return KeysetPage(
+                self, rows[:per_page], number=1,
+                has_next=len(rows) > per_page, has_previous=False)
+
+        direction = payload['d']
+        backwards = direction in ('prev', 'last')
+        queryset = self.queryset
+        if backwards:
+            queryset = queryset.reverse()
+        if direction != 'last':
+            queryset = queryset.filter(self._seek(payload['v'], backwards))
+
+        rows = list(queryset[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if backwards:
+            rows.reverse()
+            if direction == 'last':
+                number = self.num_pages
+                has_next = False
+            else:
+                number = max(1, payload['n'])
+                has_next = True
+            return KeysetPage(
+                self, rows, number=number,
+                has_next=has_next, has_previous=more)
+
+        return KeysetPage(
+            self, rows, number=max(1, payload['n']),
+            has_next=more, has_previous=True)
+
+    def offset_page(self, number):
+        """
+        Return a page by number using OFFSET, for clients that only know
+        page numbers. Its cursors continue with keyset pagination.
+
+        Args:
+            number: 1-based page number, clamped to the estimated range
+
+        Returns:
+            KeysetPage
+        """
+        number = min(max(1, int(number)), self.num_pages)
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        return KeysetPage(
+            self, rows[:self.per_page], number=number,
+            has_next=len(rows) > self.per_page, has_previous=number > 1)
+
+
+class KeysetPage:
+    """
+    A page of results from KeysetPaginator.
+
+    Mirrors the parts of Django's Page used by templates (``object_list``,
+    ``number``, ``has_next`` ...) and adds the cursors for neighbouring
+    pages. ``number`` and ``paginator.num_pages`` are estimates.
+    """
+
+    def __init__(self, paginator, object_list, number, has_next,
+                 has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number} of ~{self.paginator.num_pages}>'
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator._token(
+            'next', self.object_list[-1], self.number + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator._token(
+            'prev', self.object_list[0], self.number - 1)
+
+    @cached_property
+    def last_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator._token('last')
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that paginates with KeysetPaginator.
+
+    The page is selected by the ``cursor`` query parameter. Set
+    ``keyset_ordering`` or override get_keyset_ordering() when the
+    queryset's own ordering is not the one to paginate by.
+    """
+    cursor_kwarg = 'cursor'
+    keyset_ordering = None
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, ordering=self.get_keyset_ordering())
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -3,38 +3,98 @@ Common S3 utilities for the skunkmonkey project.
 
 This module provides common functions used by both s3_utils.py and
 s3_verification.py to avoid circular imports.
+
+One S3 client is shared by the whole process. boto3 clients are
+thread-safe, so every request thread reuses the same connection pool
+instead of paying for a new client and TLS handshake per upload.
+Throttling and transient errors are retried by botocore's adaptive
+retry mode, which also rate-limits the client when S3 pushes back,
+rather than by sleeping in the web worker.
 """
+import threading
+
 from django.conf import settings
 
 import boto3
 from botocore.config import Config
 
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
 
-def get_s3_client() -> boto3.client:
-    """
-    Create and return a properly configured S3 client.
+_client = None
+_client_lock = threading.Lock()
 
-    Returns:
-        boto3.client: Configured S3 client
-    """
-    # Clean region name (remove any comments)
+
+def get_region_name() -> str | None:
+    """The configured region without any trailing comment"""
     region = settings.AWS_S3_REGION_NAME
     if region and '#' in region:
         region = region.split('#')[0].strip()
+    return region
+
+
+def get_s3_client_config(**overrides) -> Config:
+    """
+    The botocore config shared by the S3 client and the media storage.
+
+    Pool size, attempts and timeouts can be tuned with
+    AWS_S3_MAX_POOL_CONNECTIONS, AWS_S3_MAX_ATTEMPTS,
+    AWS_S3_CONNECT_TIMEOUT and AWS_S3_READ_TIMEOUT.
+
+    Args:
+        **overrides: Further Config options, e.g. s3={...}
 
-    # Configure S3 client
-    config = Config(
-        region_name=region,
+    Returns:
+        botocore.config.Config
+    """
+    return Config(
+        region_name=get_region_name(),
         signature_version=settings.AWS_S3_SIGNATURE_VERSION,
+        max_pool_connections=getattr(
+            settings, 'AWS_S3_MAX_POOL_CONNECTIONS',
+            DEFAULT_MAX_POOL_CONNECTIONS),
+        connect_timeout=getattr(
+            settings, 'AWS_S3_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=getattr(
+            settings, 'AWS_S3_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        tcp_keepalive=True,
         retries={
-            'max_attempts': 3,
-            'mode': 'standard'
-        }
+            'max_attempts': getattr(
+                settings, 'AWS_S3_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            'mode': 'adaptive'
+        },
+        **overrides
     )
 
-    return boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        config=config
-    )
+
+def get_s3_client() -> boto3.client:
+    """
+    Return the process-wide S3 client, creating it on first use.
+
+    Returns:
+        boto3.client: Configured S3 client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # A session of our own: the default session is not
+                # thread-safe to create clients from
+                _client = boto3.session.Session().client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    endpoint_url=getattr(
+                        settings, 'AWS_S3_ENDPOINT_URL', None),
+                    config=get_s3_client_config()
+                )
+    return _client
+
+
+def reset_s3_client():
+    """Drop the shared client, e.g. after credentials change in tests"""
+    global _client
+    with _client_lock:
+        _client = None
@@ -1,5 +1,8 @@
 """
 S3 verification utilities for the skunkmonkey project.
+
+Uploads are checked from a background job (queue_s3_verification) so the
+extra HEAD request stays off the request path.
 """
 import logging
 import time
@@ -7,6 +10,7 @@ import traceback
 import uuid
 
 from django.conf import settings
+from django.db import transaction
 
 from botocore.exceptions import ClientError
 
@@ -15,7 +19,10 @@ from skunkmonkey.utils.s3_common import get_s3_client
 logger = logging.getLogger('django')
 
 
-def verify_s3_file_exists(file_path: str) -> dict[str, bool | str]:
+def verify_s3_file_exists(
+    file_path: str,
+    full_key: bool = False
+) -> dict[str, bool | str]:
     """
     Verify if a file exists in S3 bucket.
     This performs a direct check with boto3 instead of relying on Django
@@ -23,6 +30,8 @@ def verify_s3_file_exists(file_path: str) -> dict[str, bool | str]:
 
     Args:
         file_path (str): The relative path to the file in the bucket
+        full_key (bool, optional): file_path is the whole S3 key rather
+                                   than a path within the media location
 
     Returns:
         Dict: Result containing status and message
@@ -70,7 +79,10 @@ def verify_s3_file_exists(file_path: str) -> dict[str, bool | str]:
             return result
 
         # Construct the full S3 key with media location prefix
-        s3_key = f"{settings.MEDIAFILES_LOCATION}/{file_path}"
+        s3_key = (
+            file_path if full_key
+            else f"{settings.MEDIAFILES_LOCATION}/{file_path}"
+        )
         result['key'] = s3_key
 
         print(f"⭐ S3 VERIFY [{transaction_id}]: Checking if file exists "
@@ -180,3 +192,32 @@ def verify_s3_file_exists(file_path: str) -> dict[str, bool | str]:
               f"{traceback.format_exc()}")
 
     return result
+
+
+def queue_s3_verification(file_path: str, full_key: bool = False) -> None:
+    """
+    Check that an upload exists in S3 from a background job once the
+    current transaction commits. Does nothing when S3 is disabled.
+
+    Args:
+        file_path (str): The relative path to the file in the bucket
+        full_key (bool, optional): file_path is the whole S3 key
+    """
+    # USE_S3 is only defined when the AWS settings are loaded
+    if not getattr(settings, 'USE_S3', False) or not file_path:
+        return
+
+    def enqueue_job():
+        from staff.jobs import enqueue
+        try:
+            enqueue(
+                'verify_s3_upload',
+                payload={'path': file_path, 'full_key': full_key},
+                description=f'Check {file_path} in S3',
+                notify=False,
+            )
+        except Exception as e:
+            # The upload itself succeeded; losing the check is harmless
+            logger.warning(f"Could not queue S3 check for {file_path}: {e}")
+
+    transaction.on_commit(enqueue_job)
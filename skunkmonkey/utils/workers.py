@@ -0,0 +1,165 @@
+"""
+Shared building blocks for the database-backed work queues.
+
+The Stripe webhook inbox (shop.webhook_worker), the staff job queue
+(staff.jobs) and the outbound email queue (users.utils.email_queue) all
+store their work as rows with ``status``, ``locked_by`` and ``locked_at``
+columns. Workers claim due rows with ``SELECT ... FOR UPDATE SKIP LOCKED``
+where the database supports it, so several workers can run side by side,
+and poll for more when nothing is due. This module holds the parts the
+queues have in common; each queue keeps its own handling of a claimed row.
+"""
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def make_worker_id():
+    """Identify a worker thread in a queue's locked_by column"""
+    return (f'{socket.gethostname()}:{threading.get_ident()}:'
+            f'{uuid.uuid4().hex[:6]}')[:100]
+
+
+def retry_delay(attempts, base, cap):
+    """
+    Backoff before retrying work that has failed ``attempts`` times: the
+    base delay doubled per failure, capped, with 10% jitter so retries of
+    a burst of failures spread out
+
+    Args:
+        attempts: Number of failed attempts so far (at least 1)
+        base: Seconds to wait after the first failure
+        cap: Longest wait in seconds
+
+    Returns:
+        timedelta
+    """
+    delay = min(base * 2 ** max(attempts - 1, 0), cap)
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+def claim_rows(model, worker_id, due, order_by, limit, count_attempt=True,
+               **changes):
+    """
+    Lock a batch of due rows for this worker
+
+    Args:
+        model: Queue model with status, locked_by and locked_at fields
+        worker_id: Identifier stored in locked_by
+        due: Q object selecting the rows that may be claimed
+        order_by: Fields giving the order rows are claimed in
+        limit: Maximum number of rows to claim
+        count_attempt: Add one to the row's ``attempts`` field
+        **changes: Further fields set on claim, e.g. the new status
+
+    Returns:
+        List of claimed instances, in ``order_by`` order
+    """
+    now = timezone.now()
+    changes.update(locked_by=worker_id, locked_at=now)
+    if count_attempt:
+        changes['attempts'] = F('attempts') + 1
+
+    with transaction.atomic():
+        ids = list(
+            model.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by(*order_by)
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # Re-checking ``due`` keeps two workers from claiming the same row
+        # on databases without row locks
+        model.objects.filter(due, pk__in=ids).update(**changes)
+
+    return list(model.objects.filter(
+        pk__in=ids, locked_by=worker_id).order_by(*order_by))
+
+
+def poll(process, poll_interval=5, once=False, stop=None):
+    """
+    Call ``process`` until stopped, sleeping while it finds no work
+
+    Args:
+        process: Callable taking a worker id and returning how many rows
+            it handled
+        poll_interval: Seconds to sleep when nothing was handled
+        once: Return as soon as nothing is handled instead of polling
+        stop: Optional threading.Event that ends the loop when set
+
+    Returns:
+        Total number of rows handled
+    """
+    worker_id = make_worker_id()
+    total = 0
+    try:
+        while stop is None or not stop.is_set():
+            close_old_connections()
+            processed = process(worker_id)
+            total += processed
+            if processed:
+                continue
+            if once:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+    return total
+
+
+def run_in_threads(run_worker, workers, name, on_stop=None, **kwargs):
+    """
+    Run a queue's worker loop in one or more threads until it returns or
+    the process is interrupted
+
+    Args:
+        run_worker: The queue's run_worker(stop=None, **kwargs) function
+        workers: Number of threads; 1 runs in the calling thread
+        name: Prefix for the thread names
+        on_stop: Optional callable run when an interrupt stops the threads
+        **kwargs: Passed on to run_worker
+
+    Returns:
+        Total returned by the workers, or None if interrupted with a single
+        worker
+    """
+    if workers <= 1:
+        try:
+            return run_worker(**kwargs)
+        except KeyboardInterrupt:
+            return None
+
+    stop = threading.Event()
+    results = []
+
+    def work():
+        results.append(run_worker(stop=stop, **kwargs))
+
+    threads = [
+        threading.Thread(target=work, name=f'{name}-{i}')
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        if on_stop is not None:
+            on_stop()
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return sum(results)
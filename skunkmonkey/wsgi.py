@@ -27,3 +27,10 @@ logger = logging.getLogger(__name__)  # Get a logger
 logger.info("WSGI script has been executed.")
 
 application = get_wsgi_application()
+
+# Resolve the Stripe keys now rather than on the first checkout
+try:
+    from shop.utils.stripe_utils import warm_stripe_keys
+    warm_stripe_keys()
+except Exception as e:
+    logger.warning(f"Could not warm Stripe keys: {e}")
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from staff.models import (
-    OrderAction, OrderNote, StaffNotification, StaffProfile
+    Job, OrderAction, OrderNote, StaffNotification, StaffProfile,
 )
 
 # Register staff models
@@ -9,3 +9,4 @@ admin.site.register(StaffProfile)
 admin.site.register(OrderNote)
 admin.site.register(OrderAction)
 admin.site.register(StaffNotification)
+admin.site.register(Job)
@@ -0,0 +1,161 @@
+"""
+Handlers for the staff app's background jobs (see staff.jobs)
+"""
+import logging
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from shop.models import Order
+from skunkmonkey.utils.image_derivatives import update_derivatives
+from skunkmonkey.utils.s3_verification import verify_s3_file_exists
+
+from .jobs import register_job
+from .product_export import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, filter_products, stream_products,
+)
+from .product_import import ProductImporter, read_csv_upload
+
+logger = logging.getLogger(__name__)
+
+
+@register_job('product_import', 'Product import', category='product')
+def import_products_job(job):
+    """Import the CSV uploaded with the job"""
+    with job.input_file.open('rb') as csv_file:
+        header, rows = read_csv_upload(csv_file)
+        importer = ProductImporter(job=job)
+        result = importer.run(header, rows)
+
+    success_count = result['created'] + result['updated']
+    if result['failed']:
+        job.message = (
+            f'Import completed with {success_count} successful and '
+            f'{result["failed"]} failed products.'
+        )
+    else:
+        job.message = f'Successfully imported {success_count} products.'
+    return result
+
+
+@register_job('product_export', 'Product export', category='product')
+def export_products_job(job):
+    """
+    Write a product export to the job's output file
+
+    Payload:
+        format: A key of EXPORT_FORMATS (default csv)
+        filters: Product list filters, as for filter_products()
+        product_ids: Optional list of product ids to limit the export to
+    """
+    export_format = job.payload.get('format', 'csv')
+    _, extension, _ = EXPORT_FORMATS[export_format]
+    products = filter_products(job.payload.get('filters', {}))
+    if job.payload.get('product_ids'):
+        products = products.filter(id__in=job.payload['product_ids'])
+
+    has_header = export_format != 'ndjson'
+    count = 0
+    with tempfile.TemporaryFile() as output:
+        for i, line in enumerate(stream_products(products, export_format)):
+            output.write(line.encode('utf-8'))
+            count = i if has_header else i + 1
+            if count and count % EXPORT_CHUNK_SIZE == 0:
+                job.report(count)
+        output.seek(0)
+        job.output_file.save(
+            f'products_export_{job.pk}.{extension}', File(output),
+            save=False)
+
+    job.report(count)
+    job.message = f'Exported {count} products.'
+    return {'exported': count, 'format': export_format}
+
+
+@register_job('order_status_email', 'Order status email', category='order')
+def order_status_email_job(job):
+    """
+    Email a customer that their order's status changed
+
+    Payload:
+        order_id: Order primary key
+        old_status: Status before the change
+        new_status: Status after the change
+    """
+    order = Order.objects.get(pk=job.payload['order_id'])
+    old_status = job.payload['old_status']
+    new_status = job.payload['new_status']
+
+    subject = f'Your order #{order.order_number} has been updated'
+    context = {
+        'order': order,
+        'old_status': dict(Order.STATUS_CHOICES).get(
+            old_status, old_status
+        ),
+        'new_status': dict(Order.STATUS_CHOICES).get(
+            new_status, new_status
+        ),
+    }
+    message = render_to_string('staff/emails/status_update.txt', context)
+    html_message = render_to_string(
+        'staff/emails/status_update.html', context)
+
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[order.email],
+        html_message=html_message
+    )
+    logger.info(
+        "Status update email sent to %s for order #%s",
+        order.email, order.order_number
+    )
+    job.message = f'Status update emailed to {order.email}.'
+    return {'recipient': order.email}
+
+
+@register_job('image_derivatives', 'Image derivatives', category='product')
+def image_derivatives_job(job):
+    """
+    Generate the responsive sizes of an uploaded image
+
+    Payload:
+        model: Model label, e.g. "products.product"
+        pk: Primary key of the instance
+        field: Name of its ImageField
+    """
+    model = apps.get_model(job.payload['model'])
+    instance = model.objects.filter(pk=job.payload['pk']).first()
+    if instance is None:
+        job.message = 'The image was deleted before it was processed.'
+        return {'updated': False}
+
+    updated = update_derivatives(instance, job.payload['field'])
+    job.message = (
+        'Image derivatives generated.' if updated
+        else 'Image derivatives were already up to date.'
+    )
+    return {'updated': updated}
+
+
+@register_job('verify_s3_upload', 'S3 upload check')
+def verify_s3_upload_job(job):
+    """
+    Check that an uploaded file exists in S3
+
+    Payload:
+        path: Path within the media location, or the whole key
+        full_key: Whether path is the whole key
+    """
+    result = verify_s3_file_exists(
+        job.payload['path'], full_key=job.payload.get('full_key', False))
+    if not result['exists']:
+        # Fail the job so the missing file shows up in the job list
+        raise RuntimeError(result['message'] or 'File not found in S3.')
+    job.message = result['message']
+    return {'key': result['key'], 'exists': True}
@@ -0,0 +1,237 @@
+"""
+Background jobs for long-running staff operations
+
+Views enqueue a Job row and return straight away; the run_jobs management
+command claims pending jobs (``SELECT ... FOR UPDATE SKIP LOCKED`` where
+the database supports it, so several workers can run side by side), runs
+each through the handler registered for its kind, and records the outcome
+on the row. Staff poll a job's progress from the job status endpoint and
+get a StaffNotification when it finishes.
+
+Handlers are registered with ``@register_job`` in a module imported from
+an AppConfig.ready(), and receive the claimed Job. They report progress
+with ``job.report()``, may attach a file to ``job.output_file``, and
+return a dict kept as ``job.result``; raising marks the job failed.
+
+Jobs are not retried: a job left running by a crashed worker is marked
+failed once it has reported nothing for ``STAFF_JOB_LOCK_TIMEOUT``
+seconds. With ``STAFF_JOBS_EAGER = True`` jobs run inside the request
+that enqueues them, for development without a worker.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from skunkmonkey.utils import workers
+
+from .models import Job, StaffNotification
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_TIMEOUT = 30 * 60
+
+_handlers = {}
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    """A registered kind of job"""
+    kind: str
+    label: str
+    func: Callable
+    category: str = 'other'
+
+
+def register_job(kind, label, category='other'):
+    """
+    Decorator registering the function that runs jobs of a kind
+
+    Args:
+        kind: Value stored in Job.kind
+        label: Human readable name used in notifications
+        category: StaffNotification category for completion notices
+    """
+    def decorator(func):
+        _handlers[kind] = JobHandler(kind, label, func, category)
+        return func
+    return decorator
+
+
+def get_job_handler(kind):
+    """The JobHandler registered for a kind, or None"""
+    return _handlers.get(kind)
+
+
+def enqueue(kind, payload=None, user=None, description='', notify=True,
+            input_file=None):
+    """
+    Queue a job for the worker
+
+    Args:
+        kind: A kind registered with @register_job
+        payload: JSON-serializable arguments for the handler
+        user: Staff member the job runs for; notified when it finishes
+        description: Short text shown with the job's progress
+        notify: Notify the user when the job succeeds; failures are
+            always reported
+        input_file: Optional uploaded file the handler reads
+
+    Returns:
+        The new Job
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No job handler registered for {kind!r}")
+
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        created_by=user,
+        description=description[:255],
+        notify=notify,
+    )
+    if input_file is not None:
+        job.input_file.save(input_file.name, input_file, save=False)
+    job.save()
+    logger.info(f"Queued {kind} job {job.pk}")
+
+    if getattr(settings, 'STAFF_JOBS_EAGER', False):
+        run_job(job)
+        job.refresh_from_db()
+    return job
+
+
+def fail_stale_jobs():
+    """
+    Mark running jobs whose worker stopped reporting as failed
+
+    Returns:
+        Number of jobs failed
+    """
+    stale = timezone.now() - timedelta(seconds=getattr(
+        settings, 'STAFF_JOB_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    jobs = list(Job.objects.filter(status='running', locked_at__lt=stale))
+    for job in jobs:
+        job.fail('The worker running this job stopped')
+        notify_job_finished(job)
+    return len(jobs)
+
+
+def claim_job(worker_id):
+    """
+    Lock the oldest pending job for this worker
+
+    Args:
+        worker_id: Identifier stored in locked_by
+
+    Returns:
+        The claimed Job, or None if nothing is pending
+    """
+    claimed = workers.claim_rows(
+        Job, worker_id, Q(status='pending'), ('created_at', 'pk'), 1,
+        count_attempt=False, status='running', started_at=timezone.now())
+    return claimed[0] if claimed else None
+
+
+def run_job(job):
+    """
+    Run a job through its handler and record the outcome
+
+    Args:
+        job: A Job, claimed by claim_job() or fresh from enqueue()
+
+    Returns:
+        True if the job succeeded
+    """
+    handler = get_job_handler(job.kind)
+    if job.status == 'pending':
+        job.start()
+
+    try:
+        if handler is None:
+            raise ValueError(f"No job handler registered for {job.kind!r}")
+        result = handler.func(job)
+    except Exception as e:
+        logger.exception(f"{job.kind} job {job.pk} failed")
+        job.fail(str(e)[:2000])
+        notify_job_finished(job)
+        return False
+
+    job.finish(result=result or {}, message=job.message)
+    logger.info(f"Finished {job.kind} job {job.pk}")
+    notify_job_finished(job)
+    return True
+
+
+def notify_job_finished(job):
+    """Tell the staff member who queued a job how it ended"""
+    if job.created_by_id is None:
+        return
+    if job.status == 'succeeded' and not job.notify:
+        return
+
+    handler = get_job_handler(job.kind)
+    label = handler.label if handler else job.kind
+    succeeded = job.status == 'succeeded'
+    try:
+        StaffNotification.objects.create(
+            recipient_id=job.created_by_id,
+            title=f"{label} {'finished' if succeeded else 'failed'}",
+            message=job.message or (
+                job.description if succeeded else 'The job failed.'),
+            url=reverse(
+                'staff:job_download' if job.output_file
+                else 'staff:job_status',
+                kwargs={'pk': job.pk}),
+            priority='medium' if succeeded else 'high',
+            category=handler.category if handler else 'other',
+        )
+    except Exception as e:
+        logger.error(f"Error notifying about job {job.pk}: {e}")
+
+
+def process_pending_jobs(worker_id=None, limit=None):
+    """
+    Run pending jobs one after another until none are left
+
+    Args:
+        worker_id: Identifier for locked_by; generated if omitted
+        limit: Stop after this many jobs
+
+    Returns:
+        Number of jobs run (successfully or not)
+    """
+    worker_id = worker_id or workers.make_worker_id()
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def run_worker(poll_interval=5, once=False, stop=None):
+    """
+    Run jobs until stopped
+
+    Args:
+        poll_interval: Seconds to sleep when no job is pending
+        once: Return as soon as nothing is pending instead of polling
+        stop: Optional threading.Event that ends the loop when set
+
+    Returns:
+        Total number of jobs run
+    """
+    def process(worker_id):
+        fail_stale_jobs()
+        return process_pending_jobs(worker_id, limit=1)
+
+    return workers.poll(
+        process, poll_interval=poll_interval, once=once, stop=stop)
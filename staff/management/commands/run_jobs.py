@@ -0,0 +1,50 @@
+"""
+Django management command to run queued staff jobs.
+"""
+from django.core.management.base import BaseCommand
+
+from skunkmonkey.utils.workers import run_in_threads
+from staff.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background staff jobs (imports, exports, bulk actions, '
+        'customer emails) from the Job queue. Runs until interrupted '
+        'unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of worker threads (default: 2)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when no job is pending (default: 5)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no job is pending instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        kwargs = {
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+
+        processed = run_in_threads(
+            run_worker, workers, 'job-worker',
+            on_stop=lambda: self.stdout.write('Stopping job workers...'),
+            **kwargs)
+        if processed is None:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {processed} jobs'))
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+import staff.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0003_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='input_file',
+            field=models.FileField(blank=True, upload_to=staff.models.job_file_path),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='notify',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='output_file',
+            field=models.FileField(blank=True, upload_to=staff.models.job_file_path),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created_at'], name='staff_job_status_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 """
 Models for staff functionality
 """
+import uuid
+
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
@@ -176,3 +178,117 @@ class StaffNotification(models.Model):
         self.is_read = True
         self.read_at = timezone.now()
         self.save()
+
+
+def job_file_path(instance, filename):
+    """
+    Upload path for job files; the random directory keeps them from being
+    guessed, since media files are served without a permission check
+    """
+    return f'staff_jobs/{uuid.uuid4().hex}/{filename}'
+
+
+class Job(models.Model):
+    """
+    A long-running staff operation, queued for the run_jobs worker
+
+    ``kind`` names the handler registered in staff.jobs; ``payload`` holds
+    its arguments. The row doubles as the job's progress report: handlers
+    update ``processed`` and ``errors`` as they go and leave their outcome
+    in ``result`` and, for exports, ``output_file``.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    # Row errors kept on the job; the count covers the rest
+    MAX_ERRORS = 100
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    description = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to=job_file_path, blank=True)
+    output_file = models.FileField(upload_to=job_file_path, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    message = models.TextField(blank=True)
+    notify = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='staff_jobs'
+    )
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'created_at'],
+                name='staff_job_status_idx'),
+        ]
+
+    def __str__(self):
+        """String representation of a job"""
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        """Whether the job has succeeded or failed"""
+        return self.status in ('succeeded', 'failed')
+
+    def start(self):
+        """Mark the job as running"""
+        self.status = 'running'
+        self.started_at = self.locked_at = timezone.now()
+        self.save(update_fields=['status', 'started_at', 'locked_at'])
+
+    def report(self, processed, errors=()):
+        """
+        Record progress
+
+        Args:
+            processed: Number of items handled so far
+            errors: New error messages since the last report
+        """
+        self.processed = processed
+        self.error_count += len(errors)
+        room = self.MAX_ERRORS - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+        # Reporting also shows the worker is still alive
+        self.locked_at = timezone.now()
+        self.save(update_fields=[
+            'processed', 'error_count', 'errors', 'locked_at'])
+
+    def finish(self, result=None, message=''):
+        """Mark the job as succeeded"""
+        self.status = 'succeeded'
+        self.result = result or {}
+        self.message = message
+        self.finished_at = timezone.now()
+        self.save(update_fields=[
+            'status', 'result', 'message', 'output_file', 'finished_at'])
+
+    def fail(self, message):
+        """Mark the job as failed"""
+        self.status = 'failed'
+        self.message = message
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'message', 'finished_at'])
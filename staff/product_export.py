@@ -0,0 +1,190 @@
+"""
+Product list filtering and streamed product exports
+
+filter_products() applies the staff product list filters; the product list
+API, the export download and background export jobs all use it, so staff
+export exactly what they see. stream_products() renders a queryset as CSV,
+TSV or NDJSON one line at a time over a chunked iterator, keeping memory
+flat whatever the catalog size.
+"""
+import csv
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'ID', 'Name', 'SKU', 'Description', 'Price', 'Compare At Price',
+    'Stock Quantity', 'Category', 'Active', 'Created At', 'Updated At'
+]
+
+# format: (content type, file extension, field delimiter)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', ','),
+    'tsv': ('text/tab-separated-values', 'tsv', '\t'),
+    'ndjson': ('application/x-ndjson', 'ndjson', None),
+}
+
+PRODUCT_SORT_MAPPINGS = {
+    'name-asc': 'name',
+    'name-desc': '-name',
+    'price-asc': 'price',
+    'price-desc': '-price',
+    'stock-asc': 'stock_quantity',
+    'stock-desc': '-stock_quantity',
+    'category-asc': 'category__name',
+    'category-desc': '-category__name',
+    'newest': '-created_at',
+    'oldest': 'created_at',
+}
+
+
+def filter_products(params):
+    """
+    Products matching the staff product list filters
+
+    Args:
+        params: QueryDict with the search, category, stock_status, status,
+            price_min, price_max and sort parameters of the product list
+
+    Returns:
+        Ordered Product queryset with the category selected
+    """
+    search = params.get('search', '')
+    category = params.get('category')
+    stock_status = params.get('stock_status')
+    status = params.get('status')
+    sort_option = params.get('sort', 'name-asc')
+    price_min = params.get('price_min')
+    price_max = params.get('price_max')
+
+    # Start with all products
+    products = Product.objects.select_related('category').all()
+
+    # Apply search filter
+    if search:
+        products = products.filter(
+            Q(name__icontains=search)
+            | Q(description__icontains=search)
+        )
+
+    # Apply category filter
+    if category:
+        products = products.filter(category_id=category)
+
+    # Apply stock status filter
+    if stock_status:
+        if stock_status == 'out_of_stock':
+            products = products.filter(stock_quantity=0)
+        elif stock_status == 'low_stock':
+            products = products.filter(
+                stock_quantity__gt=0,
+                stock_quantity__lte=5
+            )
+        elif stock_status == 'in_stock':
+            products = products.filter(stock_quantity__gt=5)
+
+    # Apply product status filter
+    if status:
+        if status == 'active':
+            products = products.filter(is_active=True)
+        elif status == 'inactive':
+            products = products.filter(is_active=False)
+
+    # Apply price range filter
+    if price_min:
+        try:
+            min_price = Decimal(price_min)
+            products = products.filter(price__gte=min_price)
+        except (ValueError, TypeError, InvalidOperation):
+            pass
+
+    if price_max:
+        try:
+            max_price = Decimal(price_max)
+            products = products.filter(price__lte=max_price)
+        except (ValueError, TypeError, InvalidOperation):
+            pass
+
+    # Apply sorting
+    return products.order_by(PRODUCT_SORT_MAPPINGS.get(sort_option, 'name'))
+
+
+class Echo:
+    """File-like object that hands written rows straight back"""
+
+    def write(self, value):
+        return value
+
+
+def _export_row(product):
+    """Column values of a product, in EXPORT_COLUMNS order"""
+    return [
+        product.id,
+        product.name,
+        product.slug,
+        product.description,
+        product.price,
+        product.compare_at_price or '',
+        product.stock_quantity,
+        product.category.name,
+        'Yes' if product.is_active else 'No',
+        product.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        product.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+    ]
+
+
+def _export_json(product):
+    """A product as one NDJSON record"""
+    return json.dumps({
+        'id': product.id,
+        'name': product.name,
+        'sku': product.slug,
+        'description': product.description,
+        'price': str(product.price),
+        'compare_at_price': (
+            str(product.compare_at_price)
+            if product.compare_at_price else None
+        ),
+        'stock_quantity': product.stock_quantity,
+        'category': product.category.name,
+        'is_active': product.is_active,
+        'created_at': product.created_at.isoformat(),
+        'updated_at': product.updated_at.isoformat(),
+    }) + '\n'
+
+
+def stream_products(products, export_format):
+    """
+    Yield an export of products one line at a time
+
+    Args:
+        products: Product queryset with the category selected
+        export_format: A key of EXPORT_FORMATS
+
+    Yields:
+        Lines of the export, header first for CSV and TSV
+    """
+    _, _, delimiter = EXPORT_FORMATS[export_format]
+    rows = products.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    try:
+        if delimiter is None:
+            for product in rows:
+                yield _export_json(product)
+            return
+
+        writer = csv.writer(Echo(), delimiter=delimiter)
+        yield writer.writerow(EXPORT_COLUMNS)
+        for product in rows:
+            yield writer.writerow(_export_row(product))
+    except Exception as e:
+        # Headers are already sent, so the download is cut short
+        logger.error(f"Error exporting products: {str(e)}")
+        raise
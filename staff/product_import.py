@@ -0,0 +1,309 @@
+"""
+Batched product CSV import
+
+Rows are read from the upload as a stream and written in batches of
+``STAFF_IMPORT_BATCH_SIZE``: every batch is one multi-row upsert of
+products plus one insert of inventory log entries, in its own
+transaction. Categories and the existing product keys (slug and SKU) are
+loaded once up front and kept current in memory, so rows need no lookups
+of their own.
+
+A row updates an existing product when its SKU column matches a product's
+SKU or slug (exports write the slug there), when its Slug column matches a
+slug, or, when it has neither, when its name slugifies to an existing
+slug. Every other row creates a product.
+"""
+import codecs
+import csv
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.text import slugify
+
+from products.card_cache import invalidate_product_cards
+from products.models import Category, InventoryLog, Product
+from products.search import update_search_index
+from shop.models import Cart
+from shop.utils.cart_utils import recalculate_cart_totals
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+REQUIRED_COLUMNS = [
+    'Name', 'Description', 'Price', 'Stock Quantity', 'Category'
+]
+
+# Fields an import overwrites on an existing product
+UPDATE_FIELDS = [
+    'name', 'sku', 'description', 'price', 'compare_at_price',
+    'stock_quantity', 'category', 'is_active', 'updated_at',
+]
+
+
+class ImportFileError(Exception):
+    """The uploaded file cannot be imported at all"""
+
+
+def read_csv_upload(uploaded_file):
+    """
+    Header and a row iterator for an uploaded CSV, decoded as it is read
+
+    Args:
+        uploaded_file: UploadedFile from request.FILES
+
+    Returns:
+        Tuple of (header list, iterator over the remaining rows)
+
+    Raises:
+        ImportFileError: If the file has no header, no data or lacks a
+            required column
+    """
+    rows = csv.reader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    header = next(rows, None)
+    if not header:
+        raise ImportFileError('CSV file has insufficient data')
+
+    header = [column.strip() for column in header]
+    missing_columns = [
+        col for col in REQUIRED_COLUMNS if col not in header
+    ]
+    if missing_columns:
+        raise ImportFileError(
+            f'Missing required columns: {", ".join(missing_columns)}')
+    return header, rows
+
+
+def _parse_decimal(value, column):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{column} must be a number, not "{value}"')
+
+
+class ProductImporter:
+    """
+    Imports product rows in batches, reporting progress to a Job
+
+    Args:
+        job: Optional staff Job that receives progress and row errors
+        batch_size: Rows per upsert; defaults to STAFF_IMPORT_BATCH_SIZE
+    """
+
+    def __init__(self, job=None, batch_size=None):
+        self.job = job
+        self.batch_size = batch_size or getattr(
+            settings, 'STAFF_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.categories = {
+            category.name: category for category in Category.objects.all()
+        }
+        # slug -> (pk, stock quantity, sku, price) of every existing product
+        self.products = {
+            slug: (pk, stock, sku, price)
+            for pk, slug, stock, sku, price in Product.objects.values_list(
+                'pk', 'slug', 'stock_quantity', 'sku', 'price')
+        }
+        self.skus = {
+            sku: slug for slug, (_, _, sku, _) in self.products.items()
+            if sku
+        }
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, header, rows):
+        """
+        Import rows read with read_csv_upload()
+
+        Args:
+            header: Column names
+            rows: Iterable of row value lists; row 2 is the first data row
+
+        Returns:
+            dict with created, updated and failed counts
+        """
+        processed = 0
+        batch = {}
+        errors = []
+        for line, row in enumerate(rows, start=2):
+            # Skip empty rows or instructional rows
+            if not row or not row[0] or row[0].startswith('-'):
+                continue
+
+            processed += 1
+            try:
+                data = {
+                    header[j]: val.strip()
+                    for j, val in enumerate(row)
+                    if j < len(header)
+                }
+                product = self._build_product(data)
+            except Exception as e:
+                errors.append(f"Row {line}: {str(e)}")
+                logger.error(f"Error importing product at row {line}: {e}")
+                continue
+
+            # A later row for the same product replaces an earlier one
+            batch[product.slug] = product
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = {}
+                self._report(processed, errors)
+                errors = []
+
+        if batch:
+            self._write_batch(batch)
+        self._report(processed, errors)
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+        }
+
+    def _report(self, processed, errors):
+        self.failed += len(errors)
+        self.errors.extend(errors)
+        if self.job is not None:
+            self.job.report(processed, errors)
+
+    def _category(self, name):
+        category = self.categories.get(name)
+        if category is None:
+            category, _ = Category.objects.get_or_create(
+                name=name,
+                defaults={'slug': slugify(name)}
+            )
+            self.categories[name] = category
+        return category
+
+    def _resolve_slug(self, data, name):
+        """Slug of the product a row updates, or a free one for a new one"""
+        sku = data.get('SKU', '')
+        slug = data.get('Slug', '')
+        if sku and sku in self.skus:
+            return self.skus[sku]
+        for key in (sku, slug):
+            if key and key in self.products:
+                return key
+
+        base = slug or slugify(name)
+        if not base:
+            raise ValueError('Name must contain letters or digits')
+        if not (sku or slug) and base in self.products:
+            return base
+
+        candidate, n = base, 1
+        while candidate in self.products:
+            n += 1
+            candidate = f"{base}-{n}"
+        # Reserve it so later rows do not pick it too
+        self.products[candidate] = (None, 0, sku, None)
+        return candidate
+
+    def _build_product(self, data):
+        """Validate a row and turn it into an unsaved Product"""
+        category_name = data.get('Category')
+        if not category_name:
+            raise ValueError('Category is required')
+
+        name = data.get('Name')
+        if not name:
+            raise ValueError('Name is required')
+
+        description = data.get('Description')
+        if not description:
+            raise ValueError('Description is required')
+
+        price_str = data.get('Price')
+        if not price_str:
+            raise ValueError('Price is required')
+        price = _parse_decimal(price_str, 'Price')
+
+        compare_price_str = data.get('Compare At Price')
+        compare_price = (
+            _parse_decimal(compare_price_str, 'Compare At Price')
+            if compare_price_str else None
+        )
+
+        stock_str = data.get('Stock Quantity')
+        if not stock_str:
+            raise ValueError('Stock Quantity is required')
+        stock = int(stock_str)
+        if stock < 0:
+            raise ValueError('Stock Quantity cannot be negative')
+
+        is_active_str = data.get('Active') or 'Yes'
+        is_active = is_active_str.lower() != 'no'
+
+        slug = self._resolve_slug(data, name)
+        _, _, existing_sku, _ = self.products[slug]
+        sku = data.get('SKU', '')
+        if not sku or sku == slug:
+            sku = existing_sku
+
+        return Product(
+            name=name,
+            slug=slug,
+            sku=sku,
+            description=description,
+            price=price,
+            compare_at_price=compare_price,
+            stock_quantity=stock,
+            category=self._category(category_name),
+            is_active=is_active
+        )
+
+    def _write_batch(self, batch):
+        """Upsert a batch of products and log their stock changes"""
+        # Upserts skip the signals that reprice carts, so note the
+        # products whose price changes and reprice their carts here
+        repriced = [
+            self.products[slug][0] for slug, product in batch.items()
+            if self.products[slug][0] is not None
+            and self.products[slug][3] != product.price
+        ]
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                batch.values(),
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=UPDATE_FIELDS,
+            )
+            pks = dict(Product.objects.filter(
+                slug__in=batch.keys()).values_list('slug', 'pk'))
+
+            logs = []
+            for slug, product in batch.items():
+                old_pk, old_stock, _, _ = self.products[slug]
+                pk = pks[slug]
+                if old_pk is None:
+                    self.created += 1
+                    change, reason = product.stock_quantity, 'Initial import'
+                else:
+                    self.updated += 1
+                    change = product.stock_quantity - old_stock
+                    reason = 'Import update'
+                if change:
+                    logs.append(InventoryLog(
+                        product_id=pk, change=change, reason=reason))
+                self.products[slug] = (pk, product.stock_quantity,
+                                       product.sku, product.price)
+                if product.sku:
+                    self.skus[product.sku] = slug
+            InventoryLog.objects.bulk_create(logs)
+            if repriced:
+                recalculate_cart_totals(Cart.objects.filter(
+                    items__product_id__in=repriced))
+
+            product_ids = list(pks.values())
+            transaction.on_commit(
+                lambda: invalidate_product_cards(product_ids))
+
+        # Upserts skip the post_save signals that keep the index current
+        try:
+            update_search_index(product_ids)
+        except Exception as e:
+            logger.error(f"Error indexing imported products: {e}")
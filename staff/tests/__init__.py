@@ -4,6 +4,10 @@ Contains tests for models, views, and other functionality of the staff app.
 """
 # The following imports ensure that Django's test discovery finds all tests
 from staff.tests.test_integration import *  # noqa
+from staff.tests.test_jobs import *  # noqa
 from staff.tests.test_models import *  # noqa
+from staff.tests.test_pagination import *  # noqa
+from staff.tests.test_product_export import *  # noqa
+from staff.tests.test_product_import import *  # noqa
 from staff.tests.test_user_views import *  # noqa
 from staff.tests.test_views import *  # noqa
@@ -0,0 +1,286 @@
+"""
+Test cases for background staff jobs
+"""
+import csv
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product
+from shop.models import Order
+from skunkmonkey.utils.s3_common import get_s3_client, reset_s3_client
+from skunkmonkey.utils.s3_verification import queue_s3_verification
+from staff.jobs import (
+    enqueue, fail_stale_jobs, process_pending_jobs, register_job,
+)
+from staff.models import Job, StaffNotification
+from users.models import ContactMessage
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@register_job('test_fail', 'Failing test job')
+def failing_job(job):
+    raise RuntimeError('Something broke')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class JobQueueTestCase(TestCase):
+    """Test cases for the job queue and its worker"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Create a staff user and some products"""
+        self.user = User.objects.create_user(
+            username='staffuser', password='password123', is_staff=True)
+        self.client.login(username='staffuser', password='password123')
+        category = Category.objects.create(name='Tools', slug='tools')
+        for i in range(3):
+            Product.objects.create(
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description='Description',
+                price=Decimal('10.00'),
+                stock_quantity=i,
+                category=category,
+            )
+
+    def test_export_runs_in_worker(self):
+        """A queued export waits for run_jobs, then can be downloaded"""
+        response = self.client.get(
+            reverse('staff:export_products'),
+            {'background': '1', 'stock_status': 'in_stock'})
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.payload['filters'], {'stock_status': 'in_stock'})
+
+        out = StringIO()
+        call_command('run_jobs', '--once', '--workers', '1', stdout=out)
+        self.assertIn('Ran 1 jobs', out.getvalue())
+
+        status = self.client.get(
+            reverse('staff:job_status', kwargs={'pk': job.pk})).json()['job']
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['result']['exported'], 0)
+
+        download = self.client.get(status['download_url'])
+        rows = list(csv.reader(StringIO(
+            b''.join(download.streaming_content).decode())))
+        self.assertEqual(rows, [rows[0]])  # No product has over 5 in stock
+
+        notification = StaffNotification.objects.get(recipient=self.user)
+        self.assertEqual(notification.title, 'Product export finished')
+        self.assertEqual(notification.url, status['download_url'])
+
+    def test_batch_export_of_selected_products(self):
+        """The batch action export queues a job for the chosen products"""
+        ids = list(Product.objects.values_list('pk', flat=True)[:2])
+        response = self.client.post(
+            reverse('staff:product_batch_action'),
+            json.dumps({'action': 'export', 'product_ids': ids}),
+            content_type='application/json')
+        job = Job.objects.get(pk=response.json()['job_id'])
+
+        self.assertEqual(process_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.result['exported'], 2)
+        self.assertEqual(job.processed, 2)
+
+    def test_failed_job_notifies(self):
+        """A failing handler marks the job failed and tells its owner"""
+        job = enqueue('test_fail', user=self.user, notify=False)
+        process_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.message, 'Something broke')
+        notification = StaffNotification.objects.get(recipient=self.user)
+        self.assertEqual(notification.priority, 'high')
+
+    def test_stale_running_job_failed(self):
+        """A job whose worker stopped reporting is given up on"""
+        job = enqueue('test_fail', user=self.user)
+        Job.objects.filter(pk=job.pk).update(
+            status='running',
+            locked_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(process_pending_jobs(), 0)
+
+    def test_jobs_of_others_hidden(self):
+        """Staff only see their own jobs"""
+        other = User.objects.create_user(username='other', is_staff=True)
+        job = enqueue('test_fail', user=other)
+
+        response = self.client.get(
+            reverse('staff:job_status', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('staff:job_list')).json()['jobs'], [])
+
+    def test_unknown_kind_rejected(self):
+        """Only registered kinds can be queued"""
+        with self.assertRaises(ValueError):
+            enqueue('no_such_job')
+
+
+@override_settings(STAFF_NOTIFY_CUSTOMER_ON_STATUS_CHANGE=True)
+class QueuedNotificationTestCase(TestCase):
+    """Test cases for views that hand their slow work to jobs"""
+
+    def setUp(self):
+        """Create a superuser, an order and contact messages"""
+        self.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            password='password123')
+        self.client.login(username='admin', password='password123')
+        self.order = Order.objects.create(
+            full_name='Test User',
+            email='customer@example.com',
+            shipping_address1='123 Test St',
+            shipping_city='Test City',
+            shipping_state='Test State',
+            shipping_zipcode='12345',
+            shipping_country='GB',
+            billing_address1='123 Test St',
+            billing_city='Test City',
+            billing_state='Test State',
+            billing_zipcode='12345',
+            billing_country='GB',
+            total_price=10.00,
+            grand_total=10.00,
+        )
+        self.messages = [
+            ContactMessage.objects.create(
+                email='customer@example.com',
+                subject=f'Question {i}', message='Hello')
+            for i in range(3)
+        ]
+
+    def test_status_email_sent_by_worker(self):
+        """The customer email is only sent once the job runs"""
+        response = self.client.post(
+            reverse('staff:order_update', kwargs={'pk': self.order.pk}),
+            {'status': 'shipped', 'payment_status': self.order.payment_status})
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get(kind='order_status_email')
+        self.assertEqual(len(mail.outbox), 0)
+
+        process_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        self.assertFalse(StaffNotification.objects.exists())
+
+    def test_message_bulk_action_queued(self):
+        """Bulk message actions are applied by the worker"""
+        url = reverse('users:staff_message_bulk_action')
+        response = self.client.post(url, {
+            'bulk_action': 'mark_read',
+            'message_ids': [message.pk for message in self.messages[:2]],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            ContactMessage.objects.filter(is_read=True).exists())
+
+        process_pending_jobs()
+
+        self.assertEqual(
+            ContactMessage.objects.filter(is_read=True).count(), 2)
+        job = Job.objects.get(kind='message_bulk_action')
+        self.assertEqual(job.message, '2 messages marked as read.')
+
+
+AWS_TEST_SETTINGS = {
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_STORAGE_BUCKET_NAME': 'test-bucket',
+    'AWS_S3_REGION_NAME': 'eu-west-2',
+    'AWS_S3_SIGNATURE_VERSION': 's3v4',
+    'MEDIAFILES_LOCATION': 'media',
+}
+
+
+@override_settings(USE_S3=True, **AWS_TEST_SETTINGS)
+class S3UploadCheckTestCase(TestCase):
+    """Test cases for the shared S3 client and background upload checks"""
+
+    def setUp(self):
+        reset_s3_client()
+        self.addCleanup(reset_s3_client)
+
+    def test_client_shared_between_threads(self):
+        """Every thread gets the same pooled, adaptive-retry client"""
+        clients = []
+        threads = [
+            threading.Thread(target=lambda: clients.append(get_s3_client()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        config = clients[0].meta.config
+        self.assertEqual(config.retries['mode'], 'adaptive')
+        self.assertEqual(config.max_pool_connections, 50)
+
+    def test_check_queued_after_commit(self):
+        """Uploads are checked by the worker, not the request"""
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_s3_verification('profile_images/avatar.jpg')
+            self.assertFalse(Job.objects.exists())
+
+        job = Job.objects.get(kind='verify_s3_upload')
+        self.assertEqual(job.payload['path'], 'profile_images/avatar.jpg')
+
+        with mock.patch('staff.job_handlers.verify_s3_file_exists',
+                        return_value={'exists': True, 'key': 'k',
+                                      'message': 'File exists'}) as verify:
+            process_pending_jobs()
+
+        verify.assert_called_once_with(
+            'profile_images/avatar.jpg', full_key=False)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+
+    def test_missing_file_fails_check(self):
+        """A file missing from S3 fails the job so it is visible"""
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_s3_verification('media/product_images/x.jpg', full_key=True)
+
+        with mock.patch('staff.job_handlers.verify_s3_file_exists',
+                        return_value={'exists': False, 'key': '',
+                                      'message': 'File does not exist'}):
+            process_pending_jobs()
+
+        job = Job.objects.get(kind='verify_s3_upload')
+        self.assertEqual(job.status, 'failed')
+
+    @override_settings(USE_S3=False)
+    def test_not_queued_without_s3(self):
+        """Nothing is checked when media is stored locally"""
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_s3_verification('profile_images/avatar.jpg')
+        self.assertFalse(Job.objects.exists())
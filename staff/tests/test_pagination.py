@@ -0,0 +1,163 @@
+"""
+Test cases for keyset (cursor) pagination in staff listings
+"""
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product
+from skunkmonkey.utils.pagination import KeysetPaginator
+
+
+class KeysetPaginatorTestCase(TestCase):
+    """Test cases for the KeysetPaginator component"""
+
+    def setUp(self):
+        """Create users, several sharing the same join date"""
+        joined = timezone.now() - timedelta(days=10)
+        for i in range(11):
+            User.objects.create_user(
+                username=f'user{i:02d}',
+                date_joined=joined + timedelta(days=i // 3)
+            )
+        self.queryset = User.objects.order_by('-date_joined')
+        self.expected = list(self.queryset.order_by('-date_joined', '-pk'))
+
+    def walk_forward(self, paginator):
+        page = paginator.page()
+        pages = [page]
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+        return pages
+
+    def test_cursors_visit_every_row_once(self):
+        """Test following next cursors returns all rows in order"""
+        pages = self.walk_forward(KeysetPaginator(self.queryset, 4))
+        rows = [user for page in pages for user in page]
+        self.assertEqual(rows, self.expected)
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Test previous cursors walk back to the same pages"""
+        paginator = KeysetPaginator(self.queryset, 4)
+        pages = self.walk_forward(paginator)
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertEqual(back.number, 2)
+        first = paginator.page(back.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_last_cursor(self):
+        """Test the last cursor returns the final rows"""
+        paginator = KeysetPaginator(self.queryset, 4)
+        last = paginator.page(paginator.page().last_cursor)
+        self.assertEqual(list(last), self.expected[-4:])
+        self.assertFalse(last.has_next())
+        self.assertEqual(last.number, 3)
+
+    def test_mixed_directions_and_related_keys(self):
+        """Test ascending related keys with descending tiebreaks"""
+        category = Category.objects.create(name='Oils')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Product {i}', description='', category=category,
+                price=Decimal('5.00') if i % 2 else Decimal('9.00'))
+        queryset = Product.objects.order_by('category__name', '-price')
+        pages = self.walk_forward(KeysetPaginator(queryset, 2))
+        rows = [product for page in pages for product in page]
+        self.assertEqual(
+            rows, list(queryset.order_by('category__name', '-price', 'pk')))
+
+    def test_invalid_or_foreign_cursor_starts_over(self):
+        """Test tampered cursors and cursors for another sort are ignored"""
+        paginator = KeysetPaginator(self.queryset, 4)
+        cursor = paginator.page().next_cursor
+        self.assertEqual(paginator.page(cursor + 'x').number, 1)
+
+        other = KeysetPaginator(User.objects.order_by('username'), 4)
+        self.assertEqual(other.page(cursor).number, 1)
+
+    def test_estimated_count(self):
+        """Test the paginator reports counts for the page UI"""
+        paginator = KeysetPaginator(self.queryset, 4)
+        self.assertEqual(paginator.count, 11)
+        self.assertEqual(paginator.num_pages, 3)
+
+
+class UserListPaginationTestCase(TestCase):
+    """Test cases for cursor links in the staff user list"""
+
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='super@example.com',
+            password='password123'
+        )
+        for i in range(25):
+            User.objects.create_user(username=f'customer{i:02d}')
+        self.client.login(username='superuser', password='password123')
+
+    def test_next_page_link_uses_cursor(self):
+        """Test the list links to the next page by cursor"""
+        url = reverse('staff:user_list')
+        response = self.client.get(url)
+        page = response.context['page_obj']
+        self.assertTrue(page.has_next())
+        self.assertContains(
+            response, '?' + urlencode({'cursor': page.next_cursor}))
+
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        second = response.context['page_obj']
+        self.assertEqual(second.number, 2)
+        self.assertEqual(len(second.object_list), 6)
+        self.assertFalse(
+            set(second.object_list) & set(page.object_list))
+
+
+class ProductApiPaginationTestCase(TestCase):
+    """Test cases for cursors in the staff product list API"""
+
+    def setUp(self):
+        User.objects.create_user(
+            username='staffuser', password='password123', is_staff=True)
+        self.client.login(username='staffuser', password='password123')
+        category = Category.objects.create(name='Tools', slug='tools')
+        for i in range(7):
+            Product.objects.create(
+                name=f'Item {i}', description='Item', price=Decimal('1.00'),
+                category=category)
+        self.url = reverse('staff:product_ajax_list')
+
+    def test_cursors_walk_the_list(self):
+        """Test next, previous and last cursors select the right pages"""
+        params = {'per_page': 3, 'sort': 'name-asc'}
+        first = self.client.get(self.url, params).json()['pagination']
+        self.assertEqual(first['current_page'], 1)
+        self.assertIsNone(first['previous_cursor'])
+
+        second = self.client.get(
+            self.url, {**params, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second['pagination']['current_page'], 2)
+        self.assertEqual(
+            [p['name'] for p in second['products']],
+            ['Item 3', 'Item 4', 'Item 5'])
+
+        back = self.client.get(self.url, {
+            **params, 'cursor': second['pagination']['previous_cursor']
+        }).json()
+        self.assertEqual(back['pagination']['current_page'], 1)
+
+        last = self.client.get(
+            self.url, {**params, 'cursor': first['last_cursor']}).json()
+        self.assertEqual(
+            [p['name'] for p in last['products']],
+            ['Item 4', 'Item 5', 'Item 6'])
+        self.assertFalse(last['pagination']['has_next'])
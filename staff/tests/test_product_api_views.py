@@ -3,12 +3,13 @@ Tests for staff product API views
 """
 import csv
 import json
+import tempfile
 from decimal import Decimal
 from io import StringIO
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from products.models import Category, InventoryLog, Product
@@ -264,7 +265,7 @@ class StaffProductApiViewsTest(TestCase):
         )
 
         # Check CSV content
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         csv_reader = csv.reader(StringIO(content))
         rows = list(csv_reader)
 
@@ -306,6 +307,7 @@ class StaffProductApiViewsTest(TestCase):
         # Check example row
         self.assertEqual(rows[1][0], 'Example Product')
 
+    @override_settings(STAFF_JOBS_EAGER=True, MEDIA_ROOT=tempfile.mkdtemp())
     def test_import_products_success(self):
         """Test successful product import from CSV."""
         url = reverse('staff:import_products')
@@ -0,0 +1,106 @@
+"""
+Test cases for the streaming product export
+"""
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.urls import reverse
+
+from products.models import Category, Product
+
+
+class ProductExportTestCase(TestCase):
+    """Test cases for export_products"""
+
+    def setUp(self):
+        """Create a staff user and a small catalog"""
+        User.objects.create_user(
+            username='staffuser', password='password123', is_staff=True)
+        self.client.login(username='staffuser', password='password123')
+        self.category = Category.objects.create(
+            name='Tools', slug='tools')
+        self.other_category = Category.objects.create(
+            name='Parts', slug='parts')
+        for i, (stock, active) in enumerate(
+                [(10, True), (3, True), (0, False)]):
+            Product.objects.create(
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description=f'Description {i}',
+                price=Decimal('10.00') * (i + 1),
+                stock_quantity=stock,
+                category=self.category,
+                is_active=active,
+            )
+        Product.objects.create(
+            name='Other',
+            slug='other',
+            description='Other description',
+            price=Decimal('99.00'),
+            stock_quantity=50,
+            category=self.other_category,
+        )
+        self.url = reverse('staff:export_products')
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_is_streamed(self):
+        """CSV rows are produced one at a time, header first"""
+        response, content = self.export()
+        rows = list(csv.reader(StringIO(content)))
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(rows[0][:2], ['ID', 'Name'])
+        self.assertEqual(
+            [row[1] for row in rows[1:]],
+            ['Other', 'Product 0', 'Product 1', 'Product 2'])
+
+    def test_filters_match_product_list(self):
+        """The export takes the product list filters and sort order"""
+        _, content = self.export(
+            category=self.category.pk, status='active', sort='price-desc')
+        rows = list(csv.reader(StringIO(content)))
+
+        self.assertEqual(
+            [row[1] for row in rows[1:]], ['Product 1', 'Product 0'])
+
+        _, content = self.export(stock_status='low_stock')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual([row[1] for row in rows[1:]], ['Product 1'])
+
+    def test_tsv_export(self):
+        """TSV uses tabs and its own file name"""
+        response, content = self.export(format='tsv', search='Other')
+        rows = list(csv.reader(StringIO(content), delimiter='\t'))
+
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename=products_export.tsv')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][7], 'Parts')
+
+    def test_ndjson_export(self):
+        """NDJSON has one JSON object per product and no header"""
+        response, content = self.export(format='ndjson', price_min='20')
+        records = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [record['name'] for record in records],
+            ['Other', 'Product 1', 'Product 2'])
+        self.assertEqual(records[0]['price'], '99.00')
+        self.assertIsNone(records[0]['compare_at_price'])
+
+    def test_unknown_format_rejected(self):
+        """An unsupported format is a bad request"""
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,187 @@
+"""
+Test cases for the batched product import
+"""
+import csv
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import Category, InventoryLog, Product
+from shop.models import Cart
+from staff.models import Job
+
+HEADER = ['Name', 'SKU', 'Description', 'Price', 'Compare At Price',
+          'Stock Quantity', 'Category', 'Active']
+
+
+def csv_upload(rows, header=HEADER):
+    """A CSV file upload with the given rows"""
+    data = StringIO()
+    writer = csv.writer(data)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return SimpleUploadedFile(
+        'products.csv', data.getvalue().encode('utf-8'),
+        content_type='text/csv')
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(STAFF_IMPORT_BATCH_SIZE=2, STAFF_JOBS_EAGER=True,
+                   MEDIA_ROOT=MEDIA_ROOT)
+class ProductImportTestCase(TestCase):
+    """Test cases for import_products, running the job in the request"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Create a staff user and an existing product"""
+        self.user = User.objects.create_user(
+            username='staffuser', password='password123', is_staff=True)
+        self.client.login(username='staffuser', password='password123')
+        self.category = Category.objects.create(name='Tools', slug='tools')
+        self.existing = Product.objects.create(
+            name='Hammer',
+            slug='hammer',
+            sku='HAM-1',
+            description='A hammer',
+            price=Decimal('10.00'),
+            stock_quantity=4,
+            category=self.category,
+        )
+        self.url = reverse('staff:import_products')
+
+    def upload(self, rows, **kwargs):
+        response = self.client.post(
+            self.url, {'importFile': csv_upload(rows, **kwargs)})
+        return response, json.loads(response.content)
+
+    def test_rows_are_upserted_in_batches(self):
+        """New rows are created, rows matching a SKU update the product"""
+        rows = [
+            [f'Saw {i}', '', 'A saw', '5.00', '', '3', 'Tools', 'Yes']
+            for i in range(3)
+        ]
+        rows.append(
+            ['Big Hammer', 'HAM-1', 'Heavier', '12.50', '', '9', 'Tools',
+             'No'])
+
+        response, data = self.upload(rows)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            data['message'], 'Successfully imported 4 products.')
+        self.assertEqual(Product.objects.count(), 4)
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'Big Hammer')
+        self.assertEqual(self.existing.slug, 'hammer')
+        self.assertEqual(self.existing.price, Decimal('12.50'))
+        self.assertFalse(self.existing.is_active)
+        self.assertTrue(InventoryLog.objects.filter(
+            product=self.existing, change=5, reason='Import update'
+        ).exists())
+        self.assertEqual(InventoryLog.objects.filter(
+            reason='Initial import', change=3).count(), 3)
+
+        job = Job.objects.get(pk=data['job_id'])
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.processed, 4)
+        self.assertEqual(job.result, {'created': 3, 'updated': 1,
+                                      'failed': 0})
+
+    def test_exported_slug_and_name_match(self):
+        """The slug an export writes as SKU, or the name, finds a product"""
+        self.upload([
+            ['Hammer Mk2', 'hammer', 'Exported', '11.00', '', '4', 'Tools',
+             'Yes'],
+        ])
+        self.upload([
+            ['Hammer Mk2', '', 'By name', '11.00', '', '4', 'Tools', 'Yes'],
+        ])
+
+        self.assertEqual(Product.objects.count(), 2)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'Hammer Mk2')
+        self.assertEqual(self.existing.sku, 'HAM-1')
+        other = Product.objects.exclude(pk=self.existing.pk).get()
+        self.assertEqual(other.slug, 'hammer-mk2')
+        self.assertEqual(other.description, 'By name')
+
+    def test_price_change_reprices_carts(self):
+        """An import that changes a price reprices carts holding it"""
+        cart = Cart.objects.create(session_id='import-session')
+        cart.add(self.existing, quantity=2)
+        version = Cart.objects.get(pk=cart.pk).version
+
+        self.upload([
+            ['Hammer', 'HAM-1', 'A hammer', '25.00', '', '4', 'Tools',
+             'Yes'],
+        ])
+
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal('50.00'))
+        self.assertGreater(cart.version, version)
+
+    def test_new_sku_gets_free_slug(self):
+        """An unknown SKU creates a product even if its name is taken"""
+        self.upload([
+            ['Hammer', 'HAM-2', 'Second', '9.00', '', '1', 'Garden', 'Yes'],
+        ])
+
+        product = Product.objects.get(sku='HAM-2')
+        self.assertEqual(product.slug, 'hammer-2')
+        self.assertEqual(product.category.name, 'Garden')
+
+    def test_row_errors_recorded_on_job(self):
+        """Bad rows are skipped and reported, the rest still import"""
+        response, data = self.upload([
+            ['Saw', '', 'A saw', 'cheap', '', '3', 'Tools', 'Yes'],
+            ['Drill', '', 'A drill', '30.00', '', '2', 'Tools', 'Yes'],
+            ['Level', '', 'A level', '8.00', '', '', 'Tools', 'Yes'],
+        ])
+
+        self.assertTrue(data['warning'])
+        self.assertEqual(len(data['errors']), 2)
+        self.assertIn('Row 2', data['errors'][0])
+        self.assertTrue(Product.objects.filter(slug='drill').exists())
+
+        job = Job.objects.get(pk=data['job_id'])
+        self.assertEqual(job.error_count, 2)
+        self.assertEqual(job.errors, data['errors'])
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Each batch costs a fixed number of queries"""
+        def rows(count):
+            return [
+                [f'Item {i}', '', 'Item', '1.00', '', '1', 'Tools', 'Yes']
+                for i in range(count)
+            ]
+
+        with override_settings(STAFF_IMPORT_BATCH_SIZE=100):
+            with CaptureQueriesContext(connection) as small:
+                self.upload(rows(5))
+            with CaptureQueriesContext(connection) as large:
+                self.upload(rows(50))
+
+        self.assertEqual(len(large), len(small))
+
+    def test_missing_columns_rejected(self):
+        """A file without the required columns is a bad request"""
+        response, data = self.upload([['Saw']], header=['Name'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Missing required columns', data['error'])
+        self.assertFalse(Job.objects.exists())
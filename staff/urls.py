@@ -4,6 +4,7 @@ URL patterns for staff functionality
 from django.urls import path
 
 from . import views
+from .views.job_views import job_download, job_list, job_status
 from .views.notification_views import (
     DeleteNotificationView, MarkAllNotificationsReadView,
     MarkNotificationReadView, NotificationListView,
@@ -12,6 +13,9 @@ from .views.order_views import (
     CustomerContactView, OrderDetailView, OrderListView, OrderNoteCreateView,
     OrderQuickViewAPI, OrderShippingUpdateView, OrderUpdateView,
 )
+from .views.product_api_views import (
+    export_products, import_products, product_ajax_list, product_batch_action,
+)
 from .views.product_views import (
     CategoryCreateView, CategoryListView, CategoryUpdateView,
     ProductAdjustStockView, ProductCreateView, ProductDashboardView,
@@ -64,6 +68,14 @@ urlpatterns = [
          ProductDashboardView.as_view(), name='product_dashboard'),
     path('products/quick-edit/<int:pk>/',
          product_quick_edit, name='product_quick_edit'),
+    path('products/export-csv/',
+         export_products, name='export_products'),
+    path('products/import-csv/',
+         import_products, name='import_products'),
+    path('api/products/list/',
+         product_ajax_list, name='product_ajax_list'),
+    path('api/products/batch-action/',
+         product_batch_action, name='product_batch_action'),
 
     # Categories
     path('categories/', CategoryListView.as_view(), name='category_list'),
@@ -88,6 +100,11 @@ urlpatterns = [
     path('orders/quick-view/<int:pk>/',
          OrderQuickViewAPI.as_view(), name='order_quick_view'),
 
+    # Background jobs
+    path('jobs/', job_list, name='job_list'),
+    path('jobs/<int:pk>/', job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', job_download, name='job_download'),
+
     # Notifications
     path('notifications/',
          NotificationListView.as_view(), name='notifications'),
@@ -2,6 +2,7 @@
 Views package for staff functionality
 """
 from .dashboard_views import DashboardView
+from .job_views import job_download, job_list, job_status
 from .notification_views import (
     MarkAllNotificationsReadView, MarkNotificationReadView,
     NotificationListView,
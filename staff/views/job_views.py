@@ -0,0 +1,141 @@
+"""
+Views for polling and collecting background staff jobs
+"""
+import logging
+import os
+
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from staff.mixins import staff_required
+from staff.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Jobs listed by job_list
+RECENT_JOBS = 20
+
+
+def _visible_jobs(user):
+    """Jobs a staff member may see: their own, or all for superusers"""
+    if user.is_superuser:
+        return Job.objects.all()
+    return Job.objects.filter(created_by=user)
+
+
+def job_data(job):
+    """
+    JSON-ready progress report of a job
+
+    Args:
+        job: Job instance
+
+    Returns:
+        dict
+    """
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'description': job.description,
+        'processed': job.processed,
+        'error_count': job.error_count,
+        'errors': job.errors,
+        'result': job.result,
+        'message': job.message,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at and job.started_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat(),
+        'status_url': reverse('staff:job_status', kwargs={'pk': job.pk}),
+        'download_url': (
+            reverse('staff:job_download', kwargs={'pk': job.pk})
+            if job.output_file else None
+        ),
+    }
+
+
+def job_response(job, label):
+    """
+    Response for a view that has just queued a job
+
+    Jobs normally run later, so the response points at the status URL;
+    when STAFF_JOBS_EAGER ran the job already, it carries the outcome in
+    the shape the view used to return.
+
+    Args:
+        job: The queued Job
+        label: What the job does, e.g. "Import"
+
+    Returns:
+        JsonResponse
+    """
+    data = job_data(job)
+    response = {
+        'job_id': job.pk,
+        'status_url': data['status_url'],
+    }
+    if not job.is_finished:
+        response.update({
+            'success': True,
+            'queued': True,
+            'message': (
+                f'{label} started. You will be notified when it is done.'
+            ),
+        })
+        return JsonResponse(response, status=202)
+
+    if job.status == 'failed':
+        response.update({
+            'success': False,
+            'error': f'{label} failed: {job.message}',
+        })
+        return JsonResponse(response, status=500)
+
+    response.update({'success': True, 'message': job.message})
+    if job.error_count:
+        response['warning'] = True
+        response['errors'] = job.errors[:10]  # Return first 10 errors
+    if data['download_url']:
+        response['download_url'] = data['download_url']
+    return JsonResponse(response)
+
+
+@login_required
+@staff_required
+def job_status(request, pk):
+    """Progress of one job, for polling."""
+    job = get_object_or_404(_visible_jobs(request.user), pk=pk)
+    return JsonResponse({'success': True, 'job': job_data(job)})
+
+
+@login_required
+@staff_required
+def job_list(request):
+    """The current staff member's most recent jobs."""
+    jobs = _visible_jobs(request.user).filter(created_by=request.user)
+    return JsonResponse({
+        'success': True,
+        'jobs': [job_data(job) for job in jobs[:RECENT_JOBS]],
+    })
+
+
+@login_required
+@staff_required
+def job_download(request, pk):
+    """Download the file a finished job produced."""
+    job = get_object_or_404(_visible_jobs(request.user), pk=pk)
+    if job.status != 'succeeded' or not job.output_file:
+        raise Http404('This job has no file to download')
+
+    try:
+        output = job.output_file.open('rb')
+    except FileNotFoundError:
+        logger.error(f"Output file of job {job.pk} is missing")
+        raise Http404('The file of this job is no longer available')
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=os.path.basename(job.output_file.name)
+    )
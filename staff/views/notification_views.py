@@ -10,6 +10,7 @@ from django.urls import reverse
 from django.utils import timezone
 from django.views.generic import ListView, View
 
+from shop.utils.shopper_state import invalidate_shopper_state
 from staff.mixins import StaffAccessMixin
 from staff.models import StaffNotification
 
@@ -119,6 +120,8 @@ class MarkAllNotificationsReadView(StaffAccessMixin, View):
         now = timezone.now()
         count = notifications.count()
         notifications.update(is_read=True, read_at=now)
+        # Bulk updates skip the signal that expires the unread badge
+        invalidate_shopper_state(request.user.id)
 
         messages.success(
             request,
@@ -136,6 +139,8 @@ class MarkAllNotificationsReadView(StaffAccessMixin, View):
         now = timezone.now()
         count = notifications.count()
         notifications.update(is_read=True, read_at=now)
+        # Bulk updates skip the signal that expires the unread badge
+        invalidate_shopper_state(request.user.id)
 
         # Check if AJAX request - return JSON response
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -15,10 +15,12 @@ from django.urls import reverse, reverse_lazy  # noqa: F401
 from django.views.generic import DetailView, ListView, View
 
 from shop.models import Order, OrderItem
+from skunkmonkey.utils.pagination import KeysetPaginationMixin
 from staff.forms import (
     CustomerContactForm, OrderFilterForm, OrderNoteForm,
     OrderShippingUpdateForm, OrderStatusUpdateForm,
 )
+from staff.jobs import enqueue
 from staff.mixins import DepartmentAccessMixin
 from staff.models import OrderAction, OrderNote
 from staff.views.utils import get_client_ip
@@ -27,9 +29,9 @@ from staff.views.utils import get_client_ip
 logger = logging.getLogger(__name__)
 
 
-class OrderListView(DepartmentAccessMixin, ListView):
+class OrderListView(DepartmentAccessMixin, KeysetPaginationMixin, ListView):
     """
-    List view of all orders with filtering and pagination
+    List view of all orders with filtering and cursor pagination
     """
     model = Order
     template_name = 'staff/order_list.html'
@@ -301,36 +303,23 @@ class OrderUpdateView(DepartmentAccessMixin, View):
         return redirect('staff:order_detail', pk=pk)
 
     def notify_customer_status_change(self, order, old_status, new_status):
-        """Send email notification to customer about status change"""
-        subject = f'Your order #{order.order_number} has been updated'
-        context = {
-            'order': order,
-            'old_status': dict(Order.STATUS_CHOICES).get(
-                old_status, old_status
-            ),
-            'new_status': dict(Order.STATUS_CHOICES).get(
-                new_status, new_status
-            ),
-        }
-        message = render_to_string('staff/emails/status_update.txt', context)
-        html_message = render_to_string(
-            'staff/emails/status_update.html', context)
-
+        """Queue an email notification to customer about status change"""
         try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[order.email],
-                html_message=html_message
-            )
-            logger.info(
-                "Status update email sent to %s for order #%s",
-                order.email, order.order_number
+            enqueue(
+                'order_status_email',
+                payload={
+                    'order_id': order.pk,
+                    'old_status': old_status,
+                    'new_status': new_status,
+                },
+                user=self.request.user,
+                description=f'Status email for order #{order.order_number}',
+                # Staff only hear about emails that could not be sent
+                notify=False
             )
         except Exception as e:
             logger.error(
-                "Error sending status update email for order #%s: %s",
+                "Error queueing status update email for order #%s: %s",
                 order.order_number, str(e)
             )
 
@@ -3,25 +3,30 @@ import csv
 import io
 import json
 import logging
-from decimal import Decimal, InvalidOperation  # Added InvalidOperation import
 
 from django.contrib.auth.decorators import (  # noqa F401
     login_required, user_passes_test,
 )
-from django.core.paginator import Paginator
 from django.db import models, transaction
-from django.db.models import Q, Sum
+from django.db.models import Sum
 from django.http import (  # noqa F401
     HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404  # noqa F401
 from django.urls import reverse  # noqa F401
-from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_exempt  # noqa F401
 from django.views.decorators.http import require_POST
 
-from products.models import Category, InventoryLog, Product
+from products.models import Product
+from skunkmonkey.utils.pagination import KeysetPaginator
+from staff.jobs import enqueue
 from staff.mixins import staff_required
+from staff.product_export import (
+    EXPORT_FORMATS, filter_products, stream_products,
+)
+from staff.product_import import ImportFileError, read_csv_upload
+from staff.views.job_views import job_response
 
 logger = logging.getLogger(__name__)
 
@@ -31,83 +36,19 @@ logger = logging.getLogger(__name__)
 def product_ajax_list(request):
     """Get products with filtering for AJAX requests."""
     try:
-        # Extract filter parameters
-        search = request.GET.get('search', '')
-        category = request.GET.get('category')
-        stock_status = request.GET.get('stock_status')
-        status = request.GET.get('status')
-        sort_option = request.GET.get('sort', 'name-asc')
-        price_min = request.GET.get('price_min')
-        price_max = request.GET.get('price_max')
+        cursor = request.GET.get('cursor')
         page = int(request.GET.get('page', 1))
         per_page = int(request.GET.get('per_page', 20))
 
-        # Start with all products
-        products = Product.objects.select_related('category').all()
-
-        # Apply search filter
-        if search:
-            products = products.filter(
-                Q(name__icontains=search)
-                | Q(description__icontains=search)
-            )
-
-        # Apply category filter
-        if category:
-            products = products.filter(category_id=category)
-
-        # Apply stock status filter
-        if stock_status:
-            if stock_status == 'out_of_stock':
-                products = products.filter(stock_quantity=0)
-            elif stock_status == 'low_stock':
-                products = products.filter(
-                    stock_quantity__gt=0,
-                    stock_quantity__lte=5
-                )
-            elif stock_status == 'in_stock':
-                products = products.filter(stock_quantity__gt=5)
-
-        # Apply product status filter
-        if status:
-            if status == 'active':
-                products = products.filter(is_active=True)
-            elif status == 'inactive':
-                products = products.filter(is_active=False)
-
-        # Apply price range filter
-        if price_min:
-            try:
-                min_price = Decimal(price_min)
-                products = products.filter(price__gte=min_price)
-            except (ValueError, TypeError, InvalidOperation):
-                pass
-
-        if price_max:
-            try:
-                max_price = Decimal(price_max)
-                products = products.filter(price__lte=max_price)
-            except (ValueError, TypeError, InvalidOperation):
-                pass
-
-        # Apply sorting
-        sort_mappings = {
-            'name-asc': 'name',
-            'name-desc': '-name',
-            'price-asc': 'price',
-            'price-desc': '-price',
-            'stock-asc': 'stock_quantity',
-            'stock-desc': '-stock_quantity',
-            'category-asc': 'category__name',
-            'category-desc': '-category__name',
-            'newest': '-created_at',
-            'oldest': 'created_at',
-        }
-        products = products.order_by(sort_mappings.get(sort_option, 'name'))
+        products = filter_products(request.GET)
 
-        # Paginate results
-        paginator = Paginator(products, per_page)
-        page_obj = paginator.get_page(page)
+        # Paginate by cursor; a bare page number (older clients) seeks with
+        # OFFSET from the first page instead
+        paginator = KeysetPaginator(products, per_page)
+        if cursor or page <= 1:
+            page_obj = paginator.page(cursor)
+        else:
+            page_obj = paginator.offset_page(page)
 
         # Format product data for JSON response
         product_list = []
@@ -143,6 +84,9 @@ def product_ajax_list(request):
                 'total_pages': paginator.num_pages,
                 'has_next': page_obj.has_next(),
                 'has_previous': page_obj.has_previous(),
+                'next_cursor': page_obj.next_cursor,
+                'previous_cursor': page_obj.previous_cursor,
+                'last_cursor': page_obj.last_cursor,
                 'total_items': paginator.count
             }
         })
@@ -286,11 +230,13 @@ def product_batch_action(request):
                 message = f'Successfully deleted {count} products'
 
             elif action == 'export':
-                # This would normally trigger a background task to generate
-                # the export
-                # and notify the user when ready. For simplicity, we'll return
-                # success here, and the actual export functionality would be
-                # handled by a separate endpoint.
+                job = enqueue(
+                    'product_export',
+                    payload={'product_ids': [
+                        int(pk) for pk in product_ids]},
+                    user=request.user,
+                    description=f'Export of {count} selected products'
+                )
                 message = f'Export of {count} products has been initiated'
 
             else:
@@ -299,11 +245,16 @@ def product_batch_action(request):
                     'error': f'Unknown action: {action}'
                 }, status=400)
 
-        return JsonResponse({
+        response_data = {
             'success': True,
             'message': message,
             'count': count
-        })
+        }
+        if action == 'export':
+            response_data['job_id'] = job.pk
+            response_data['status_url'] = reverse(
+                'staff:job_status', kwargs={'pk': job.pk})
+        return JsonResponse(response_data)
 
     except json.JSONDecodeError:
         return JsonResponse({
@@ -321,42 +272,39 @@ def product_batch_action(request):
 @login_required
 @staff_required
 def export_products(request):
-    """Export products to CSV file."""
-    try:
-        # Create a file-like buffer to receive CSV data
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-
-        # Write header row
-        writer.writerow([
-            'ID', 'Name', 'SKU', 'Description', 'Price', 'Compare At Price',
-            'Stock Quantity', 'Category', 'Active', 'Created At', 'Updated At'
-        ])
+    """
+    Export products as CSV, TSV or NDJSON (?format=), streamed row by row
+
+    Takes the same filters as product_ajax_list, so staff export what
+    they see in the product list. With ?background=1 the file is written
+    by a background job instead, and its status URL is returned.
+    """
+    export_format = request.GET.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(
+            f"Unknown export format: {export_format}")
 
-        # Get all products
-        products = Product.objects.select_related('category').all()
-
-        # Write product data
-        for product in products:
-            writer.writerow([
-                product.id,
-                product.name,
-                product.slug,
-                product.description,
-                product.price,
-                product.compare_at_price or '',
-                product.stock_quantity,
-                product.category.name,
-                'Yes' if product.is_active else 'No',
-                product.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                product.updated_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
+    try:
+        if request.GET.get('background'):
+            filters = request.GET.dict()
+            filters.pop('format', None)
+            filters.pop('background', None)
+            job = enqueue(
+                'product_export',
+                payload={'format': export_format, 'filters': filters},
+                user=request.user,
+                description=f'Product export ({export_format})'
+            )
+            return job_response(job, 'Export')
 
-        # Create the HTTP response with the appropriate CSV header
-        buffer.seek(0)
-        response = HttpResponse(buffer.getvalue(), content_type='text/csv')
+        products = filter_products(request.GET)
+        content_type, extension, _ = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream_products(products, export_format),
+            content_type=content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename=products_export.csv'
+            f'attachment; filename=products_export.{extension}'
         )
 
         return response
@@ -424,169 +372,52 @@ def export_template(request):
 @staff_required
 @require_POST
 def import_products(request):
-    """Import products from CSV file."""
+    """
+    Queue an import of products from CSV file.
+
+    The file's columns are checked here; the rows are created or updated
+    in batches by a background job, whose progress and row errors can be
+    polled from its status URL.
+    """
     if not request.user.is_staff:
         return JsonResponse({
             'success': False,
             'error': 'Unauthorized access'
         }, status=403)
 
-    try:
-        csv_file = request.FILES.get('importFile')
-        if not csv_file:
-            return JsonResponse({
-                'success': False,
-                'error': 'No file uploaded'
-            }, status=400)
-
-        if not csv_file.name.endswith('.csv'):
-            return JsonResponse({
-                'success': False,
-                'error': 'File is not a CSV'
-            }, status=400)
-
-        # Read and decode the file
-        file_data = csv_file.read().decode('utf-8')
-        csv_data = csv.reader(io.StringIO(file_data))
-
-        # Extract header and data rows
-        rows = list(csv_data)
-        if len(rows) < 2:  # Header + at least one data row
-            return JsonResponse({
-                'success': False,
-                'error': 'CSV file has insufficient data'
-            }, status=400)
-
-        header = rows[0]
-
-        # Validate required columns
-        required_columns = [
-            'Name', 'Description', 'Price', 'Stock Quantity', 'Category'
-        ]
-        missing_columns = [
-            col for col in required_columns if col not in header
-        ]
+    csv_file = request.FILES.get('importFile')
+    if not csv_file:
+        return JsonResponse({
+            'success': False,
+            'error': 'No file uploaded'
+        }, status=400)
 
-        if missing_columns:
-            return JsonResponse({
-                'success': False,
-                'error': (
-                    'Missing required columns: '
-                    f'{", ".join(missing_columns)}'
-                )
-            }, status=400)
+    if not csv_file.name.endswith('.csv'):
+        return JsonResponse({
+            'success': False,
+            'error': 'File is not a CSV'
+        }, status=400)
 
-        # Process rows
-        success_count = 0
-        error_count = 0
-        errors = []
+    try:
+        # Check the header now so a bad file is rejected straight away
+        _, rows = read_csv_upload(csv_file)
+        if next(rows, None) is None:  # Header + at least one data row
+            raise ImportFileError('CSV file has insufficient data')
+        csv_file.seek(0)
+
+        job = enqueue(
+            'product_import',
+            user=request.user,
+            description=csv_file.name,
+            input_file=csv_file
+        )
+        return job_response(job, 'Import')
 
-        with transaction.atomic():
-            for i, row in enumerate(rows[1:], start=2):
-                # Skip empty rows or instructional rows
-                if not row or not row[0] or row[0].startswith('-'):
-                    continue
-
-                try:
-                    # Map columns to values using dictionary comprehension
-                    data = {
-                        header[j]: val
-                        for j, val in enumerate(row)
-                        if j < len(header)
-                    }
-
-                    # Get or create category
-                    category_name = data.get('Category')
-                    if not category_name:
-                        raise ValueError('Category is required')
-
-                    category, _ = Category.objects.get_or_create(
-                        name=category_name,
-                        defaults={'slug': slugify(category_name)}
-                    )
-
-                    # Parse values
-                    name = data.get('Name')
-                    if not name:
-                        raise ValueError('Name is required')
-
-                    description = data.get('Description')
-                    if not description:
-                        raise ValueError('Description is required')
-
-                    price_str = data.get('Price')
-                    if not price_str:
-                        raise ValueError('Price is required')
-                    price = Decimal(price_str)
-
-                    compare_price_str = data.get('Compare At Price')
-                    compare_price = (
-                        Decimal(compare_price_str)
-                        if compare_price_str else None
-                    )
-
-                    stock_str = data.get('Stock Quantity')
-                    if not stock_str:
-                        raise ValueError('Stock Quantity is required')
-                    stock = int(stock_str)
-
-                    is_active_str = data.get('Active', 'Yes')
-                    is_active = is_active_str.lower() != 'no'
-
-                    # Create the product
-                    slug = slugify(name)
-                    product = Product(
-                        name=name,
-                        slug=slug,
-                        description=description,
-                        price=price,
-                        compare_at_price=compare_price,
-                        stock_quantity=stock,
-                        category=category,
-                        is_active=is_active
-                    )
-
-                    # Handle slug uniqueness
-                    existing_count = Product.objects.filter(
-                        slug__startswith=slug
-                    ).count()
-                    if existing_count > 0:
-                        product.slug = f"{slug}-{existing_count + 1}"
-
-                    product.save()
-
-                    # Create inventory log entry for initial stock
-                    InventoryLog.objects.create(
-                        product=product,
-                        change=stock,
-                        reason="Initial import"
-                    )
-
-                    success_count += 1
-
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Row {i}: {str(e)}")
-                    logger.error(
-                        f"Error importing product at row {i}: {str(e)}"
-                    )
-
-        # Return response with results
-        if error_count > 0:
-            return JsonResponse({
-                'success': True,
-                'warning': True,
-                'message': (
-                    f'Import completed with {success_count} successful and '
-                    f'{error_count} failed products.'
-                ),
-                'errors': errors[:10]  # Return first 10 errors
-            })
-        else:
-            return JsonResponse({
-                'success': True,
-                'message': f'Successfully imported {success_count} products.'
-            })
+    except ImportFileError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
 
     except Exception as e:
         logger.error(f"Error in import_products: {str(e)}")
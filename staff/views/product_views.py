@@ -21,7 +21,7 @@ from django.views.generic import (
 
 from products.forms import CategoryForm, ProductForm
 from products.models import Category, InventoryLog, Product
-from skunkmonkey.utils.s3_utils import upload_base64_to_model_field
+from skunkmonkey.utils.image_uploads import apply_cropped_image
 from staff.mixins import StaffAccessMixin
 
 logger = logging.getLogger(__name__)
@@ -364,24 +364,18 @@ class ProductCreateView(StaffAccessMixin, CreateView):
     def form_valid(self, form):
         """Process the form if valid."""
         # Handle the cropped image if provided
-        cropped_image_data = self.request.POST.get('cropped_image_data')
-
-        if cropped_image_data:
-            logger.info("Processing cropped image data in ProductCreateView")
-            # Use our utility function to handle S3 upload
-            upload_result = upload_base64_to_model_field(
-                model_instance=form.instance,
-                field_name='image',
-                base64_data=cropped_image_data,
-                folder_path='product_images',
-                file_name_prefix=f'product_{form.instance.name}'
+        upload_result = apply_cropped_image(
+            self.request,
+            form.instance,
+            'image',
+            'product',
+            file_name_prefix=f'product_{form.instance.name}'
+        )
+        if upload_result and not upload_result['success']:
+            logger.error(
+                f"Failed to upload image: {upload_result['message']}"
             )
 
-            if not upload_result['success']:
-                logger.error(
-                    f"Failed to upload image: {upload_result['message']}"
-                )
-
         response = super().form_valid(form)
 
         # Create inventory log entry for initial stock
@@ -420,24 +414,18 @@ class ProductUpdateView(StaffAccessMixin, UpdateView):
         new_stock = form.cleaned_data['stock_quantity']
 
         # Handle the cropped image if provided
-        cropped_image_data = self.request.POST.get('cropped_image_data')
-
-        if cropped_image_data:
-            logger.info("Processing cropped image data")
-            # Use our utility function to handle S3 upload
-            upload_result = upload_base64_to_model_field(
-                model_instance=form.instance,
-                field_name='image',
-                base64_data=cropped_image_data,
-                folder_path='product_images',
-                file_name_prefix=f'product_{form.instance.name}'
+        upload_result = apply_cropped_image(
+            self.request,
+            form.instance,
+            'image',
+            'product',
+            file_name_prefix=f'product_{form.instance.name}'
+        )
+        if upload_result and not upload_result['success']:
+            logger.error(
+                f"Failed to upload image: {upload_result['message']}"
             )
 
-            if not upload_result['success']:
-                logger.error(
-                    f"Failed to upload image: {upload_result['message']}"
-                )
-
         # Handle image removal
         if self.request.POST.get('remove_image') == 'true':
             logger.info("Removing product image")
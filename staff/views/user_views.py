@@ -15,6 +15,7 @@ from django.views.generic import (  # noqa:F401
     CreateView, DetailView, FormView, ListView, UpdateView, View,
 )
 
+from skunkmonkey.utils.pagination import KeysetPaginationMixin
 from staff.forms import (
     UserCreationForm, UserFilterForm, UserProfileForm, UserUpdateForm,
 )
@@ -25,9 +26,9 @@ from users.models import UserProfile
 logger = logging.getLogger(__name__)
 
 
-class UserListView(ManagerAccessMixin, ListView):
+class UserListView(ManagerAccessMixin, KeysetPaginationMixin, ListView):
     """
-    List view of users with filtering and search
+    List view of users with filtering, search and cursor pagination
     """
     model = User
     template_name = 'staff/user_list.html'
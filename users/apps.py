@@ -6,5 +6,7 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
-        # Import signals to connect them.
+        # Import job handlers to register them, and signals to connect
+        # them.
+        import users.job_handlers  # noqa
         import users.signals  # noqa
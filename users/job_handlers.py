@@ -0,0 +1,55 @@
+"""
+Handlers for the users app's background jobs (see staff.jobs)
+"""
+import logging
+
+from staff.jobs import register_job
+from users.models import ContactMessage
+
+logger = logging.getLogger('users')
+
+# Messages handled between progress reports
+REPORT_EVERY = 100
+
+MESSAGE_ACTIONS = {
+    'mark_read': 'marked as read',
+    'mark_unread': 'marked as unread',
+    'assign_to_me': 'assigned',
+    'set_status': 'updated',
+}
+
+
+@register_job('message_bulk_action', 'Message bulk action', category='user')
+def message_bulk_action_job(job):
+    """
+    Apply a bulk action to contact messages
+
+    Payload:
+        action: A key of MESSAGE_ACTIONS
+        message_ids: Contact message ids
+        status: New status, for set_status
+    """
+    action = job.payload['action']
+    if action not in MESSAGE_ACTIONS:
+        raise ValueError(f'Unknown message action: {action}')
+    status = job.payload.get('status')
+
+    messages_to_process = ContactMessage.objects.filter(
+        id__in=job.payload['message_ids'])
+    count = 0
+    for message_obj in messages_to_process.iterator():
+        if action == 'mark_read':
+            message_obj.mark_as_read()
+        elif action == 'mark_unread':
+            message_obj.mark_as_unread()
+        elif action == 'assign_to_me':
+            message_obj.assign_to(job.created_by)
+        elif action == 'set_status':
+            message_obj.update_status(status, job.created_by)
+        count += 1
+        if count % REPORT_EVERY == 0:
+            job.report(count)
+
+    job.report(count)
+    job.message = f'{count} messages {MESSAGE_ACTIONS[action]}.'
+    return {'action': action, 'count': count}
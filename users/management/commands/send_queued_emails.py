@@ -0,0 +1,60 @@
+"""
+Django management command to send queued outbound emails.
+"""
+from django.core.management.base import BaseCommand
+
+from skunkmonkey.utils.workers import run_in_threads
+from users.utils.email_queue import DEFAULT_BATCH_SIZE, run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Send emails queued in the OutboundEmail table, one connection per '
+        'batch, retrying failures with backoff. Runs until interrupted '
+        'unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker threads (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=(
+                'Emails claimed, and sent over one connection, at a time '
+                f'(default: {DEFAULT_BATCH_SIZE})'
+            ),
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when no emails are due (default: 5)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no emails are due instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+
+        processed = run_in_threads(
+            run_worker, workers, 'email-worker',
+            on_stop=lambda: self.stdout.write('Stopping email workers...'),
+            **kwargs)
+        if processed is None:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} queued emails'))
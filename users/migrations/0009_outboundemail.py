@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_messagenote_messageresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dedupe_key', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='Dedupe Key')),
+                ('subject', models.CharField(max_length=255, verbose_name='Subject')),
+                ('body', models.TextField(verbose_name='Text Body')),
+                ('html_body', models.TextField(blank=True, verbose_name='HTML Body')),
+                ('from_email', models.CharField(max_length=254, verbose_name='From')),
+                ('to', models.JSONField(default=list, verbose_name='To')),
+                ('cc', models.JSONField(blank=True, default=list, verbose_name='Cc')),
+                ('bcc', models.JSONField(blank=True, default=list, verbose_name='Bcc')),
+                ('reply_to', models.JSONField(blank=True, default=list, verbose_name='Reply To')),
+                ('headers', models.JSONField(blank=True, default=dict, verbose_name='Headers')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Next Attempt')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Locked By')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Locked At')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent At')),
+            ],
+            options={
+                'verbose_name': 'Outbound Email',
+                'verbose_name_plural': 'Outbound Emails',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='users_email_due_idx')],
+            },
+        ),
+    ]
@@ -96,6 +96,13 @@ class UserProfile(models.Model):
         null=True,
         blank=True
     )
+    # Resized copies of profile_image, see
+    # skunkmonkey.utils.image_derivatives
+    profile_image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False
+    )
 
     # Communication preferences
     NOTIFICATION_CHOICES = (
@@ -478,6 +485,68 @@ class MessageNote(models.Model):
         return f"Note for {self.contact_message} at {self.created_at}"
 
 
+class OutboundEmail(models.Model):
+    """
+    Rendered email waiting for the delivery worker
+
+    The send helpers in users.utils.email render the message and store it
+    here; the send_queued_emails worker delivers pending rows in batches
+    over one SMTP connection, retrying failures with backoff. A
+    ``dedupe_key`` makes queueing the same email twice (say, from a
+    redelivered webhook) a no-op.
+    """
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('sending', _('Sending')),
+        ('sent', _('Sent')),
+        ('failed', _('Failed')),
+    ]
+
+    dedupe_key = models.CharField(
+        _('Dedupe Key'),
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True
+    )
+    subject = models.CharField(_('Subject'), max_length=255)
+    body = models.TextField(_('Text Body'))
+    html_body = models.TextField(_('HTML Body'), blank=True)
+    from_email = models.CharField(_('From'), max_length=254)
+    to = models.JSONField(_('To'), default=list)
+    cc = models.JSONField(_('Cc'), default=list, blank=True)
+    bcc = models.JSONField(_('Bcc'), default=list, blank=True)
+    reply_to = models.JSONField(_('Reply To'), default=list, blank=True)
+    headers = models.JSONField(_('Headers'), default=dict, blank=True)
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    next_attempt_at = models.DateTimeField(
+        _('Next Attempt'), default=timezone.now)
+    locked_by = models.CharField(_('Locked By'), max_length=100, blank=True)
+    locked_at = models.DateTimeField(_('Locked At'), null=True, blank=True)
+    last_error = models.TextField(_('Last Error'), blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    sent_at = models.DateTimeField(_('Sent At'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Outbound Email')
+        verbose_name_plural = _('Outbound Emails')
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='users_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     """
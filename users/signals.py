@@ -1,4 +1,6 @@
 # users/signals.py
+import logging
+
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
@@ -7,8 +9,12 @@ from django.dispatch import receiver
 from allauth.account.models import EmailAddress
 from allauth.account.signals import email_added, email_confirmed
 
+from skunkmonkey.utils.image_derivatives import queue_derivatives
+
 from .models import UserProfile
 
+logger = logging.getLogger(__name__)
+
 
 @receiver(email_confirmed)
 def update_user_email(sender, request, email_address, **kwargs):
@@ -53,3 +59,16 @@ def create_user_profile(sender, instance, created, **kwargs):
     """Create a UserProfile for each new user if it doesn't already exist."""
     if created:
         UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def queue_profile_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Queue the responsive sizes of a new or replaced profile image."""
+    if raw:
+        return
+    try:
+        queue_derivatives(instance, 'profile_image')
+    except Exception as e:
+        logger.error(
+            f"Error queueing profile image derivatives for profile "
+            f"{instance.pk}: {e}")
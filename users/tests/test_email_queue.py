@@ -0,0 +1,156 @@
+"""
+Tests for the outbound email queue.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from shop.models import Order
+from shop.webhook_handler import StripeWH_Handler
+from users.models import OutboundEmail
+from users.utils.email import send_email, send_templated_email
+from users.utils.email_queue import process_due_emails, queue_email
+
+
+class CountingBackend(EmailBackend):
+    """locmem backend that counts opened connections and rejects
+    messages to addresses starting with "bounce"."""
+
+    opened = 0
+
+    def open(self):
+        if not getattr(self, 'is_open', False):
+            CountingBackend.opened += 1
+            self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(to.startswith('bounce') for to in message.to):
+                raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='users.tests.test_email_queue.CountingBackend')
+class EmailQueueTestCase(TestCase):
+    """Test cases for queueing and delivering emails."""
+
+    def setUp(self):
+        """Reset the connection counter."""
+        CountingBackend.opened = 0
+
+    def test_email_sent_by_worker(self):
+        """Queued emails are only delivered when the worker runs."""
+        self.assertTrue(send_email('Hello', 'Body', 'user@example.com'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(process_due_emails(), 1)
+
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+
+    def test_batch_uses_one_connection(self):
+        """A batch of emails is sent over a single connection."""
+        for i in range(5):
+            queue_email('Hello', 'Body', f'user{i}@example.com')
+
+        out = StringIO()
+        call_command('send_queued_emails', '--once', stdout=out)
+
+        self.assertIn('Processed 5 queued emails', out.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 1)
+
+    def test_templated_email_rendered_when_queued(self):
+        """Templates are rendered into the queued row."""
+        send_templated_email(
+            'Reply', 'users/emails/contact_response.html',
+            {'user_name': 'Sam', 'response': 'Thanks for asking'},
+            'user@example.com')
+
+        email = OutboundEmail.objects.get()
+        self.assertIn('Thanks for asking', email.html_body)
+        self.assertIn('Thanks for asking', email.body)
+
+    def test_dedupe_key(self):
+        """An email already queued under a key is not queued again."""
+        first = queue_email(
+            'Hello', 'Body', 'user@example.com', dedupe_key='welcome:1')
+        second = queue_email(
+            'Hello', 'Body', 'user@example.com', dedupe_key='welcome:1')
+
+        self.assertEqual(first.pk, second.pk)
+        process_due_emails()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failure_retried_with_backoff(self):
+        """A failed email is retried later without blocking the batch."""
+        queue_email('Hello', 'Body', 'bounce@example.com')
+        queue_email('Hello', 'Body', 'user@example.com')
+
+        self.assertEqual(process_due_emails(), 2)
+
+        self.assertEqual(len(mail.outbox), 1)
+        failed = OutboundEmail.objects.get(to=['bounce@example.com'])
+        self.assertEqual(failed.status, 'pending')
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('Recipient refused', failed.last_error)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        # Not due again until the backoff has passed
+        self.assertEqual(process_due_emails(), 0)
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        """An email that keeps failing is eventually marked failed."""
+        email = queue_email('Hello', 'Body', 'bounce@example.com')
+        for _ in range(2):
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                next_attempt_at=timezone.now() - timedelta(seconds=1))
+            process_due_emails()
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.attempts, 2)
+
+    def test_stale_sending_email_reclaimed(self):
+        """An email left sending by a stopped worker is sent again."""
+        email = queue_email('Hello', 'Body', 'user@example.com')
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status='sending',
+            locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(process_due_emails(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_order_confirmation_not_duplicated(self):
+        """A redelivered webhook does not email the customer twice."""
+        order = Order.objects.create(
+            full_name='Test User',
+            email='customer@example.com',
+            shipping_address1='123 Test St',
+            shipping_city='Test City',
+            shipping_zipcode='12345',
+            shipping_country='GB',
+            total_price=10.00,
+            grand_total=10.00,
+        )
+        handler = StripeWH_Handler(request=None)
+        handler._send_confirmation_email(order)
+        handler._send_confirmation_email(order)
+
+        process_due_emails()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(order.order_number, mail.outbox[0].subject)
+        self.assertIn(order.order_number, mail.outbox[0].body)
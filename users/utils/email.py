@@ -5,52 +5,53 @@ Provides reusable email functionality throughout the application.
 import logging
 
 from django.conf import settings
-from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.html import strip_tags
 
+from users.utils.email_queue import queue_email
+
 # Configure logger for email operations
 logger = logging.getLogger('skunkmonkey')
 
 
-def send_email(subject, message, to_email, from_email=None, **kwargs):
+def send_email(subject, message, to_email, from_email=None,
+               dedupe_key=None, **kwargs):
     """
-    Send a plain text email.
+    Queue a plain text email for the delivery worker.
 
     Args:
         subject: Email subject line
         message: Plain text message body
         to_email: Recipient email address or list of addresses
         from_email: Sender email (defaults to settings.DEFAULT_FROM_EMAIL)
-        **kwargs: Additional email parameters (cc, bcc, headers, etc.)
+        dedupe_key: Optional key that stops the same email being queued
+            twice
+        **kwargs: Additional email parameters (cc, bcc, reply_to, headers)
 
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        bool: True if email was queued successfully, False otherwise
     """
-    if not from_email:
-        from_email = settings.DEFAULT_FROM_EMAIL
-
     try:
-        email = EmailMessage(
+        queue_email(
             subject=subject,
             body=message,
+            to=to_email,
             from_email=from_email,
-            to=[to_email] if isinstance(to_email, str) else to_email,
+            dedupe_key=dedupe_key,
             **kwargs
         )
-        email.send(fail_silently=False)
-        logger.info(f"Email sent successfully to {to_email}")
+        logger.info(f"Email queued for {to_email}")
         return True
     except Exception as e:
-        logger.error(f"Error sending email to {to_email}: {str(e)}")
+        logger.error(f"Error queueing email to {to_email}: {str(e)}")
         return False
 
 
 def send_html_email(subject, html_message, to_email, from_email=None,
-                    text_message=None, **kwargs):
+                    text_message=None, dedupe_key=None, **kwargs):
     """
-    Send an HTML email with an alternative plain-text version.
+    Queue an HTML email with an alternative plain-text version.
 
     Args:
         subject: Email subject line
@@ -59,39 +60,41 @@ def send_html_email(subject, html_message, to_email, from_email=None,
         from_email: Sender email (defaults to settings.DEFAULT_FROM_EMAIL)
         text_message: Plain text alternative
             (generated from HTML if not provided)
-        **kwargs: Additional email parameters (cc, bcc, headers, etc.)
+        dedupe_key: Optional key that stops the same email being queued
+            twice
+        **kwargs: Additional email parameters (cc, bcc, reply_to, headers)
 
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        bool: True if email was queued successfully, False otherwise
     """
-    if not from_email:
-        from_email = settings.DEFAULT_FROM_EMAIL
-
     # Generate plain text version from HTML if not provided
     if text_message is None:
         text_message = strip_tags(html_message)
 
     try:
-        email = EmailMultiAlternatives(
+        queue_email(
             subject=subject,
             body=text_message,
+            html_body=html_message,
+            to=to_email,
             from_email=from_email,
-            to=[to_email] if isinstance(to_email, str) else to_email,
+            dedupe_key=dedupe_key,
             **kwargs
         )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-        logger.info(f"HTML email sent successfully to {to_email}")
+        logger.info(f"HTML email queued for {to_email}")
         return True
     except Exception as e:
-        logger.error(f"Error sending HTML email to {to_email}: {str(e)}")
+        logger.error(f"Error queueing HTML email to {to_email}: {str(e)}")
         return False
 
 
 def send_templated_email(subject, template_name, context, to_email,
                          from_email=None, **kwargs):
     """
-    Send an HTML email using a template with context data.
+    Queue an HTML email using a template with context data.
+
+    The template is rendered now, so the queued email needs nothing from
+    the request when it is delivered.
 
     Args:
         subject: Email subject line
@@ -99,10 +102,11 @@ def send_templated_email(subject, template_name, context, to_email,
         context: Dictionary of context data for the template
         to_email: Recipient email address or list of addresses
         from_email: Sender email (defaults to settings.DEFAULT_FROM_EMAIL)
-        **kwargs: Additional email parameters (cc, bcc, headers, etc.)
+        **kwargs: Additional email parameters (dedupe_key, cc, bcc,
+            reply_to, headers)
 
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        bool: True if email was queued successfully, False otherwise
     """
     # Ensure context has common variables needed by templates
     if 'site_name' not in context:
@@ -148,7 +152,7 @@ def send_contact_email(
         user: Optional User object if submission is from a logged-in user
 
     Returns:
-        bool: True if both emails sent successfully, False otherwise
+        bool: True if both emails were queued, False otherwise
     """
     # Handle case where request_or_email is an email address string
     if isinstance(request_or_email, str) and '@' in request_or_email:
@@ -206,7 +210,7 @@ def send_contact_email(
     # Log result
     logger.info(f"Contact form submission processed for {email}")
 
-    # Return True only if both emails sent successfully
+    # Return True only if both emails were queued
     return admin_notification and user_confirmation
 
 
@@ -222,7 +226,7 @@ def send_response_email(contact_message, response_text, sender=None):
         sender: The staff user who wrote the response (optional)
 
     Returns:
-        bool: True if the email was sent successfully, False otherwise
+        bool: True if the email was queued successfully, False otherwise
     """
     try:
         # Get recipient email from the contact message
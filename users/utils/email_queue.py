@@ -0,0 +1,265 @@
+"""
+Outbound email queue
+
+queue_email() stores a fully rendered message as an OutboundEmail row,
+inside the caller's transaction, so an email is queued exactly when the
+change that triggers it commits. The send_queued_emails worker claims
+due rows in batches (``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it) and sends each batch over one connection from
+``get_connection()``. Failed messages are retried with exponential
+backoff and marked failed after ``EMAIL_QUEUE_MAX_ATTEMPTS`` tries.
+
+Queueing with a ``dedupe_key`` that is already in the table returns the
+existing row instead of adding a second email, so retried webhooks and
+double submits send once.
+
+With ``EMAIL_QUEUE_EAGER = True`` emails are delivered in-process as soon
+as the surrounding transaction commits, for development without a
+worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from skunkmonkey.utils import workers
+from users.models import OutboundEmail
+
+logger = logging.getLogger('skunkmonkey')
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_RETRY_BASE_DELAY = 60  # seconds, doubled after every failure
+DEFAULT_RETRY_MAX_DELAY = 6 * 60 * 60
+DEFAULT_LOCK_TIMEOUT = 10 * 60
+DEFAULT_BATCH_SIZE = 50
+
+
+def _as_list(addresses):
+    if not addresses:
+        return []
+    if isinstance(addresses, str):
+        return [addresses]
+    return list(addresses)
+
+
+def queue_email(subject, body, to, from_email=None, html_body='',
+                dedupe_key=None, cc=None, bcc=None, reply_to=None,
+                headers=None):
+    """
+    Queue a rendered email for delivery
+
+    Args:
+        subject: Subject line
+        body: Plain text body
+        to: Recipient address or list of addresses
+        from_email: Sender (defaults to settings.DEFAULT_FROM_EMAIL)
+        html_body: Optional HTML alternative
+        dedupe_key: Optional key; an email already queued under the same
+            key is returned instead of queueing another
+        cc, bcc, reply_to: Optional address lists
+        headers: Optional dict of extra headers
+
+    Returns:
+        The OutboundEmail row
+    """
+    if dedupe_key:
+        existing = OutboundEmail.objects.filter(
+            dedupe_key=dedupe_key).first()
+        if existing is not None:
+            logger.info(f"Email {dedupe_key} already queued, skipping")
+            return existing
+
+    email = OutboundEmail(
+        dedupe_key=dedupe_key or None,
+        subject=subject[:255],
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=_as_list(to),
+        cc=_as_list(cc),
+        bcc=_as_list(bcc),
+        reply_to=_as_list(reply_to),
+        headers=dict(headers or {}),
+    )
+    try:
+        with transaction.atomic():
+            email.save()
+    except IntegrityError:
+        # Queued concurrently under the same key
+        if not dedupe_key:
+            raise
+        return OutboundEmail.objects.get(dedupe_key=dedupe_key)
+
+    if getattr(settings, 'EMAIL_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: send_emails([email]))
+    return email
+
+
+def retry_delay(attempts):
+    """
+    Backoff before retrying an email that has failed ``attempts`` times
+    (see skunkmonkey.utils.workers.retry_delay)
+
+    Returns:
+        timedelta
+    """
+    return workers.retry_delay(
+        attempts,
+        getattr(settings, 'EMAIL_QUEUE_RETRY_BASE_DELAY',
+                DEFAULT_RETRY_BASE_DELAY),
+        getattr(settings, 'EMAIL_QUEUE_RETRY_MAX_DELAY',
+                DEFAULT_RETRY_MAX_DELAY))
+
+
+def claim_emails(worker_id, limit=DEFAULT_BATCH_SIZE):
+    """
+    Lock a batch of due emails for this worker
+
+    Args:
+        worker_id: Identifier stored in locked_by
+        limit: Maximum number of emails to claim
+
+    Returns:
+        List of claimed OutboundEmail instances, oldest first
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(
+        settings, 'EMAIL_QUEUE_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    due = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='sending', locked_at__lt=stale)
+    )
+    return workers.claim_rows(
+        OutboundEmail, worker_id, due, ('next_attempt_at', 'pk'), limit,
+        status='sending')
+
+
+def build_message(email, connection=None):
+    """The EmailMultiAlternatives for a queued email"""
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_emails(emails):
+    """
+    Send emails over one connection and record each outcome
+
+    Every message is handed to the same open connection with
+    send_messages(), so a batch costs one SMTP login. A failure only
+    affects its own message; the connection is reopened for the rest.
+
+    Args:
+        emails: OutboundEmail rows (claimed, or fresh from queue_email)
+
+    Returns:
+        Number of emails sent
+    """
+    if not emails:
+        return 0
+
+    sent = 0
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        for email in emails:
+            try:
+                mail_connection.open()
+                if not mail_connection.send_messages(
+                        [build_message(email, mail_connection)]):
+                    raise RuntimeError('The mail backend sent nothing')
+            except Exception as e:
+                _record_failure(email, e)
+                # The connection may be broken; start a fresh one
+                mail_connection.close()
+                continue
+
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status='sent',
+                sent_at=timezone.now(),
+                locked_by='',
+                locked_at=None,
+                last_error='',
+            )
+            sent += 1
+    finally:
+        mail_connection.close()
+
+    logger.info(f"Sent {sent} of {len(emails)} queued emails")
+    return sent
+
+
+def _record_failure(email, error):
+    max_attempts = getattr(
+        settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    # Emails sent eagerly were never claimed, so this is their first try
+    attempts = max(email.attempts, 1)
+    update = {
+        'attempts': attempts,
+        'locked_by': '',
+        'locked_at': None,
+        'last_error': str(error)[:2000],
+    }
+    if attempts >= max_attempts:
+        update['status'] = 'failed'
+        logger.error(
+            f"Giving up on email {email.pk} to {email.to} after "
+            f"{attempts} attempts: {error}")
+    else:
+        update['status'] = 'pending'
+        update['next_attempt_at'] = timezone.now() + retry_delay(attempts)
+        logger.warning(
+            f"Email {email.pk} to {email.to} failed (attempt {attempts} "
+            f"of {max_attempts}), retrying at "
+            f"{update['next_attempt_at']:%H:%M:%S}: {error}")
+    OutboundEmail.objects.filter(pk=email.pk).update(**update)
+
+
+def process_due_emails(worker_id=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Claim and send one batch of due emails
+
+    Args:
+        worker_id: Identifier for locked_by; generated if omitted
+        batch_size: Maximum number of emails to claim
+
+    Returns:
+        Number of emails processed (sent or not)
+    """
+    worker_id = worker_id or workers.make_worker_id()
+    emails = claim_emails(worker_id, limit=batch_size)
+    send_emails(emails)
+    return len(emails)
+
+
+def run_worker(batch_size=DEFAULT_BATCH_SIZE, poll_interval=5, once=False,
+               stop=None):
+    """
+    Send emails until stopped
+
+    Args:
+        batch_size: Emails claimed, and sent over one connection, at a time
+        poll_interval: Seconds to sleep when nothing is due
+        once: Return as soon as nothing is due instead of polling
+        stop: Optional threading.Event that ends the loop when set
+
+    Returns:
+        Total number of emails processed
+    """
+    return workers.poll(
+        lambda worker_id: process_due_emails(worker_id, batch_size),
+        poll_interval=poll_interval, once=once, stop=stop)
@@ -3,12 +3,13 @@ Profile-related views for the users app.
 Handles user profile dashboard and profile management.
 """
 
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 
 from shop.models import Order
+from skunkmonkey.utils.image_uploads import apply_cropped_image
+from skunkmonkey.utils.s3_verification import queue_s3_verification
 
 from ..forms import ProfileForm, UserForm
 from ..models import UserProfile
@@ -90,17 +91,9 @@ def manage_profile(request):
             # Save the profile with all changes
             profile.save()
 
-            # Verify the file was saved to S3 if enabled and profile has image
-            if settings.USE_S3 and profile.profile_image:
-                try:
-                    from skunkmonkey.utils.s3_verification import (
-                        verify_s3_file_exists,
-                    )
-                    verify_s3_file_exists(str(profile.profile_image))
-                    # S3 verification completed (results logged internally)
-                except Exception:
-                    # S3 verification failed, but profile save was successful
-                    pass
+            # Check the file reached S3 from a background job
+            if profile.profile_image:
+                queue_s3_verification(str(profile.profile_image))
 
             messages.success(
                 request, 'Your profile has been updated successfully.'
@@ -141,6 +134,15 @@ def _handle_profile_image_update(request, profile, profile_form):
         profile.profile_image = None
         return
 
+    # A cropped image already sent to the binary upload endpoint
+    elif request.POST.get('cropped_image_token') and image_selected == '1':
+        result = apply_cropped_image(
+            request, profile, 'profile_image', 'profile')
+        if (not result['success']
+                and 'profile-image-file' in request.FILES):
+            profile.profile_image = request.FILES['profile-image-file']
+        return
+
     # Process cropped image data FIRST (prioritize over direct file upload)
     # This ensures that if user crops an image, the cropped version is used
     elif (
@@ -215,19 +217,6 @@ def _handle_profile_image_update(request, profile, profile_form):
     ):
         file = request.FILES['profile-image-file']
 
-        # If S3 is enabled, verify connection before proceeding
-        if settings.USE_S3:
-            try:
-                from skunkmonkey.utils.s3_utils import get_s3_client
-                s3 = get_s3_client()
-                s3.list_objects_v2(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    MaxKeys=1
-                )
-            except Exception:
-                # S3 connection failed, but continue with upload
-                pass
-
         # Set the file to the profile image field
         profile.profile_image = file
         return
@@ -14,7 +14,9 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView, ListView, TemplateView, UpdateView
 
+from staff.jobs import enqueue
 from users.forms import StaffUserSearchForm
+from users.job_handlers import MESSAGE_ACTIONS
 from users.mixins import StaffMemberRequiredMixin
 from users.models import ContactMessage, MessageNote, MessageResponse
 from users.utils.email import send_response_email
@@ -348,36 +350,25 @@ def message_bulk_action(request):
     messages_to_process = ContactMessage.objects.filter(id__in=message_ids)
     message_count = messages_to_process.count()
 
-    if action == 'mark_read':
-        for message_obj in messages_to_process:
-            message_obj.mark_as_read()
-        messages.success(
-            request, _(f"{message_count} messages marked as read.")
-        )
-
-    elif action == 'mark_unread':
-        for message_obj in messages_to_process:
-            message_obj.mark_as_unread()
-        messages.success(
-            request, _(f"{message_count} messages marked as unread.")
+    if action in MESSAGE_ACTIONS:
+        # Each message is saved through its model methods, so large
+        # selections are handled by the job worker
+        enqueue(
+            'message_bulk_action',
+            payload={
+                'action': action,
+                'message_ids': [int(pk) for pk in message_ids],
+                'status': request.POST.get('status'),
+            },
+            user=request.user,
+            description=f'{message_count} contact messages',
         )
-
-    elif action == 'assign_to_me':
-        for message_obj in messages_to_process:
-            message_obj.assign_to(request.user)
-        messages.success(
-            request, _(f"{message_count} messages assigned to you.")
-        )
-
-    elif action == 'set_status':
-        status = request.POST.get('status')
-        for message_obj in messages_to_process:
-            message_obj.update_status(status, request.user)
-        status_choices_dict = dict(ContactMessage.STATUS_CHOICES)
-        status_display = status_choices_dict.get(status, status)
         messages.success(
             request,
-            _(f"{message_count} messages set to '{status_display}'.")
+            _(
+                f"{message_count} messages will be "
+                f"{MESSAGE_ACTIONS[action]} in the background."
+            )
         )
 
     elif action == 'set_priority':